@@ -0,0 +1,456 @@
+import numpy as np
+import make_prop
+
+# In process blade element momentum engine. Solves a propeller at a whole array of velocities at once with NumPy, so it
+# runs anywhere without XROTOR. Uses the same PropGeom and FoilAero data that is sent to XROTOR: the blade is
+# discretized into stations like XROTOR does, the airfoil tables are picked from each section's reynolds number, and
+# the lift and drag follow XROTOR's section model (linear lift up to the Cl limits, quadratic drag with reynolds
+# scaling).
+#
+# The inflow angle at every station is found with a bracketed false position on the residual
+#     sin(phi) (1 - k) - V/(omega r) cos(phi) (1 + k')
+# times sin(phi), which keeps it bounded near phi = 0. The bracket is narrowed with a few bisection steps first, or
+# taken around the inflow angle of the previous rpm when the rpm iteration passes one in. The rpm at constant power is
+# bracketed from the rpm estimate with cube law steps and then found with a safeguarded false position on the cube root
+# of the power, for every velocity at once and only over the velocities still converging. BEMBatch stacks
+# many blades so one solve covers every blade at every velocity.
+
+# number of radial stations the blade is discretized into, same as XROTOR
+NUM_STATIONS = 30
+
+# keys of the FoilAero performance dictionaries used by the section model
+POLAR_KEYS = ['zero-lift alpha(deg)', 'd(Cl)/d(alpha)', 'maximum Cl', 'minimum Cl', 'minimum Cd', 'Cl at minimum Cd',
+              'd^2(Cd)/d^2(Cl)', 'reference Re number', 'Re scaling exponent']
+
+# rpm range searched for the constant power solution, the factor each bracket search step overshoots the cube law by
+# and the most bracket search steps
+RPM_BOUNDS = (1.0, 50000.0)
+RPM_FACTOR = 1.25
+BRACKET_STEPS = 8
+
+# inflow angle solve: bisection steps taken before false position from the full bracket, half width in radians of the
+# bracket tried around a previous inflow angle, tolerance on the scaled residual and most false position steps
+BISECTION_STEPS = 5
+PHI_WINDOW = 0.05
+PHI_TOL = 1e-12
+PHI_ITERATIONS = 50
+
+
+# Solves a PropGeom with blade element momentum theory. Meant to be used in place of XROTOR for screening designs:
+#
+#     engine = BEMEngine(geom, fluid)
+#     result = engine.solve_power(vel_list, 300, rpm0=300)
+#     result.T, result.rpm, result.eff
+class BEMEngine:
+    # geom: PropGeom with its aerodynamic data initialized
+    # fluid: dictionary with keys 'density', 'viscosity' and 'speed_sound'
+    def __init__(self, geom, fluid, num_stations=NUM_STATIONS):
+        self.geom = geom
+        self.fluid = fluid
+        self.r_tip = geom.diam / 2
+        self.r_hub = geom.hub_diam / 2
+        self.xi = stations(self.r_hub / self.r_tip, num_stations)
+        self.c_over_r = np.interp(self.xi, geom.r_over_r, geom.c_over_r)
+        self.beta = np.interp(self.xi, geom.r_over_r, geom.beta)
+
+    # solves every velocity at a fixed rpm
+    # vel: 1D array of velocities
+    # rpm: float or 1D array of rpm, one per velocity
+    def solve_rpm(self, vel, rpm):
+        vel = np.atleast_1d(np.asarray(vel, dtype=float))
+        rpm = np.broadcast_to(np.asarray(rpm, dtype=float), vel.shape)
+        polar = self.polar(vel, rpm)
+        return self._result(vel, rpm, polar, np.ones(vel.shape, dtype=bool))
+
+    # solves the rpm that absorbs power at every velocity
+    # rpm0: estimate of the rpm. Used to pick each section's airfoil table like ConstantPower does for XROTOR. Points
+    #       whose rpm ends up more than 10% above the estimate are solved again with the tables at the solved rpm
+    def solve_power(self, vel, power, rpm0=200):
+        vel = np.atleast_1d(np.asarray(vel, dtype=float))
+        rpm_guess = np.full(vel.shape, float(rpm0))
+        polar = self.polar(vel, rpm_guess)
+        rpm, converged = self._rpm_at_power(vel, power, polar, estimate=rpm_guess)
+
+        retry = converged & (100 * (rpm - rpm_guess) / rpm_guess > 10)
+        if np.any(retry):
+            polar = self.polar(vel, np.where(retry, rpm, rpm_guess))
+            rpm_retry, converged_retry = self._rpm_at_power(vel[retry], power, select(polar, retry),
+                                                            np.flatnonzero(retry), rpm[retry])
+            rpm[retry] = rpm_retry
+            converged[retry] = converged_retry
+
+        return self._result(vel, np.where(converged, rpm, rpm_guess), polar, converged)
+
+    # airfoil parameters at every station for each velocity and rpm. Each section's table is picked at its reynolds
+    # number, then the parameters are interpolated from the sections onto the stations
+    def polar(self, vel, rpm):
+        table = self.geom.blade_table(vel, rpm, self.fluid['viscosity'])
+        polar = {}
+        for key in POLAR_KEYS:
+            polar[key] = interp_rows(self.xi, self.geom.r_over_r, table[:, :, make_prop.FOIL_KEYS.index(key)])
+        return polar
+
+    # element loads at each velocity, station pair
+    # rows: indices of the velocities vel, rpm and polar were selected with. Only BEMBatch needs them
+    # phi0, phi_window: optional inflow angles of a nearby solution, used to start the inflow angle solve. See
+    #                   element_loads
+    def loads(self, vel, rpm, polar, rows=None, phi0=None, phi_window=PHI_WINDOW):
+        return element_loads(self.xi, self.c_over_r, self.beta, polar, self.geom.blades, self.r_tip,
+                             vel[:, None], rpm[:, None] * np.pi / 30, self.fluid, phi0, phi_window)
+
+    # rpm that absorbs power at every velocity, and whether it was bracketed
+    # rows: indices of the velocities vel and polar were selected with. Only BEMBatch needs them
+    # estimate: rpm guess at every velocity
+    def _rpm_at_power(self, vel, power, polar, rows=None, estimate=None):
+        rows = np.arange(len(vel)) if rows is None else rows
+
+        # power grows roughly with rpm cubed, so the cube root of the excess power is close to linear in rpm. Only the
+        # velocities in index are solved, which keeps the last iterations down to the few velocities still converging.
+        # The inflow angles found at the last rpm tried at each velocity start the next solve there. The inflow angle
+        # moves by at most about half the relative change of the rpm, which sizes the bracket around them
+        def excess(index, rpm, phi0=None):
+            window = PHI_WINDOW
+            if phi0 is not None:
+                window = np.minimum(np.abs(rpm - last[index]) / rpm + 1e-9, PHI_WINDOW)[:, None]
+            loads = self.loads(vel[index], rpm, select(polar, index), rows[index], phi0, window)
+            last[index] = rpm
+            return np.cbrt(loads['power']) - np.cbrt(power), loads['phi']
+
+        last = np.zeros(vel.shape)
+
+        # bracket search from the estimate. Each step goes to the rpm the cube law gives for the power just found, pushed
+        # RPM_FACTOR further so it lands past the root, or doubles or halves the rpm where no power was absorbed. The
+        # velocities still without a bracket after BRACKET_STEPS search all of RPM_BOUNDS
+        lower = np.full(vel.shape, RPM_BOUNDS[0])
+        upper = np.full(vel.shape, RPM_BOUNDS[1])
+        f_lower = np.full(vel.shape, np.nan)
+        f_upper = np.full(vel.shape, np.nan)
+        rpm = np.clip(np.full(vel.shape, np.sqrt(RPM_BOUNDS[0] * RPM_BOUNDS[1])) if estimate is None else estimate,
+                      *RPM_BOUNDS)
+        phi = None
+        i = np.arange(len(vel))
+        for _ in range(BRACKET_STEPS):
+            f, phi_i = excess(i, rpm[i], None if phi is None else phi[i])
+            if phi is None:
+                phi = phi_i
+            phi[i] = phi_i
+            below = f < 0
+            lower[i] = np.where(below, rpm[i], lower[i])
+            f_lower[i] = np.where(below, f, f_lower[i])
+            upper[i] = np.where(below, upper[i], rpm[i])
+            f_upper[i] = np.where(below, f_upper[i], f)
+            absorbed = f + np.cbrt(power)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                step = np.where(absorbed > 0, np.cbrt(power) / absorbed, np.where(below, 2.0, 0.5))
+            step = np.where(below, np.maximum(step, 1) * RPM_FACTOR, np.minimum(step, 1) / RPM_FACTOR)
+            rpm[i] = np.clip(rpm[i] * step, lower[i], upper[i])
+            i = i[np.isnan(f_lower[i]) | np.isnan(f_upper[i])]
+            if i.size == 0:
+                break
+        ends = i
+        if ends.size:
+            missing = np.isnan(f_lower[ends])
+            f_end, _ = excess(ends, np.where(missing, lower[ends], upper[ends]))
+            f_lower[ends] = np.where(missing, f_end, f_lower[ends])
+            f_upper[ends] = np.where(missing, f_upper[ends], f_end)
+        # an rpm tried on the way can be the root itself, which is kept as the upper end
+        converged = (f_lower < 0) & (f_upper >= 0)
+
+        # Illinois false position. An end point kept twice in a row has its value halved so the bracket keeps shrinking.
+        # The inflow angles of the last rpm tried at a velocity start its next inflow solve
+        side = np.zeros(vel.shape)
+        rpm = 0.5 * (lower + upper)
+        active = np.flatnonzero(converged)
+        for _ in range(100):
+            if active.size == 0:
+                break
+            i = active
+            rpm[i] = (lower[i] * f_upper[i] - upper[i] * f_lower[i]) / (f_upper[i] - f_lower[i])
+            f, phi[i] = excess(i, rpm[i], phi[i])
+            below = f < 0
+            f_upper[i] = np.where(below & (side[i] < 0), 0.5 * f_upper[i], f_upper[i])
+            f_lower[i] = np.where(~below & (side[i] > 0), 0.5 * f_lower[i], f_lower[i])
+            lower[i] = np.where(below, rpm[i], lower[i])
+            f_lower[i] = np.where(below, f, f_lower[i])
+            upper[i] = np.where(below, upper[i], rpm[i])
+            f_upper[i] = np.where(below, f_upper[i], f)
+            side[i] = np.where(below, -1, 1)
+            active = i[np.abs(f) > 1e-8 * np.cbrt(abs(power))]
+        return rpm, converged
+
+    def _result(self, vel, rpm, polar, converged):
+        loads = self.loads(vel, rpm, polar)
+        return BEMResult(self, vel, rpm, loads, converged)
+
+
+# Solves many PropGeoms at the same velocities in one go. Every blade gets the same number of stations, so the rows of
+# every blade at every velocity are stacked into one (blade x velocity, station) array and the rpm iteration and the
+# inflow solve run over all of them at once. Meant for screening many designs:
+#
+#     batch = BEMBatch([geom_1, geom_2, geom_3], fluid)
+#     results = batch.solve_power(vel_list, 300, rpm0=300)    # one BEMResult per blade
+#     [result.T for result in results]
+class BEMBatch(BEMEngine):
+    # geoms: list of PropGeoms with their aerodynamic data initialized
+    # fluid: dictionary with keys 'density', 'viscosity' and 'speed_sound'
+    def __init__(self, geoms, fluid, num_stations=NUM_STATIONS):
+        self.engines = [BEMEngine(geom, fluid, num_stations) for geom in geoms]
+        self.fluid = fluid
+        # blade arrays with one row per blade. Repeated once per velocity by _set_velocities
+        self.blade = {
+            'xi': np.stack([engine.xi for engine in self.engines]),
+            'c_over_r': np.stack([engine.c_over_r for engine in self.engines]),
+            'beta': np.stack([engine.beta for engine in self.engines]),
+            'blades': np.array([[engine.geom.blades] for engine in self.engines], dtype=float),
+            'r_tip': np.array([[engine.r_tip] for engine in self.engines])
+        }
+        self.rows = None
+        self.count = 0
+
+    # solves every blade at every velocity at a fixed rpm. Returns a list of BEMResult, one per blade
+    def solve_rpm(self, vel, rpm):
+        vel = self._set_velocities(vel)
+        return super().solve_rpm(np.tile(vel, len(self.engines)), np.tile(np.broadcast_to(rpm, vel.shape),
+                                                                          len(self.engines)))
+
+    # solves the rpm that absorbs power for every blade at every velocity. Same arguments as BEMEngine.solve_power.
+    # Returns a list of BEMResult, one per blade
+    def solve_power(self, vel, power, rpm0=200):
+        vel = self._set_velocities(vel)
+        return super().solve_power(np.tile(vel, len(self.engines)), power, rpm0)
+
+    def _set_velocities(self, vel):
+        vel = np.atleast_1d(np.asarray(vel, dtype=float))
+        self.count = len(vel)
+        self.rows = {key: np.repeat(value, self.count, axis=0) for key, value in self.blade.items()}
+        return vel
+
+    # each blade's polar at its own velocities, stacked
+    def polar(self, vel, rpm):
+        polars = [engine.polar(vel[part], rpm[part]) for engine, part in zip(self.engines, self._parts())]
+        return {key: np.concatenate([polar[key] for polar in polars]) for key in POLAR_KEYS}
+
+    def loads(self, vel, rpm, polar, rows=None, phi0=None, phi_window=PHI_WINDOW):
+        blade = self.rows if rows is None else {key: value[rows] for key, value in self.rows.items()}
+        return element_loads(blade['xi'], blade['c_over_r'], blade['beta'], polar, blade['blades'], blade['r_tip'],
+                             vel[:, None], rpm[:, None] * np.pi / 30, self.fluid, phi0, phi_window)
+
+    def _result(self, vel, rpm, polar, converged):
+        loads = self.loads(vel, rpm, polar)
+        return [BEMResult(engine, vel[part], rpm[part], {key: value[part] for key, value in loads.items()},
+                          converged[part]) for engine, part in zip(self.engines, self._parts())]
+
+    # slice of each blade's rows
+    def _parts(self):
+        return [slice(i * self.count, (i + 1) * self.count) for i in range(len(self.engines))]
+
+
+# The solution of a BEMEngine at an array of velocities. Scalars use the same names as file_tools.ExtractAero and are
+# arrays indexed by velocity. Radial distributions are 2D arrays indexed by velocity and station
+class BEMResult:
+    def __init__(self, engine, vel, rpm, loads, converged):
+        fluid = engine.fluid
+        self.engine = engine
+        self.vel = vel
+        self.rpm = rpm
+        self.converged = converged
+        self.rad = engine.r_tip
+        self.T = loads['thrust']
+        self.Q = loads['torque']
+        self.pwr = loads['power']
+        self.eff = efficiency(self.T, vel, self.pwr)
+        self.eff_ideal = ideal_efficiency(self.T, vel, fluid['density'], engine.r_tip)
+
+        self.r_over_r = np.broadcast_to(engine.xi, loads['cl'].shape)
+        self.c_over_r = np.broadcast_to(engine.c_over_r, loads['cl'].shape)
+        self.beta = np.broadcast_to(engine.beta, loads['cl'].shape)
+        self.cl = loads['cl']
+        self.cd = loads['cd']
+        self.re = loads['re']
+        self.mach = loads['w'] / fluid['speed_sound']
+        self.induced = loads['a']
+        self.d_thrust = loads['dT']
+        self.d_torque = loads['dQ']
+
+    # dictionary of a single velocity in the form file_tools.format_aero takes
+    def point(self, i):
+        geom = self.engine.geom
+        fluid = self.engine.fluid
+        return {
+            'blades': geom.blades, 'radius': self.rad, 'hub_radius': geom.hub_diam / 2,
+            'rho': fluid['density'], 'vsound': fluid['speed_sound'], 'mu': fluid['viscosity'] * fluid['density'],
+            'vel': self.vel[i], 'rpm': self.rpm[i], 'thrust': self.T[i], 'power': self.pwr[i], 'torque': self.Q[i],
+            'efficiency': self.eff[i], 'eff_ideal': self.eff_ideal[i], 'converged': bool(self.converged[i]),
+            'r_over_r': self.r_over_r[i], 'c_over_r': self.c_over_r[i], 'beta': self.beta[i], 'cl': self.cl[i],
+            'cd': self.cd[i], 're': self.re[i], 'mach': self.mach[i], 'induced': self.induced[i]
+        }
+
+
+# radial stations between the hub and the tip, clustered at both ends
+def stations(xi_hub, num_stations=NUM_STATIONS):
+    t = (np.arange(num_stations) + 0.5) / num_stations
+    return xi_hub + (1 - xi_hub) * 0.5 * (1 - np.cos(np.pi * t))
+
+
+# linear interpolation of each row of values, given at xp, onto x
+def interp_rows(x, xp, values):
+    index = np.clip(np.searchsorted(xp, x) - 1, 0, len(xp) - 2)
+    fraction = np.clip((x - xp[index]) / (xp[index + 1] - xp[index]), 0, 1)
+    return values[..., index] * (1 - fraction) + values[..., index + 1] * fraction
+
+
+# keeps the rows of every polar array picked by index, a boolean mask or an array of indices
+def select(polar, index):
+    return {key: value[index] for key, value in polar.items()}
+
+
+# lift and drag coefficients for an angle of attack in degrees and a reynolds number
+def section_coefficients(polar, alpha, re):
+    linear_cl = polar['d(Cl)/d(alpha)'] * np.radians(alpha - polar['zero-lift alpha(deg)'])
+    return limited_coefficients(polar, linear_cl, reynolds_scale(polar, re))
+
+
+# factor the drag is scaled by at a reynolds number
+def reynolds_scale(polar, re):
+    return (np.maximum(re, 1.0) / polar['reference Re number'])**polar['Re scaling exponent']
+
+
+# lift and drag coefficients from the lift of the linear part of the polar and the drag's reynolds_scale
+def limited_coefficients(polar, linear_cl, drag_scale):
+    cl = np.minimum(np.maximum(linear_cl, polar['minimum Cl']), polar['maximum Cl'])
+    cd = (polar['minimum Cd'] + polar['d^2(Cd)/d^2(Cl)'] * (cl - polar['Cl at minimum Cd'])**2) * drag_scale
+    return cl, cd
+
+
+# blade element momentum solution at every station. Every argument broadcasts against the others, with stations along
+# the last axis. Returns the distributions along with the integrated thrust, torque and power
+# xi: r/R of each station
+# omega: rotation rate in rad/s
+# phi0: optional inflow angles of a nearby solution, for example at a close rpm, that start the inflow angle solve
+# phi_window: half width in radians of the bracket tried around phi0. Can be an array that broadcasts with the stations
+def element_loads(xi, c_over_r, beta, polar, blades, r_tip, vel, omega, fluid, phi0=None, phi_window=PHI_WINDOW):
+    rho = fluid['density']
+    nu = fluid['viscosity']
+    r = xi * r_tip
+    chord = c_over_r * r_tip
+    vel = np.maximum(vel, 1e-6)
+    solidity = blades * chord / (2 * np.pi * r)
+    inflow_ratio = vel / (omega * r)
+    shape = np.broadcast(xi, vel, omega, c_over_r, beta).shape
+    # everything that doesn't depend on phi: the reynolds number and its drag scaling, the lift slope and the angle
+    # of attack at phi = 0 measured from zero lift, and the tip loss exponent times sin(phi)
+    re = np.sqrt(vel**2 + (omega * r)**2) * chord / nu
+    drag_scale = reynolds_scale(polar, re)
+    lift_slope = polar['d(Cl)/d(alpha)']
+    zero_lift_angle = np.radians(beta - polar['zero-lift alpha(deg)'])
+    tip_exponent = -blades / 2 * (1 - xi) / xi
+    quarter_solidity = solidity / 4
+
+    # the coefficients and tip loss at inflow angles phi
+    def section(phi):
+        sin_phi = np.sin(phi)
+        cos_phi = np.cos(phi)
+        cl, cd = limited_coefficients(polar, lift_slope * (zero_lift_angle - phi), drag_scale)
+        tip_loss = np.maximum(2 / np.pi * np.arccos(np.minimum(np.exp(tip_exponent / sin_phi), 1)), 1e-4)
+        return sin_phi, cos_phi, cl, cd, tip_loss
+
+    def induction(phi):
+        sin_phi, cos_phi, cl, cd, tip_loss = section(phi)
+        cn = cl * cos_phi - cd * sin_phi
+        ct = cl * sin_phi + cd * cos_phi
+        k = quarter_solidity * cn / (tip_loss * sin_phi**2)
+        k_prime = quarter_solidity * ct / (tip_loss * sin_phi * cos_phi)
+        return k, k_prime, cl, cd, cn, ct
+
+    # sin(phi) (1 - k) - V/(omega r) cos(phi) (1 + k') times sin(phi), with k and k' written out so the singular
+    # terms cancel
+    def residual(phi):
+        sin_phi, cos_phi, cl, cd, tip_loss = section(phi)
+        forces = cl * (cos_phi + inflow_ratio * sin_phi) + cd * (inflow_ratio * cos_phi - sin_phi)
+        return sin_phi * (sin_phi - inflow_ratio * cos_phi) - quarter_solidity * forces / tip_loss
+
+    phi = inflow_angle(residual, shape, phi0, phi_window)
+    k, k_prime, cl, cd, cn, ct = induction(phi)
+    a = k / (1 - k)
+    a_prime = k_prime / (1 + k_prime)
+    w = np.sqrt((vel * (1 + a))**2 + (omega * r * (1 - a_prime))**2)
+    d_thrust = 0.5 * rho * w**2 * blades * chord * cn
+    d_torque = 0.5 * rho * w**2 * blades * chord * ct * r
+
+    return {
+        'phi': phi, 'a': a, 'a_prime': a_prime, 'cl': cl, 'cd': cd, 'w': w, 're': w * chord / nu,
+        'chord': np.broadcast_to(chord, shape), 'dT': d_thrust, 'dQ': d_torque,
+        'thrust': make_prop.trapezoid(d_thrust, r), 'torque': make_prop.trapezoid(d_torque, r),
+        'power': make_prop.trapezoid(d_torque * omega, r)
+    }
+
+
+# root of residual(phi) between 0 and 90 degrees at every station, by false position with the Illinois modification.
+# residual is negative below the root. Where it doesn't change sign the end it is closest to zero at is returned, like
+# a bisection would
+# phi0: optional starting guesses. Stations whose root lies within window of their guess start from that bracket, the
+#       rest from the full range after BISECTION_STEPS bisections
+def inflow_angle(residual, shape, phi0=None, window=PHI_WINDOW):
+    phi_min = np.full(shape, 1e-6)
+    phi_max = np.full(shape, np.pi / 2 - 1e-6)
+    lower, upper = phi_min, phi_max
+    warm = np.zeros(shape, dtype=bool)
+    if phi0 is not None:
+        lower_0 = np.clip(phi0 - window, phi_min, phi_max)
+        upper_0 = np.clip(phi0 + window, phi_min, phi_max)
+        f_lower_0 = residual(lower_0)
+        f_upper_0 = residual(upper_0)
+        warm = (f_lower_0 < 0) & (f_upper_0 >= 0)
+        if np.all(warm):
+            return _false_position(residual, lower_0, upper_0, f_lower_0, f_upper_0)
+
+    f_lower = residual(lower)
+    f_upper = residual(upper)
+    bracketed = (f_lower < 0) & (f_upper >= 0)
+    # stations without a sign change go to the end a bisection would have ended on
+    end = np.where(f_upper < 0, phi_max, phi_min)
+    for _ in range(BISECTION_STEPS):
+        middle = 0.5 * (lower + upper)
+        f_middle = residual(middle)
+        negative = f_middle < 0
+        lower, f_lower = np.where(negative, middle, lower), np.where(negative, f_middle, f_lower)
+        upper, f_upper = np.where(negative, upper, middle), np.where(negative, f_upper, f_middle)
+    if phi0 is not None:
+        lower, upper = np.where(warm, lower_0, lower), np.where(warm, upper_0, upper)
+        f_lower, f_upper = np.where(warm, f_lower_0, f_lower), np.where(warm, f_upper_0, f_upper)
+        bracketed |= warm
+    return np.where(bracketed, _false_position(residual, lower, upper, f_lower, f_upper, bracketed), end)
+
+
+# Illinois false position inside brackets with residual(lower) < 0 <= residual(upper). An end kept twice in a row has
+# its value halved so the bracket keeps shrinking. Only the bracketed stations are checked for convergence
+def _false_position(residual, lower, upper, f_lower, f_upper, bracketed=None):
+    if bracketed is None:
+        bracketed = np.ones(lower.shape, dtype=bool)
+    side = np.zeros(lower.shape)
+    phi = 0.5 * (lower + upper)
+    for _ in range(PHI_ITERATIONS):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            phi = np.where(bracketed, (lower * f_upper - upper * f_lower) / (f_upper - f_lower), 0.5 * (lower + upper))
+        f = residual(phi)
+        if np.all((np.abs(f) <= PHI_TOL) | (upper - lower <= PHI_TOL) | ~bracketed):
+            break
+        below = f < 0
+        f_upper = np.where(below & (side < 0), 0.5 * f_upper, f_upper)
+        f_lower = np.where(~below & (side > 0), 0.5 * f_lower, f_lower)
+        lower, f_lower = np.where(below, phi, lower), np.where(below, f, f_lower)
+        upper, f_upper = np.where(below, upper, phi), np.where(below, f_upper, f)
+        side = np.where(below, -1, 1)
+    return phi
+
+
+# propulsive efficiency T V / P
+def efficiency(thrust, vel, power):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(power != 0, thrust * vel / power, 0.0)
+
+
+# efficiency of an ideal actuator disk producing the same thrust
+def ideal_efficiency(thrust, vel, rho, r_tip):
+    t_coef = 2 * thrust / (rho * np.maximum(vel, 1e-6)**2 * np.pi * r_tip**2)
+    return 2 / (1 + np.sqrt(np.maximum(1 + t_coef, 0.0)))
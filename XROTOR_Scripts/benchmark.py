@@ -0,0 +1,240 @@
+import os
+import json
+import time
+import shutil
+import threading
+import platform
+import tempfile
+import argparse
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import xrotor
+import fake_xrotor
+import file_tools
+import make_prop
+import run_prop
+import designs
+
+# Benchmarks for the sweep pipeline. Runs against fake_xrotor so it works on machines without the windows executable,
+# and since fake_xrotor is deterministic the only thing that changes between runs is the time taken.
+#     python benchmark.py [--repeats N] [--json out/benchmark.json] [--suite finalize|pipeline|all]
+#
+# The pipeline suite runs ConstantPower, ConstantRPM and VariablePitch end to end and times these stages of each run:
+#   evaluate: evaluate_aero, which is broken down into
+#       spawn: starting XROTOR processes
+#       geometry: building the blade geometry and airfoil section commands with set_geom, init_foils and set_foils
+#       send: writing commands to XROTOR
+#       wait: waiting on XROTOR to work through the commands, solve and write or print its solutions, and exit
+#       parse: reading solutions with ExtractAero and ExtractStructural
+#       other: the rest of evaluate_aero, such as building the rest of the command streams
+#   compile: compile_data
+#   plot: every plot_aero plot
+#   total: evaluate, compile and plot
+# The breakdown is timed inside the same evaluate_aero, so spawn, geometry, send, wait, parse and other add up to
+# evaluate. With more than one worker the stages add up the time of every worker, so they overlap and other is left
+# out. Each stage is the median over --repeats runs. Results are printed and written to the --json file as a
+# dictionary of seconds.
+
+ALUMINUM = {'density': 2710, 'elastic_modulus': 69e9, 'poissons': 0.3}
+WATER = {'density': 1000, 'viscosity': 1e-6, 'speed_sound': 1500}
+AERO_PLOTS = ['thrust', 'torque', 'efficiency', 'RPM', 'coefficients']
+
+
+# the completion loop XRotorSubprocessInterface used before finalize became event driven. Kept only to measure against
+def legacy_kill(process):
+    from threading import Thread
+    thread = Thread(target=process.communicate)
+    thread.start()
+    while thread.is_alive():
+        for i in range(10):
+            time.sleep(0.25)
+
+
+# times spawning the stand-in, sending a short command stream, and waiting for it to exit
+# legacy: True waits with the old polling loop instead of finalize
+def finalize_overhead(calls, legacy=False):
+    times = np.zeros(calls)
+    for i in range(calls):
+        start = time.perf_counter()
+        xr = xrotor.XRotorSubprocessInterface(xrotor_path=fake_xrotor.command())
+        xr('DENS 1000')
+        xr('')
+        if legacy:
+            legacy_kill(xr.process)
+        else:
+            xr.finalize()
+        times[i] = time.perf_counter() - start
+    return times
+
+
+# the functions every call of a stage goes through, as (class or module, function name) pairs
+STAGE_METHODS = {
+    'spawn': [(xrotor.XRotorSubprocessInterface, '_create_process'),
+              (xrotor.XRotorPersistentInterface, '_create_process')],
+    'geometry': [(run_prop, 'set_geom'),
+                 (run_prop, 'init_foils'),
+                 (run_prop, 'set_foils')],
+    'send': [(xrotor.XRotorSubprocessInterface, '_send_text')],
+    'wait': [(xrotor.XRotorInterface, 'finalize'),
+             (xrotor.XRotorPersistentInterface, 'wait_for_file'),
+             (xrotor.XRotorPersistentInterface, 'read_output')],
+    'parse': [(file_tools.ExtractAero, '__init__'),
+              (file_tools.ExtractStructural, '__init__')]
+}
+
+
+# adds up the time spent in each stage of STAGE_METHODS while it is active, across every thread. The methods are
+# wrapped on entering and put back on leaving. A call made from inside another call of the same stage, like
+# XRotorPersistentInterface._create_process calling the subprocess one, is only counted once
+#     with StageTimer() as timer:
+#         design.evaluate_aero()
+#     timer.times['spawn']
+class StageTimer:
+    def __init__(self):
+        self.times = {stage: 0.0 for stage in STAGE_METHODS}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.originals = []
+
+    def __enter__(self):
+        for stage, methods in STAGE_METHODS.items():
+            for owner, name in methods:
+                original = owner.__dict__[name]
+                self.originals.append((owner, name, original))
+                setattr(owner, name, self._timed(stage, original))
+        return self
+
+    def __exit__(self, *_):
+        for owner, name, original in reversed(self.originals):
+            setattr(owner, name, original)
+        self.originals = []
+
+    def _timed(self, stage, method):
+        def timed(*args, **kwargs):
+            depth = getattr(self.local, stage, 0)
+            setattr(self.local, stage, depth + 1)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                setattr(self.local, stage, depth)
+                if depth == 0:
+                    with self.lock:
+                        self.times[stage] += time.perf_counter() - start
+        return timed
+
+
+# runs a design end to end, timing evaluate_aero and its stages, compile_data and plotting. Returns the times in
+# seconds
+def design_times(design, evaluate_options):
+    times = {}
+    start = time.perf_counter()
+    with StageTimer() as timer:
+        design.evaluate_aero(**evaluate_options)
+    times['evaluate'] = time.perf_counter() - start
+    times.update(timer.times)
+    if evaluate_options.get('workers', 1) <= 1:
+        times['other'] = times['evaluate'] - sum(timer.times.values())
+
+    start = time.perf_counter()
+    design.compile_data()
+    times['compile'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for name in AERO_PLOTS:
+        # the thrust plot compares against the power, which a ConstantRPM design doesn't have
+        if name == 'thrust' and design.power is None:
+            continue
+        design.plot_aero(name)
+    times['plot'] = time.perf_counter() - start
+    times['total'] = times['evaluate'] + times['compile'] + times['plot']
+    return times
+
+
+# times every design class with the same propeller and velocities. Each design is run repeats times and every stage
+# is the median of its runs, which is less affected by the odd slow process start than the mean
+# out_folder: where the designs write their files. Removed afterwards
+# evaluate_options: keyword arguments passed to every evaluate_aero, for example {'persistent': True}
+def pipeline(out_folder, repeats=3, evaluate_options=None, vel=None, offsets=None):
+    evaluate_options = {} if evaluate_options is None else evaluate_options
+    vel = np.linspace(0.5, 6, 12) if vel is None else vel
+    offsets = [-4, 0, 4] if offsets is None else offsets
+
+    geom = make_prop.PropGeom('prop_1')
+    geom.init_aero()
+    geom.init_structural(ALUMINUM)
+    eval_structural = np.zeros(len(vel), dtype=bool)
+    eval_structural[len(vel) // 2] = True
+
+    constant_power = designs.ConstantPower(geom, 300, vel, os.path.join(out_folder, 'ConstantPower'),
+                                           eval_structural, WATER, rpm0=300)
+    constant_rpm = designs.ConstantRPM(geom, 400, vel, os.path.join(out_folder, 'ConstantRPM'), eval_structural,
+                                       WATER)
+    variable_pitch = designs.VariablePitch(geom, 300, vel, offsets, os.path.join(out_folder, 'VariablePitch'),
+                                           eval_structural, WATER, rpm0=300)
+
+    results = {}
+    for name, design in [('ConstantPower', constant_power), ('ConstantRPM', constant_rpm),
+                         ('VariablePitch', variable_pitch)]:
+        runs = [design_times(design, evaluate_options) for _ in range(max(repeats, 1))]
+        times = {stage: float(np.median([run[stage] for run in runs])) for stage in runs[0]}
+        times['points'] = len(vel) * (len(offsets) if name == 'VariablePitch' else 1)
+        results[name] = times
+    return results
+
+
+def report(name, times):
+    print(f'{name:<24} mean {1000 * np.mean(times):9.1f} ms   min {1000 * np.min(times):9.1f} ms   '
+          f'max {1000 * np.max(times):9.1f} ms')
+
+
+def report_pipeline(results):
+    stages = ['evaluate', 'spawn', 'geometry', 'send', 'wait', 'parse', 'other', 'compile', 'plot', 'total']
+    print(f'{"design":<16}' + ''.join(f'{stage:>11}' for stage in stages) + '   (ms)')
+    for name, times in results.items():
+        print(f'{name:<16}' + ''.join(f'{1000 * times[stage]:11.2f}' if stage in times else f'{"-":>11}'
+                                      for stage in stages))
+
+
+# description of the machine and software the benchmark ran on, stored next to the results
+def environment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+            'processors': os.cpu_count(), 'xrotor': str(xrotor.XROTOR_PATH)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the XROTOR sweep pipeline against fake_xrotor')
+    parser.add_argument('--repeats', type=int, default=3, help='runs of each design and finalize call')
+    parser.add_argument('--json', default=os.path.join('out', 'benchmark.json'), help='file the results are written to')
+    parser.add_argument('--suite', choices=['finalize', 'pipeline', 'all'], default='all')
+    parser.add_argument('--persistent', action='store_true', help='run the designs through persistent sessions')
+    parser.add_argument('--workers', type=int, default=1, help='XROTOR processes per design')
+    arguments = parser.parse_args()
+
+    xrotor.XROTOR_PATH = fake_xrotor.command()
+    output = {'environment': environment()}
+
+    if arguments.suite in ('finalize', 'all'):
+        legacy_times = finalize_overhead(arguments.repeats, legacy=True)
+        event_times = finalize_overhead(arguments.repeats)
+        report('finalize (legacy poll)', legacy_times)
+        report('finalize (event driven)', event_times)
+        output['finalize'] = {'legacy': float(np.mean(legacy_times)), 'event_driven': float(np.mean(event_times))}
+
+    if arguments.suite in ('pipeline', 'all'):
+        folder = tempfile.mkdtemp(prefix='xrotor_benchmark_')
+        try:
+            options = {'persistent': arguments.persistent, 'workers': arguments.workers}
+            results = pipeline(folder, arguments.repeats, options)
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+        report_pipeline(results)
+        output['pipeline'] = {name: {stage: value if stage == 'points' else float(value)
+                                     for stage, value in times.items()}
+                              for name, times in results.items()}
+
+    if os.path.dirname(arguments.json):
+        os.makedirs(os.path.dirname(arguments.json), exist_ok=True)
+    with open(arguments.json, 'w') as file:
+        json.dump(output, file, indent=2)
@@ -0,0 +1,235 @@
+import os
+import time
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import designs
+import speed_calculations
+
+# Gradient based optimization of the chord and twist distributions of a constant power propeller for race speed, with
+# a limit on the von Mises stress. Every evaluation is a ConstantPower design of a make_prop.PropVariant, compiled and
+# passed to RaceSpeed, with the stress taken from its structural evaluations.
+#
+# The blade is changed through a few control points spread along the radius: a chord scale and a beta offset at each,
+# interpolated linearly onto the sections. The design variables are those changes normalized to [-1, 1] by their
+# bounds. Gradients are forward finite differences, with every perturbed blade of an iteration evaluated in one
+# parallel batch. Evaluations are kept by geometry, so the point a gradient is taken at is never run twice.
+#
+# - out_folder
+#       - evaluations: out_folders of the designs being evaluated. Removed once read unless keep_files is on
+#       - optimal.txt: the optimized blade, in the format of the files in propellers/
+#       - structural.txt: the optimized blade's structural file from write_structural
+
+# names of the timings kept for every iteration, in seconds
+#   evaluate: evaluate_aero, summed over the designs of the iteration
+#   compile: compile_data, summed
+#   race: RaceSpeed, summed
+#   batch: wall time of the parallel batches, which is less than the sums when designs run side by side
+#   optimizer: time spent in the optimizer itself
+#   total: wall time of the iteration
+TIMINGS = ('evaluate', 'compile', 'race', 'batch', 'optimizer', 'total')
+
+
+class BladeOptimizer:
+    # geom: the starting PropGeom, with init_aero and init_structural already called
+    # power, vel_aero, eval_structural, fluid, rpm0, cache: same as ConstantPower. eval_structural picks the velocities
+    #                                                       the stress limit is checked at
+    # race: (drag_coef, frontal_area, sub_mass, initial_gate, final_gate) passed to RaceSpeed
+    # stress_limit: highest von Mises stress allowed, Pa. None leaves the stress unconstrained
+    # controls: number of control points along the radius, for each of chord and beta
+    # chord_bound: largest fractional change of the chord at a control point
+    # beta_bound: largest change of beta at a control point, degrees
+    # step: finite difference step in normalized design variables
+    # evaluate_options: keyword arguments for every evaluate_aero, for example {'sweep': True}
+    # workers: designs evaluated at once. Defaults to one per design in a gradient batch
+    def __init__(self, geom, power, vel_aero, race, out_folder, eval_structural=None, fluid=None, rpm0=200,
+                 stress_limit=None, controls=4, chord_bound=0.3, beta_bound=5.0, step=0.02, evaluate_options=None,
+                 workers=None, cache=None, keep_files=False):
+        if stress_limit is not None and (eval_structural is None or not np.any(eval_structural)):
+            raise ValueError('a stress limit needs at least one velocity in eval_structural')
+        self.geom = geom
+        self.power = power
+        self.vel_list = vel_aero
+        self.race = race
+        self.eval_structural = eval_structural
+        self.fluid = fluid
+        self.rpm0 = rpm0
+        self.stress_limit = stress_limit
+        self.controls = controls
+        self.chord_bound = chord_bound
+        self.beta_bound = beta_bound
+        self.step = step
+        self.evaluate_options = {} if evaluate_options is None else evaluate_options
+        self.workers = 2 * controls + 1 if workers is None else workers
+        self.cache = cache
+        self.keep_files = keep_files
+        self.out_folder = out_folder
+        self.evaluation_folder = os.path.join(out_folder, 'evaluations')
+        self.control_r = np.linspace(geom.r_over_r[0], geom.r_over_r[-1], controls)
+
+        # (speed, stress) and design variables of every blade evaluated, by geometry key
+        self.evaluations = {}
+        self.points = {}
+        # error message of every blade whose evaluation failed, by geometry key
+        self.failures = {}
+        # one dictionary per iteration: iteration, x, speed, stress, designs evaluated and TIMINGS
+        self.history = []
+        # scipy's OptimizeResult, the best variables, blade, race speed and stress. Set by optimize
+        self.result = None
+        self.x = None
+        self.best_geometry = None
+        self.speed = np.nan
+        self.stress = np.nan
+        self._times = dict.fromkeys(TIMINGS, 0.0)
+        self._designs = 0
+        self._lock = threading.Lock()
+
+    # runs SLSQP from the starting blade. Returns the optimized PropVariant, which is also written to out_folder
+    # max_iterations: most optimizer iterations
+    # tol: SLSQP's tolerance on the change of the objective
+    def optimize(self, max_iterations=20, tol=1e-4, verbose=False):
+        from scipy.optimize import minimize
+        os.makedirs(self.evaluation_folder, exist_ok=True)
+        self.history = []
+        x0 = np.zeros(2 * self.controls)
+        self._start_iteration()
+
+        constraints = []
+        if self.stress_limit is not None:
+            constraints.append({'type': 'ineq', 'fun': self._stress_margin, 'jac': self._stress_margin_gradient})
+
+        def callback(x):
+            self._end_iteration(x, verbose)
+
+        self.result = minimize(self._objective, x0, jac=self._objective_gradient, method='SLSQP',
+                               bounds=[(-1, 1)] * len(x0), constraints=constraints, callback=callback,
+                               options={'maxiter': max_iterations, 'ftol': tol})
+        if self._designs:
+            self._end_iteration(self.result.x, verbose)
+
+        # SLSQP ends on its last iterate, which can be infeasible or worse than an earlier one, so the best blade is
+        # picked from every evaluation
+        self.x = self._best_point(self.result.x)
+        self.best_geometry = self.geometry(self.x)
+        self.speed, self.stress = self.evaluate([self.x])[0]
+        self.best_geometry.write_propeller(os.path.join(self.out_folder, 'optimal.txt'))
+        if self.best_geometry.material is not None:
+            self.best_geometry.write_structural(os.path.join(self.out_folder, 'structural.txt'))
+        return self.best_geometry
+
+    # the design variables of the fastest blade evaluated that is within the stress limit, or fallback if none is
+    def _best_point(self, fallback):
+        feasible = [key for key, (speed, stress) in self.evaluations.items() if key not in self.failures
+                    and (self.stress_limit is None or stress <= self.stress_limit)]
+        if not feasible:
+            return fallback
+        return self.points[max(feasible, key=lambda key: self.evaluations[key][0])]
+
+    # the blade described by normalized design variables x
+    def geometry(self, x):
+        x = np.asarray(x, dtype=float)
+        chord_scale = 1 + self.chord_bound * np.interp(self.geom.r_over_r, self.control_r, x[:self.controls])
+        beta_offset = self.beta_bound * np.interp(self.geom.r_over_r, self.control_r, x[self.controls:])
+        return self.geom.variant(c_over_r=self.geom.c_over_r * chord_scale, beta=self.geom.beta + beta_offset)
+
+    # (race speed, max stress) of each of a list of design variables. Blades not evaluated before are run in one
+    # parallel batch
+    def evaluate(self, points):
+        geometries = [self.geometry(x) for x in points]
+        keys = [geometry.geometry_key() for geometry in geometries]
+        new = {key: geometry for key, geometry in zip(keys, geometries) if key not in self.evaluations}
+        self.points.update((key, np.array(x, dtype=float)) for key, x in zip(keys, points) if key in new)
+
+        if new:
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(new)))) as pool:
+                results = list(pool.map(self._evaluate_design, new.items()))
+            self.evaluations.update(zip(new, results))
+            self._times['batch'] += time.perf_counter() - start
+            self._designs += len(new)
+        return [self.evaluations[key] for key in keys]
+
+    def _objective(self, x):
+        return -self.evaluate([x])[0][0]
+
+    def _stress_margin(self, x):
+        return 1 - self.evaluate([x])[0][1] / self.stress_limit
+
+    def _objective_gradient(self, x):
+        return -self._gradient(x)[0]
+
+    def _stress_margin_gradient(self, x):
+        return -self._gradient(x)[1] / self.stress_limit
+
+    # forward difference gradients of the race speed and the stress. The base point and every step are one batch. Steps
+    # that would leave the bounds are taken backwards instead
+    def _gradient(self, x):
+        x = np.asarray(x, dtype=float)
+        steps = np.where(x + self.step > 1, -self.step, self.step)
+        points = [x] + [x + steps[i] * np.eye(len(x))[i] for i in range(len(x))]
+        values = np.array(self.evaluate(points))
+        return (values[1:] - values[0]).T / steps
+
+    # runs one blade. Returns its race speed in knots and its highest von Mises stress in Pa. A blade that XROTOR or
+    # its geometry fails on is recorded in failures and given the penalty values, so one bad blade doesn't end the
+    # optimization
+    def _evaluate_design(self, item):
+        key, geometry = item
+        folder = os.path.join(self.evaluation_folder, key[:16])
+        times = {}
+        try:
+            start = time.perf_counter()
+            design = designs.ConstantPower(geometry, self.power, self.vel_list, folder, self.eval_structural,
+                                           self.fluid, self.rpm0, self.cache)
+            design.evaluate_aero(**self.evaluate_options)
+            times['evaluate'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            design.compile_data()
+            times['compile'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            drag_coef, frontal_area, sub_mass, initial_gate, final_gate = self.race
+            race = speed_calculations.RaceSpeed(design, drag_coef, frontal_area, sub_mass)
+            race.find_recorded_speed(initial_gate, final_gate)
+            times['race'] = time.perf_counter() - start
+        except Exception as error:
+            with self._lock:
+                self.failures[key] = f'{type(error).__name__}: {error}'.replace('\n', ' ')
+            return self._penalty()
+        finally:
+            if not self.keep_files:
+                shutil.rmtree(folder, ignore_errors=True)
+
+        with self._lock:
+            for name, seconds in times.items():
+                self._times[name] += seconds
+        stresses = [np.nanmax(result.von_misses) for result in design.structural
+                    if result is not None and result.von_misses is not None]
+        # a blade that can't reach the gates has no race speed. Counting it as standing still keeps the objective finite
+        speed = 0.0 if np.isnan(race.max_speed) else race.max_speed
+        return speed, max(stresses) if stresses else 0.0
+
+    # (speed, stress) of a blade that couldn't be evaluated. SLSQP can't step past NaN, so it is finite: standing still,
+    # and twice the stress limit so the blade is never feasible
+    def _penalty(self):
+        return 0.0, 0.0 if self.stress_limit is None else 2.0 * self.stress_limit
+
+    def _start_iteration(self):
+        self._times = dict.fromkeys(TIMINGS, 0.0)
+        self._designs = 0
+        self._iteration_start = time.perf_counter()
+
+    # records the iteration that ended at x
+    def _end_iteration(self, x, verbose):
+        speed, stress = self.evaluate([x])[0]
+        total = time.perf_counter() - self._iteration_start
+        times = dict(self._times, total=total, optimizer=max(total - self._times['batch'], 0.0))
+        self.history.append({'iteration': len(self.history) + 1, 'x': np.array(x), 'speed': speed, 'stress': stress,
+                             'designs': self._designs, **times})
+        if verbose:
+            print(f"iteration {len(self.history)}: speed {speed:.4f} knots, stress {stress / 1e6:.1f} MPa, "
+                  f"{self._designs} designs, batch {times['batch']:.2f} s, evaluate {times['evaluate']:.2f} s, "
+                  f"compile {times['compile']:.2f} s, race {times['race']:.2f} s, total {total:.2f} s")
+        self._start_iteration()
@@ -1,10 +1,19 @@
 import os
+import shutil
 import file_tools
 import run_prop
+import bem
+import result_store
+import stress
 import numpy as np
 import matplotlib.pyplot as plt
 import graphing
 
+# XROTOR formulations, in the order they are tried when a run doesn't converge
+SOLVERS = ['VRTX', 'POT', 'GRAD']
+# solver_list entry of the velocities the bem engine solved
+BEM_SOLVER = 'bem'
+
 # ConstantPower is a object used to calculate, compile and  plot the performance of a fixed pitch
 # constant power propeller.
 
@@ -26,9 +35,11 @@ class ConstantPower:
     #                  corresponding vel_aero velocity
     # rpm0: a float estimate of the propeller. Used to estimate the reynolds number airfoil performance is evaluated at
     # altitude: a float containing the altitude that the propeller is at. -1 means underwater
+    # cache: optional result_cache.ResultCache. Runs whose XROTOR inputs were seen before are read from it
 
-    def __init__(self, geom, power, vel_aero, out_folder, eval_structural=None, fluid=None, rpm0=200):
+    def __init__(self, geom, power, vel_aero, out_folder, eval_structural=None, fluid=None, rpm0=200, cache=None):
         self.fluid = fluid
+        self.cache = cache
         self.rpm0 = rpm0
         self.geom = geom
         self.vel_list = vel_aero
@@ -43,6 +54,16 @@ class ConstantPower:
         self.advance_ratio = np.zeros(len(self.vel_list))
         self.torque_coef = np.zeros(len(self.vel_list))
         self.thrust_coef = np.zeros(len(self.vel_list))
+        # formulation that converged at each velocity, filled in by evaluate_aero
+        self.solver_list = np.full(len(self.vel_list), '', dtype='<U4')
+        # counts of XROTOR runs from the last evaluate_aero. See _record_convergence
+        self.convergence_stats = None
+        # solutions from the last evaluate_aero by velocity, so compile_data doesn't have to read them back from files
+        self.aero_results = {}
+        # radial distributions from compile_data, one (velocity, station) array per file_tools.RADIAL_KEYS entry
+        self.radial = {}
+        self.stream = False
+        self.archive = True
         self.structural = []
         if eval_structural is None:
             self.eval_structural = np.zeros(len(vel_aero), dtype=bool)
@@ -56,28 +77,270 @@ class ConstantPower:
                           }
 
     # meant to be called after the object is created. Gets aeronautical data by running information through XROTOR.
-    def evaluate_aero(self, verbose=False):
+    # persistent: True runs every velocity through one long lived XROTOR process instead of one process per run
+    # workers: number of XROTOR processes the velocities are spread across. Each point writes the same files as it would
+    #          in a serial run, so compile_data is unaffected
+    # engine: 'xrotor' or 'bem'. 'bem' solves every velocity at once with the in process bem module and writes the
+    #         results in XROTOR's format. Structural evaluations still go through XROTOR
+    # continuation: True seeds each velocity with the rpm that converged at the previous velocity instead of rpm0. The
+    #               formulations are still tried in the order of SOLVERS, so each velocity converges on the same
+    #               formulation as a cold start. With workers the sweep is split into one contiguous run per worker.
+    #               Works best with persistent, where XROTOR also starts from the previous solution
+    # seed_solver: with continuation, True also tries the formulation that converged at the previous velocity first.
+    #              Saves the runs of the formulations a cold start tries before it, but a velocity can then converge on
+    #              a later formulation than a cold start would pick
+    # stream: True reads each solution from XROTOR's screen output instead of a file XROTOR writes
+    # archive: with stream, True still writes every solution to its velocity file. Without stream the files are always
+    #          written
+    # sweep: True sends every velocity to a single XROTOR process per worker, one OPER block per velocity, and only falls
+    #        back to isolated runs for the velocities that don't converge. Takes the place of persistent and
+    #        continuation
+    def evaluate_aero(self, verbose=False, persistent=False, workers=1, engine='xrotor', continuation=False,
+                      stream=False, archive=False, sweep=False, seed_solver=False):
+        self.stream = stream
+        self.archive = archive or not stream
+        self.aero_results = {}
+        self._prepare_folders()
+
+        if engine == 'bem':
+            self._evaluate_bem(verbose)
+            return
+        if engine != 'xrotor':
+            raise ValueError(f"engine must be 'xrotor' or 'bem', not {engine}")
+
+        if sweep:
+            results = self._evaluate_sweep(verbose, workers)
+        elif continuation:
+            # each worker walks a contiguous piece of the sweep, carrying the last converged point forward
+            def segment(indices, session):
+                rpm_estimate = None
+                solver = None
+                results = []
+                for i in indices:
+                    solvers = solver_order(first_solver=solver) if seed_solver else None
+                    results.append(self._evaluate_point(i, self.vel_list[i], verbose, session, rpm_estimate, solvers))
+                    if results[-1][2]:
+                        rpm_estimate, solver = results[-1][0], results[-1][1]
+                return results
+
+            pieces = np.array_split(np.arange(len(self.vel_list)), max(workers, 1))
+            pieces = [piece for piece in pieces if len(piece) > 0]
+            results = run_prop.map_points(segment, pieces, self.geom, self.fluid, verbose, persistent, workers,
+                                          stream)
+            results = [result for piece in results for result in piece]
+        else:
+            def point(i, session):
+                return self._evaluate_point(i, self.vel_list[i], verbose, session)
+            results = run_prop.map_points(point, range(len(self.vel_list)), self.geom, self.fluid, verbose,
+                                          persistent, workers, stream)
+        self._record_convergence(results, 'sweep' if sweep else 'continuation' if continuation else 'cold')
+
+    # resets the out_folder and makes the folders the results are written to
+    def _prepare_folders(self):
         self.folder.reset_data()    # resets the base out_folder if it exists and makes a new one
         file_tools.make_folder(self.folder.aero_folder)  # creates an aerodynamic folder within the out_folder
         if True in self.eval_structural:
             file_tools.make_folder(self.folder.structural_folder)
             self.geom.write_structural(self.folder.structural_geometry)
 
+    # evaluates the design on an adaptively refined velocity grid instead of a fixed one. vel_aero is used as the
+    # coarse starting grid. After each round the intervals where the thrust, efficiency or rpm curves bend the most, or
+    # where convergence flips between neighbouring velocities, are split at their midpoint and only the new velocities
+    # are run. Stops when no interval is above tol or the budget is used up. vel_list, eval_structural and every result
+    # list are replaced by the refined, sorted grid, so compile_data and everything after it work as usual
+    # budget: the most velocities evaluated, including the starting grid
+    # tol: how far, as a fraction of the curve's range, a velocity can be from the straight line through its neighbours
+    #      before the intervals on each side of it are split
+    # min_step: smallest spacing between velocities. Velocities are rounded to this, since files are named to 0.01 m/s
+    # verbose, persistent, workers, stream, archive: same as evaluate_aero
+    # Only the velocities of the starting grid keep their eval_structural entry, the ones added are aerodynamic only
+    def evaluate_adaptive(self, budget, tol=0.02, min_step=0.01, verbose=False, persistent=False, workers=1,
+                          stream=False, archive=False):
+        structural = {round(float(vel), 2): evaluate for vel, evaluate in zip(self.vel_list, self.eval_structural)}
+        vel = np.unique(np.round(np.asarray(self.vel_list, dtype=float), 2))
+        self._start_adaptive(stream, archive)
+
+        new = vel
+        while len(new) > 0:
+            self._set_velocities(vel, np.array([structural.get(v, False) for v in vel], dtype=bool))
+            self._evaluate_velocities(new, verbose, persistent, workers)
+            converged, curves = self._adaptive_curves()
+            new = refine_velocities(vel, converged, curves, tol, budget - len(vel), min_step)
+            vel = np.sort(np.concatenate([vel, new]))
+        self._finish_adaptive()
+
+    def _start_adaptive(self, stream, archive):
+        self.stream = stream
+        self.archive = archive or not stream
+        self.aero_results = {}
+        self._adaptive_results = {}
+        self._prepare_folders()
+
+    # replaces the velocities and resizes every result list to match
+    def _set_velocities(self, vel_list, eval_structural):
+        self.vel_list = vel_list
+        self.eval_structural = eval_structural
+        self.converged_list = np.zeros(len(vel_list))
+        self.thrust_list = np.zeros(len(vel_list))
+        self.torque_list = np.zeros(len(vel_list))
+        self.rpm_list = np.zeros(len(vel_list))
+        self.efficiency_list = np.zeros(len(vel_list))
+        self.efficiency_ideal = np.zeros(len(vel_list))
+        self.advance_ratio = np.zeros(len(vel_list))
+        self.torque_coef = np.zeros(len(vel_list))
+        self.thrust_coef = np.zeros(len(vel_list))
+        self.solver_list = np.full(len(vel_list), '', dtype='<U4')
+
+    # runs the velocities in vel, which have to be in vel_list, keeping _evaluate_point's result for each
+    def _evaluate_velocities(self, vel, verbose, persistent, workers):
+        indices = [int(np.searchsorted(self.vel_list, v)) for v in vel]
+
+        def point(i, session):
+            return self._evaluate_point(i, self.vel_list[i], verbose, session)
+        results = run_prop.map_points(point, indices, self.geom, self.fluid, verbose, persistent, workers, self.stream)
+        self._adaptive_results.update(zip(vel, results))
+
+    # whether each velocity converged, and the curves refine_velocities looks at
+    def _adaptive_curves(self):
+        converged = np.array([self.aero_results[vel].converged for vel in self.vel_list], dtype=bool)
+        curves = [np.array([self.aero_results[vel].T for vel in self.vel_list]),
+                  np.array([self.aero_results[vel].eff for vel in self.vel_list]),
+                  np.array([self.aero_results[vel].rpm for vel in self.vel_list])]
+        return converged, curves
+
+    def _finish_adaptive(self):
+        self._record_convergence([self._adaptive_results[vel] for vel in self.vel_list], 'adaptive')
+
+    # runs the velocities as multi point sweeps with the first formulation, each worker sending its share of the
+    # velocities to one XROTOR process. Velocities whose rpm comes out more than 10% above the estimate are swept again
+    # with the corrected reynolds numbers, and only the velocities that still haven't converged are run on their own
+    # through _evaluate_point. Returns the same results as _evaluate_point for every velocity
+    def _evaluate_sweep(self, verbose, workers):
+        pwr = False if self.power is None else self.power
+        estimates = np.full(len(self.vel_list), self._rpm_estimate(), dtype=float)
+        results = [None] * len(self.vel_list)
+
+        def sweep(indices):
+            def piece(indices_piece, _):
+                points = [(self.vel_list[i], estimates[i], self._aero_file(self.vel_list[i])) for i in indices_piece]
+                return run_prop.run_points(self.geom, points, SOLVERS[0], self.fluid, pwr, verbose, self.cache,
+                                           self.stream)
+            pieces = [part for part in np.array_split(np.array(indices), max(workers, 1)) if len(part) > 0]
+            swept = run_prop.map_points(piece, pieces, self.geom, self.fluid, verbose, workers=workers)
+            for indices_piece, contents_piece in zip(pieces, swept):
+                for i, contents in zip(indices_piece, contents_piece):
+                    self.aero_results[self.vel_list[i]] = contents
+                    runs = 1 if results[i] is None else results[i][3] + 1
+                    results[i] = (contents.rpm, SOLVERS[0], contents.converged, runs)
+
+        sweep(list(range(len(self.vel_list))))
+        if pwr is not False:
+            # error between the estimated rpm and actual rpm. Corrects so that the reynolds number guess is more accurate
+            redo = [i for i, (rpm, _, converged, _) in enumerate(results)
+                    if converged and 100*(rpm - estimates[i]) / estimates[i] > 10]
+            estimates[redo] = [results[i][0] for i in redo]
+            if redo:
+                sweep(redo)
+
+        # isolated runs, only for what the sweeps couldn't solve. The formulation the sweep used is tried last
+        failed = [i for i in range(len(self.vel_list)) if not results[i][2]]
+
+        def isolated(i, session):
+            rpm, solver, converged, runs = self._evaluate_point(i, self.vel_list[i], verbose, session, estimates[i],
+                                                                solver_order(last_solver=SOLVERS[0]))
+            return rpm, solver, converged, runs + results[i][3]
+        for i, result in zip(failed, run_prop.map_points(isolated, failed, self.geom, self.fluid, verbose,
+                                                         workers=workers)):
+            results[i] = result
+
+        structural = [i for i in range(len(self.vel_list))
+                      if self.eval_structural[i] and results[i][2] and i not in failed]
+
+        def strength(i, session):
+            self._evaluate_structural(i, self.vel_list[i], results[i][0], results[i][1], verbose, session)
+        run_prop.map_points(strength, structural, self.geom, self.fluid, verbose, workers=workers)
+        return results
+
+    # rpm used to pick the airfoil tables before the rpm is known
+    def _rpm_estimate(self):
+        return self.rpm0
+
+    # runs the structural evaluation at a single velocity
+    def _evaluate_structural(self, i, vel, rpm, solver, verbose, session=None):
+        run_prop.evaluate_strength(self.geom, vel, rpm, solver, self.folder.structural_geometry,
+                                   self.folder.structural_file(vel), self.fluid, verbose, pwr=self.power,
+                                   session=session, cache=self.cache)
+
+    # evaluates the aerodynamic, and if requested structural, data at a single velocity. Returns the rpm, formulation,
+    # whether it converged, and the number of XROTOR runs it took
+    # rpm_estimate: optional rpm of a neighbouring converged velocity. Used in place of rpm0
+    # solvers: optional order the formulations are tried in. Defaults to SOLVERS
+    def _evaluate_point(self, i, vel, verbose, session=None, rpm_estimate=None, solvers=None):
+        if rpm_estimate is None:
+            rpm_estimate = self.rpm0
+
+        # runs XROTOR at the velocity
+        rpm_guess, solver, converged = self._get_convergence(vel, rpm_estimate, verbose, session, solvers)
+        runs = solver_runs(solver, solvers)
+
+        # error between the estimated rpm and actual rpm. Corrects so that the reynolds number guess
+        # is more accurate
+        percent_error = 100*(rpm_guess - rpm_estimate) / rpm_estimate
+        if percent_error > 10:
+            rpm_guess, solver, converged = self._get_convergence(vel, rpm_guess, verbose, session, solvers)
+            runs += solver_runs(solver, solvers)
+
+        if self.eval_structural[i]:
+            # if the data is not aerodynamic data didn't converge don't bother running structural
+            if converged:
+                self._evaluate_structural(i, vel, rpm_guess, solver, verbose, session)
+        return rpm_guess, solver, converged, runs
+
+    # stores the formulation used at each velocity and counts the XROTOR runs. convergence_stats holds
+    #   runs: XROTOR runs made, or velocities solved with the bem engine
+    #   retries: runs past the first at each velocity
+    #   retries_avoided: with continuation, the velocities solved by their first run whose rpm is far enough from
+    #                    _rpm_estimate that a cold start would have run them again to correct the airfoil tables. None
+    #                    for the other modes
+    #   formulations_skipped: with continuation, the runs of formulations ahead of the converged one in SOLVERS that
+    #                         seed_solver didn't try. Not counted as retries avoided, since a cold start could have
+    #                         converged on one of them. None for the other modes
+    # mode: 'cold', 'continuation', 'sweep', 'adaptive', 'optimal' or 'bem', how the velocities were evaluated
+    def _record_convergence(self, results, mode):
+        runs = 0
+        for i, (rpm, solver, converged, point_runs) in enumerate(results):
+            self.solver_list[i] = solver if converged else ''
+            runs += point_runs
+        self.convergence_stats = {'runs': runs, 'retries': runs - len(results), 'retries_avoided': None,
+                                  'formulations_skipped': None}
+        if mode == 'continuation':
+            first_try = [(rpm, solver) for rpm, solver, converged, point_runs in results
+                         if converged and point_runs == 1]
+            estimate = self._rpm_estimate()
+            self.convergence_stats['retries_avoided'] = int(sum(100*(rpm - estimate) / estimate > 10
+                                                                for rpm, _ in first_try))
+            self.convergence_stats['formulations_skipped'] = sum(SOLVERS.index(solver) for _, solver in first_try)
+
+    # solves every velocity with the bem engine and writes each one to its velocity file unless archive is off. Every
+    # converged velocity is recorded with BEM_SOLVER as its formulation
+    def _evaluate_bem(self, verbose):
+        result = self._bem_solve(bem.BEMEngine(self.geom, self.fluid))
+        self._record_convergence([(rpm, BEM_SOLVER, converged, 1)
+                                  for rpm, converged in zip(result.rpm, result.converged)], 'bem')
         for i, vel in enumerate(self.vel_list):
-            # runs XROTOR at the velocity
-            rpm_guess, solver, converged = self._get_convergence(vel, self.rpm0, verbose)
-
-            # error between the estimated rpm and actual rpm. Corrects so that the reynolds number guess
-            # is more accurate
-            percent_error = 100*(rpm_guess - self.rpm0) / self.rpm0
-            if percent_error > 10:
-                rpm_guess, solver, converged = self._get_convergence(vel, rpm_guess, verbose)
-
-            if self.eval_structural[i]:
-                # if the data is not aerodynamic data didn't converge don't bother running structural
-                if converged:
-                    run_prop.evaluate_strength(self.geom, vel, rpm_guess, solver, self.folder.structural_geometry, self.folder.structural_file(vel),
-                                               self.fluid, verbose, pwr=self.power)
+            text = file_tools.format_aero(result.point(i))
+            self.aero_results[vel] = file_tools.ExtractAero(text=text)
+            if self.archive:
+                with open(self.folder.vel_file(vel), 'w') as file:
+                    file.write(text)
+            if self.eval_structural[i] and result.converged[i]:
+                run_prop.evaluate_strength(self.geom, vel, result.rpm[i], xrotor_solver(BEM_SOLVER),
+                                           self.folder.structural_geometry, self.folder.structural_file(vel),
+                                           self.fluid, verbose, pwr=self.power, cache=self.cache)
+
+    # solves every velocity at constant power
+    def _bem_solve(self, engine):
+        return engine.solve_power(self.vel_list, self.power, self.rpm0)
 
     # meant to only be called in evaluate_aero. Cycles through solvers to try to ensure convergence.
     # vel: a float containing the velocity to get aerodynamic data at
@@ -85,37 +348,41 @@ class ConstantPower:
     # contents.rpm: the rpm that the propeller spins at according to XROTOR
     # solver: the solver the caused convergence
     # contents.converged: whether XROTOR ever managed to converge
-    def _get_convergence(self, vel, rpm, verbose):
+    # session: optional XRotorSession the runs are sent to
+    # solvers: optional order the formulations are tried in. Defaults to SOLVERS
+    def _get_convergence(self, vel, rpm, verbose, session=None, solvers=None):
         # run is a function created through _aero_eval. Only input needed is the solver
-        run = self._aero_eval(vel, rpm, verbose)
-
-        solver = "VRTX"
-        run(solver)
-        contents = file_tools.ExtractAero(self.folder.vel_file(vel))
-
-        if not contents.converged:
-            solver = "POT"
-            run(solver)
-            contents = file_tools.ExtractAero(self.folder.vel_file(vel))
+        run = self._aero_eval(vel, rpm, verbose, session)
 
-        if not contents.converged:
-            solver = "GRAD"
-            run(solver)
-            contents = file_tools.ExtractAero(self.folder.vel_file(vel))
+        for solver in SOLVERS if solvers is None else solvers:
+            contents = run(solver)
+            if contents.converged:
+                break
 
         return contents.rpm, solver, contents.converged
 
     # returns a function that runs the XROTOR at a constant power
-    def _aero_eval(self, vel, rpm, verbose):
+    def _aero_eval(self, vel, rpm, verbose, session=None):
         def f(solver):
-            run_prop.run(self.geom, vel, rpm, solver, self.folder.vel_file(vel), self.fluid, self.power, verbose)
+            contents = run_prop.run(self.geom, vel, rpm, solver, self._aero_file(vel), self.fluid, self.power, verbose,
+                                    session, self.cache, self.stream)
+            self.aero_results[vel] = contents
+            return contents
         return f
 
+    # file the solution at vel is written to, or None when streamed solutions aren't archived
+    def _aero_file(self, vel):
+        return self.folder.vel_file(vel) if self.archive else None
+
     # compiles the data in the files output by XROTOR.
     def compile_data(self):
+        self.structural = []
         for i in range(len(self.vel_list)):
-            # creates an object that contains all the desired data
-            file_contents = file_tools.ExtractAero(self.folder.vel_file(self.vel_list[i]))
+            # creates an object that contains all the desired data, reading the file only if it isn't in memory
+            file_contents = self.aero_results.get(self.vel_list[i])
+            if file_contents is None:
+                file_contents = file_tools.ExtractAero(self.folder.vel_file(self.vel_list[i]))
+                self.aero_results[self.vel_list[i]] = file_contents
             # assigns file_contents data
             self.thrust_list[i] = file_contents.T
             self.torque_list[i] = file_contents.Q
@@ -125,21 +392,129 @@ class ConstantPower:
             self.converged_list[i] = file_contents.converged
 
             if not file_contents.converged:
-                self.torque_list[i] = np.NaN
-                self.thrust_list[i] = np.NaN
-                self.efficiency_list[i] = np.NaN
-                self.efficiency_ideal[i] = np.NaN
+                self.torque_list[i] = np.nan
+                self.thrust_list[i] = np.nan
+                self.efficiency_list[i] = np.nan
+                self.efficiency_ideal[i] = np.nan
                 self.structural.append(None)
             else:
                 if self.eval_structural[i]:
                     self.structural.append(file_tools.ExtractStructural(self.folder.structural_file(self.vel_list[i])))
-                    self.structural[i].calc_stress(self.geom.material['elastic_modulus'], self.geom.material['poissons'])
                 else:
                     self.structural.append(None)
+        if any(result is not None for result in self.structural):
+            self._calc_stress()
 
         self.advance_ratio = advance_ratio_equation(self.vel_list, self.rpm_list, self.geom.diam)
         self.thrust_coef = thrust_coef_equation(self.fluid['density'], self.rpm_list, self.geom.diam, self.thrust_list)
         self.torque_coef = torque_coef_equation(self.fluid['density'], self.rpm_list, self.geom.diam, self.torque_list)
+        self.radial = result_store.radial_columns([self.aero_results[vel] if converged else None
+                                                   for vel, converged in zip(self.vel_list, self.converged_list)])
+
+    # runs only the structural evaluation again at every converged velocity asked for, at the rpm and formulation that
+    # compile_data or load_results stored, and replaces structural and its stresses. The aerodynamic results and files
+    # are left alone. Meant for trying a new material from geom.init_structural, or new section properties in
+    # structural/ after make_prop.registry.clear() and init_structural, without running the sweep again
+    # eval_structural: optional bool array of the velocities to evaluate. Defaults to the design's
+    # persistent, workers: same as evaluate_aero. Each worker keeps one XROTOR session for every velocity it runs
+    def evaluate_structural(self, eval_structural=None, verbose=False, persistent=True, workers=1):
+        if eval_structural is not None:
+            self.eval_structural = np.asarray(eval_structural, dtype=bool)
+        file_tools.make_folder(self.folder.structural_folder)
+        self.geom.write_structural(self.folder.structural_geometry)
+
+        points = [i for i in range(len(self.vel_list)) if self.eval_structural[i] and self.converged_list[i]]
+
+        def strength(i, session):
+            vel = self.vel_list[i]
+            solver = xrotor_solver(self.solver_list[i])
+            return run_prop.evaluate_strength(self._structural_geometry(i), vel, self.rpm_list[i], solver,
+                                              self.folder.structural_geometry, self.folder.structural_file(vel),
+                                              self.fluid, verbose, session=session, cache=self.cache)
+        results = run_prop.map_points(strength, points, self.geom, self.fluid, verbose, persistent, workers)
+
+        self.structural = [None] * len(self.vel_list)
+        for i, result in zip(points, results):
+            self.structural[i] = result
+        if results:
+            self._calc_stress()
+
+    # geometry the structural evaluation at velocity i is run on
+    def _structural_geometry(self, i):
+        return self.geom
+
+    # the stresses of every structural evaluation, found in one pass. See stress.StressField, its leading axis is the
+    # velocity
+    # yield_strength: stress the blade yields at, Pa. Defaults to the material's 'yield_strength' when it has one
+    def stress_field(self, yield_strength=None):
+        columns = result_store.structural_columns(self.structural)
+        return self._stress_field(columns['structural_bottom'], columns['structural_top'][..., 0, :],
+                                  {'vel': np.asarray(self.vel_list, dtype=float)}, yield_strength)
+
+    def _stress_field(self, strain, r_over_r, axes, yield_strength):
+        material = self.geom.material
+        if material is None:
+            raise ValueError('the propeller has no material, call init_structural first')
+        if yield_strength is None:
+            yield_strength = material.get('yield_strength')
+        return stress.StressField(strain, r_over_r, material['elastic_modulus'], material['poissons'], yield_strength,
+                                  axes)
+
+    # fills in the stresses of every structural result from one stress_field pass. Each result's arrays are views into
+    # the field
+    def _calc_stress(self):
+        field = self.stress_field()
+        for i, result in enumerate(self.structural):
+            if result is not None:
+                result.sxx, result.syy, result.szz, result.sxy = field.sxx[i], field.syy[i], field.szz[i], field.sxy[i]
+                result.von_misses = field.von_misses[i]
+
+    # the compiled results as a dictionary of arrays. See result_store for the columns
+    def result_columns(self):
+        columns = {
+            'vel': np.asarray(self.vel_list, dtype=float),
+            'thrust': self.thrust_list,
+            'torque': self.torque_list,
+            'rpm': self.rpm_list,
+            'efficiency': self.efficiency_list,
+            'efficiency_ideal': self.efficiency_ideal,
+            'converged': self.converged_list,
+            'solver': self.solver_list,
+            'advance_ratio': self.advance_ratio,
+            'thrust_coef': self.thrust_coef,
+            'torque_coef': self.torque_coef,
+            'eval_structural': np.asarray(self.eval_structural, dtype=bool)
+        }
+        for key, values in self.radial.items():
+            columns[f'radial_{key}'] = values
+        columns.update(result_store.structural_columns(self.structural))
+        return columns
+
+    # writes the compiled results to a single columnar file, out_folder/results.npz by default
+    def save_results(self, file_name=None):
+        result_store.save(self.folder.results_file if file_name is None else file_name, self.result_columns())
+
+    # fills the design in from a file written by save_results, as if evaluate_aero and compile_data had been run. Neither
+    # XROTOR nor any velocity file is touched
+    # mmap: True maps the arrays from the file so they are only read as they are used
+    def load_results(self, file_name=None, mmap=True):
+        self._set_columns(result_store.load(self.folder.results_file if file_name is None else file_name, mmap))
+
+    def _set_columns(self, columns):
+        self.vel_list = columns['vel']
+        self.thrust_list = columns['thrust']
+        self.torque_list = columns['torque']
+        self.rpm_list = columns['rpm']
+        self.efficiency_list = columns['efficiency']
+        self.efficiency_ideal = columns['efficiency_ideal']
+        self.converged_list = columns['converged']
+        self.solver_list = columns['solver']
+        self.advance_ratio = columns['advance_ratio']
+        self.thrust_coef = columns['thrust_coef']
+        self.torque_coef = columns['torque_coef']
+        self.eval_structural = columns['eval_structural']
+        self.radial = {key: columns[f'radial_{key}'] for key in file_tools.RADIAL_KEYS}
+        self.structural = result_store.structural_results(columns)
 
     # creates performance plots
     # name: the name of the plot. ie. "thrust", "torque", "efficiency"
@@ -160,7 +535,10 @@ class ConstantPower:
 
 # edited methods:
 # __init__
-# evaluate_aero
+# _evaluate_point
+# _rpm_estimate
+# _set_velocities
+# _bem_solve
 # _aero_eval
 
 class ConstantRPM(ConstantPower):
@@ -171,29 +549,41 @@ class ConstantRPM(ConstantPower):
     # eval_structural: a 1D float array. True indicates that you want the propellers structural data evaluated at the
     #                  corresponding vel_aero velocity
     # altitude: a float containing the altitude that the propeller is at. -1 means underwater
-    def __init__(self, geom, rpm, vel_aero, out_folder, eval_structural=None, fluid=None):
-        super().__init__(geom, None, vel_aero, out_folder, eval_structural, fluid=fluid)
+    # cache: optional result_cache.ResultCache
+    def __init__(self, geom, rpm, vel_aero, out_folder, eval_structural=None, fluid=None, cache=None):
+        super().__init__(geom, None, vel_aero, out_folder, eval_structural, fluid=fluid, cache=cache)
         self.rpm_list = rpm * np.ones(len(vel_aero))
 
-    # evaluates the aerodynamic data. Creates output files from XROTOR
-    def evaluate_aero(self, verbose=False):
-        self.folder.reset_data()    # resets the base out_folder if it exists and makes a new one
-        file_tools.make_folder(self.folder.aero_folder)  # creates an aerodynamic folder within the out_folder
-        if True in self.eval_structural:
-            file_tools.make_folder(self.folder.structural_folder)
-            self.geom.write_structural(self.folder.structural_geometry)
-
-        for i, vel in enumerate(self.vel_list):
-            _, solver, converged = self._get_convergence(vel, self.rpm_list[0], verbose)
-            if self.eval_structural[i]:
-                if converged:
-                    run_prop.evaluate_strength(self.geom, vel, self.rpm_list[0], solver, self.folder.structural_geometry,
-                                               self.folder.structural_file(vel), self.fluid, verbose)
+    # evaluates the aerodynamic, and if requested structural, data at a single velocity. The rpm is fixed, so
+    # rpm_estimate is ignored
+    def _evaluate_point(self, i, vel, verbose, session=None, rpm_estimate=None, solvers=None):
+        _, solver, converged = self._get_convergence(vel, self.rpm_list[0], verbose, session, solvers)
+        if self.eval_structural[i]:
+            if converged:
+                self._evaluate_structural(i, vel, self.rpm_list[0], solver, verbose, session)
+        return self.rpm_list[0], solver, converged, solver_runs(solver, solvers)
+
+    # the rpm is fixed, so it is known before running
+    def _rpm_estimate(self):
+        return self.rpm_list[0]
+
+    # replaces the velocities, keeping the fixed rpm
+    def _set_velocities(self, vel_list, eval_structural):
+        rpm = self.rpm_list[0]
+        super()._set_velocities(vel_list, eval_structural)
+        self.rpm_list = rpm * np.ones(len(vel_list))
+
+    # solves every velocity at constant rpm
+    def _bem_solve(self, engine):
+        return engine.solve_rpm(self.vel_list, self.rpm_list[0])
 
     # returns a function that runs XROTOR at a constant rpm
-    def _aero_eval(self, vel, rpm, verbose):
+    def _aero_eval(self, vel, rpm, verbose, session=None):
         def func(solver):
-            run_prop.run(self.geom, vel, rpm, solver, self.folder.vel_file(vel), self.fluid, verbose=verbose)
+            contents = run_prop.run(self.geom, vel, rpm, solver, self._aero_file(vel), self.fluid, verbose=verbose,
+                                    session=session, cache=self.cache, stream=self.stream)
+            self.aero_results[vel] = contents
+            return contents
         return func
 
 
@@ -203,6 +593,7 @@ class ConstantRPM(ConstantPower):
 # __init__
 # evaluate_aero
 # compile_data
+# _start_adaptive, _set_velocities, _evaluate_velocities, _adaptive_curves, _finish_adaptive
 # find_ideal
 
 class VariablePitch(ConstantPower):
@@ -215,8 +606,10 @@ class VariablePitch(ConstantPower):
     #                  corresponding vel_aero velocity
     # rpm0: a float estimate of the propeller. Used to estimate the reynolds number airfoil performance is evaluated at
     # altitude: a float containing the altitude that the propeller is at. -1 means underwater
-    def __init__(self, geom, power, vel_aero, offset_list, out_folder, eval_structural=None, fluid=None, rpm0=200):
-        super().__init__(geom, power, vel_aero, out_folder, eval_structural, fluid, rpm0)
+    # cache: optional result_cache.ResultCache shared by every offset
+    def __init__(self, geom, power, vel_aero, offset_list, out_folder, eval_structural=None, fluid=None, rpm0=200,
+                 cache=None):
+        super().__init__(geom, power, vel_aero, out_folder, eval_structural, fluid, rpm0, cache)
         self.offset_list = offset_list
         self.vpp_offset = np.zeros(len(vel_aero))
         self.folder = file_tools.VariableFolder(out_folder)
@@ -224,19 +617,23 @@ class VariablePitch(ConstantPower):
         file_tools.make_folder(self.folder.const_folder)
 
         # creates a ConstantPower object for each angle in offset_list
-        self.constant_propellers = []
-        for offset in self.offset_list:
-            constant_out = os.path.join(self.folder.const_folder, f'{offset:.2f}')
-            offset_geometry = geom.create_offset(offset)
-            self.constant_propellers.append(ConstantPower(offset_geometry, self.power, self.vel_list, constant_out,
-                                                          eval_structural, fluid, rpm0))
+        self.constant_propellers = [self._constant_propeller(offset) for offset in self.offset_list]
+
+    # the ConstantPower design of the blade turned by offset
+    def _constant_propeller(self, offset):
+        constant_out = os.path.join(self.folder.const_folder, f'{offset:.2f}')
+        offset_geometry = self.geom.create_offset(offset)
+        return ConstantPower(offset_geometry, self.power, self.vel_list, constant_out, self.eval_structural, self.fluid,
+                             self.rpm0, self.cache)
 
     # evaluates the aerodynamic data for each ConstantPower design
-    def evaluate_aero(self, verbose=False):
+    def evaluate_aero(self, verbose=False, persistent=False, workers=1, engine='xrotor', stream=False, archive=False,
+                      sweep=False):
         self.folder.reset_data()
         file_tools.make_folder(self.folder.const_folder)
         for constant_prop in self.constant_propellers:
-            constant_prop.evaluate_aero(verbose)
+            constant_prop.evaluate_aero(verbose, persistent, workers, engine, stream=stream, archive=archive,
+                                        sweep=sweep)
 
     # compiles all the XROTOR output files
     def compile_data(self):
@@ -244,8 +641,110 @@ class VariablePitch(ConstantPower):
             constant_prop.compile_data()
         self._find_ideal()
 
+    # adaptive sampling runs every offset at the same velocities, refining where the best offset's curves bend
+    def _start_adaptive(self, stream, archive):
+        self.folder.reset_data()
+        file_tools.make_folder(self.folder.const_folder)
+        for constant_prop in self.constant_propellers:
+            constant_prop._start_adaptive(stream, archive)
+
+    def _set_velocities(self, vel_list, eval_structural):
+        super()._set_velocities(vel_list, eval_structural)
+        self.vpp_offset = np.zeros(len(vel_list))
+        for constant_prop in self.constant_propellers:
+            constant_prop._set_velocities(vel_list, eval_structural)
+
+    def _evaluate_velocities(self, vel, verbose, persistent, workers):
+        for constant_prop in self.constant_propellers:
+            constant_prop._evaluate_velocities(vel, verbose, persistent, workers)
+
+    # the thrust, efficiency and rpm of the offset with the most thrust at each velocity, and that offset
+    def _adaptive_curves(self):
+        converged = []
+        curves = []
+        for constant_prop in self.constant_propellers:
+            prop_converged, prop_curves = constant_prop._adaptive_curves()
+            converged.append(prop_converged)
+            curves.append(prop_curves)
+        converged = np.array(converged)
+        curves = np.array(curves)   # (offset, curve, velocity)
+
+        thrust = np.where(converged, curves[:, 0, :], -np.inf)
+        best = np.argmax(thrust, 0)
+        columns = np.arange(len(self.vel_list))
+        ideal_curves = [curves[best, curve, columns] for curve in range(curves.shape[1])]
+        ideal_curves.append(np.asarray(self.offset_list, dtype=float)[best])
+        return converged.any(0), ideal_curves
+
+    def _finish_adaptive(self):
+        for constant_prop in self.constant_propellers:
+            constant_prop._finish_adaptive()
+
+    # the columns of every offset stacked along a new first axis, plus the offsets. See result_store
+    def result_columns(self):
+        per_offset = [constant_prop.result_columns() for constant_prop in self.constant_propellers]
+        columns = {'offset': np.asarray(self.offset_list, dtype=float)}
+        for name in per_offset[0]:
+            if name.endswith('_keys'):
+                columns[name] = per_offset[0][name]
+            else:
+                columns[name] = np.stack([offset_columns[name] for offset_columns in per_offset])
+        return columns
+
+    # the stresses of every offset at every velocity in one pass. The leading axes of the StressField are the offset and
+    # the velocity
+    def stress_field(self, yield_strength=None):
+        per_offset = [result_store.structural_columns(constant_prop.structural)
+                      for constant_prop in self.constant_propellers]
+        stations = max(columns['structural_top'].shape[-1] for columns in per_offset)
+        shape = (len(self.offset_list), len(self.vel_list))
+        strain = np.full(shape + (len(stress.STRAIN_KEYS), stations), np.nan)
+        r_over_r = np.full(shape + (stations,), np.nan)
+        for i, columns in enumerate(per_offset):
+            # an offset without structural results has no stations
+            if columns['structural_top'].shape[-1] == stations:
+                strain[i] = columns['structural_bottom']
+                r_over_r[i] = columns['structural_top'][..., 0, :]
+        axes = {'offset': np.asarray(self.offset_list, dtype=float), 'vel': np.asarray(self.vel_list, dtype=float)}
+        return self._stress_field(strain, r_over_r, axes, yield_strength)
+
+    # runs the structural evaluation again only on the best offset of each velocity, through each offset's
+    # ConstantPower.evaluate_structural. The other offsets' structural results are dropped, since they would still be
+    # of the old structure. Same arguments as ConstantPower.evaluate_structural
+    def evaluate_structural(self, eval_structural=None, verbose=False, persistent=True, workers=1):
+        if eval_structural is not None:
+            self.eval_structural = np.asarray(eval_structural, dtype=bool)
+        offsets = list(self.offset_list)
+        best = np.array([offsets.index(offset) for offset in self.vpp_offset])
+        for k, constant_prop in enumerate(self.constant_propellers):
+            constant_prop.evaluate_structural(np.asarray(self.eval_structural, dtype=bool) & (best == k), verbose,
+                                              persistent, workers)
+            constant_prop.eval_structural = self.eval_structural
+        self._find_ideal()
+
+    # geometry of the best offset of each velocity, for structural evaluations made from the combined design like
+    # material_study's
+    def _structural_geometry(self, i):
+        return self.constant_propellers[list(self.offset_list).index(self.vpp_offset[i])].geom
+
+    # fills every offset back in from a file written by save_results and picks the best offset at each velocity again.
+    # The velocities and offsets are the file's, which need not be the ones the design was made with
+    def load_results(self, file_name=None, mmap=True):
+        columns = result_store.load(self.folder.results_file if file_name is None else file_name, mmap)
+        existing = {float(offset): constant_prop
+                    for offset, constant_prop in zip(self.offset_list, self.constant_propellers)}
+        self.offset_list = [float(offset) for offset in columns['offset']]
+        self._set_velocities(np.array(columns['vel'][0]), np.array(columns['eval_structural'][0]))
+        self.constant_propellers = [existing[offset] if offset in existing else self._constant_propeller(offset)
+                                    for offset in self.offset_list]
+        for i, constant_prop in enumerate(self.constant_propellers):
+            constant_prop._set_columns({name: values if name.endswith('_keys') else values[i]
+                                        for name, values in columns.items() if name != 'offset'})
+        self._find_ideal()
+
     # compiles data from the ideal angles
     def _find_ideal(self):
+        self.structural = []
         # creates a matrix of the thrust data to find angle with the highest thrust
         thrust_matrix = np.zeros([len(self.offset_list), len(self.vel_list)])
         for i, constant_prop in enumerate(self.constant_propellers):
@@ -267,6 +766,8 @@ class VariablePitch(ConstantPower):
             self.advance_ratio[i] = ideal_propeller.advance_ratio[i]
             self.torque_coef[i] = ideal_propeller.torque_coef[i]
             self.thrust_coef[i] = ideal_propeller.thrust_coef[i]
+            self.converged_list[i] = ideal_propeller.converged_list[i]
+            self.solver_list[i] = ideal_propeller.solver_list[i]
 
             if self.eval_structural[i] is not None:
                 self.structural.append(ideal_propeller.structural[i])
@@ -282,6 +783,198 @@ class VariablePitch(ConstantPower):
         display_plot(disp)
 
 
+# for a variable pitch constant power propeller design. Instead of evaluating a grid of offsets at every velocity like
+# VariablePitch, a bounded Brent search over the pitch offset finds the best offset at each velocity. The search at a
+# velocity starts in a window around the optimum of the previous velocity and only widens to the full bounds when the
+# optimum lands on the window's edge. Inherits from ConstantPower
+# - out_folder
+#       - aero, structural: results at the optimum offset of each velocity, read by compile_data
+#       - constant_pitch
+#           - each offset tried
+#               - velocity files
+
+# edited methods:
+# __init__
+# evaluate_aero
+
+class OptimalPitch(ConstantPower):
+    # geom, power, vel_aero, out_folder, eval_structural, fluid, rpm0, cache: same as ConstantPower
+    # offset_bounds: (lowest, highest) pitch offset in degrees searched at each velocity
+    # objective: 'thrust' or 'efficiency', the quantity maximized at each velocity
+    # tol: tolerance on the optimum offset in degrees
+    # window: half width in degrees of the search window around the previous velocity's optimum
+    def __init__(self, geom, power, vel_aero, offset_bounds, out_folder, eval_structural=None, fluid=None, rpm0=200,
+                 cache=None, objective='thrust', tol=0.05, window=2.0):
+        super().__init__(geom, power, vel_aero, out_folder, eval_structural, fluid, rpm0, cache)
+        if objective not in ('thrust', 'efficiency'):
+            raise ValueError(f"objective must be 'thrust' or 'efficiency', not {objective}")
+        self.offset_bounds = (min(offset_bounds), max(offset_bounds))
+        self.objective = objective
+        self.tol = tol
+        self.window = window
+        self.vpp_offset = np.zeros(len(vel_aero))
+        self.trial_folder = os.path.join(out_folder, 'constant_pitch')
+        # number of offsets run through XROTOR at each velocity
+        self.evaluations = np.zeros(len(vel_aero), dtype=int)
+        self._offset_geometry = {}
+
+    # finds the optimum offset at each velocity. Velocities are split into one contiguous run per worker so each
+    # search can start from its neighbour's optimum. solver_list and convergence_stats are filled in from the optimum
+    # of each velocity and every run its search made
+    def evaluate_aero(self, verbose=False, persistent=False, workers=1):
+        self.aero_results = {}
+        self.folder.reset_data()
+        file_tools.make_folder(self.folder.aero_folder)
+        file_tools.make_folder(self.trial_folder)
+        if True in self.eval_structural:
+            file_tools.make_folder(self.folder.structural_folder)
+            self.geom.write_structural(self.folder.structural_geometry)
+
+        def segment(indices, session):
+            previous = None
+            results = []
+            for i in indices:
+                results.append(self._optimize_point(i, self.vel_list[i], previous, verbose, session))
+                if results[-1][2]:
+                    previous = self.vpp_offset[i], results[-1][0]
+            return results
+
+        pieces = [piece for piece in np.array_split(np.arange(len(self.vel_list)), max(workers, 1)) if len(piece) > 0]
+        results = run_prop.map_points(segment, pieces, self.geom, self.fluid, verbose, persistent, workers)
+        self._record_convergence([result for piece in results for result in piece], 'optimal')
+
+    # searches for the best offset at a single velocity and copies its results into the out_folder. Returns the rpm,
+    # formulation and convergence of the best offset and the number of XROTOR runs the search took, like
+    # _evaluate_point
+    # previous: (offset, rpm) of the previous converged velocity, or None
+    def _optimize_point(self, i, vel, previous, verbose, session):
+        from scipy.optimize import minimize_scalar
+        lowest, highest = self.offset_bounds
+        trials = {}
+        rpm_estimate = None if previous is None else previous[1]
+
+        def negative_objective(offset):
+            offset = round(float(offset), 4)
+            if offset not in trials:
+                trials[offset] = self._run_offset(offset, vel, rpm_estimate, verbose, session)
+            contents = trials[offset][0]
+            if not contents.converged:
+                return np.inf
+            return -(contents.T if self.objective == 'thrust' else contents.eff)
+
+        def search(low, high):
+            return minimize_scalar(negative_objective, bounds=(low, high), method='bounded',
+                                   options={'xatol': self.tol}).x
+
+        if previous is None:
+            best = search(lowest, highest)
+        else:
+            low = max(lowest, previous[0] - self.window)
+            high = min(highest, previous[0] + self.window)
+            best = search(low, high)
+            # the printed thrust is rounded, so a flat objective can stop the search short of a window edge
+            margin = max(2 * self.tol, 0.25 * self.window)
+            at_edge = (best - low < margin and low > lowest) or (high - best < margin and high < highest)
+            if at_edge:
+                best = search(lowest, highest)
+
+        # the best of every offset tried, which includes the search's final point
+        best = min(trials, key=negative_objective)
+        contents, rpm, solver, _ = trials[best]
+        self.vpp_offset[i] = best
+        self.evaluations[i] = len(trials)
+        shutil.copyfile(self._trial_file(best, vel), self.folder.vel_file(vel))
+        self.aero_results[vel] = contents
+
+        if self.eval_structural[i] and contents.converged:
+            run_prop.evaluate_strength(self._geometry(best), vel, rpm, solver, self.folder.structural_geometry,
+                                       self.folder.structural_file(vel), self.fluid, verbose, pwr=self.power,
+                                       session=session, cache=self.cache)
+        return rpm, solver, contents.converged, sum(trial[3] for trial in trials.values())
+
+    # runs XROTOR with the pitch offset at a single velocity. Returns the parsed file, rpm, solver and the number of
+    # XROTOR runs it took
+    def _run_offset(self, offset, vel, rpm_estimate, verbose, session):
+        trial = ConstantPower(self._geometry(offset), self.power, np.array([vel]), self._trial_out(offset),
+                              fluid=self.fluid, rpm0=self.rpm0, cache=self.cache)
+        file_tools.make_folder(trial.folder.aero_folder)
+        rpm, solver, _, runs = trial._evaluate_point(0, vel, verbose, session, rpm_estimate)
+        return trial.aero_results[vel], rpm, solver, runs
+
+    # structural evaluations are run on the optimum offset of each velocity
+    def _structural_geometry(self, i):
+        return self._geometry(self.vpp_offset[i])
+
+    # geometry at an offset. Kept so offsets revisited at other velocities don't copy the geometry again
+    def _geometry(self, offset):
+        if offset not in self._offset_geometry:
+            self._offset_geometry[offset] = self.geom.create_offset(offset)
+        return self._offset_geometry[offset]
+
+    def _trial_out(self, offset):
+        return os.path.join(self.trial_folder, f'{offset:.4f}')
+
+    def _trial_file(self, offset, vel):
+        return file_tools.ConstantFolder(self._trial_out(offset)).vel_file(vel)
+
+
+# picks the velocities to add in a round of adaptive sampling. Returns the midpoints of the intervals where convergence
+# flips between the two ends, or where a curve bends by more than tol at either end, worst first and at most count
+# vel: sorted 1D array of the velocities evaluated so far
+# converged: 1D bool array, whether each velocity converged
+# curves: list of 1D arrays over vel. Only converged values are used
+# min_step: midpoints are rounded to this and intervals too narrow to hold a new velocity are left alone
+def refine_velocities(vel, converged, curves, tol, count, min_step=0.01):
+    if count <= 0 or len(vel) < 2:
+        return np.array([])
+
+    # bend at each interior velocity, as the distance from the line through its neighbours over the curve's range
+    bend = np.zeros(len(vel))
+    neighbours = converged[:-2] & converged[1:-1] & converged[2:]
+    fraction = (vel[1:-1] - vel[:-2]) / (vel[2:] - vel[:-2])
+    for curve in curves:
+        curve = np.asarray(curve, dtype=float)
+        valid = converged & np.isfinite(curve)
+        if np.count_nonzero(valid) < 3:
+            continue
+        scale = np.max(curve[valid]) - np.min(curve[valid])
+        if scale == 0:
+            continue
+        line = curve[:-2] + fraction * (curve[2:] - curve[:-2])
+        error = np.abs(curve[1:-1] - line) / scale
+        bend[1:-1] = np.maximum(bend[1:-1], np.where(neighbours & np.isfinite(error), error, 0))
+
+    # each interval scores the worst bend at either end, and convergence flips always qualify
+    score = np.maximum(bend[:-1], bend[1:])
+    score[converged[:-1] != converged[1:]] = np.inf
+    midpoints = np.round((vel[:-1] + vel[1:]) / 2 / min_step) * min_step
+    room = (midpoints > vel[:-1] + min_step / 2) & (midpoints < vel[1:] - min_step / 2)
+
+    candidates = np.flatnonzero((score > tol) & room)
+    candidates = candidates[np.argsort(-score[candidates], kind='stable')][:count]
+    return np.sort(np.round(midpoints[candidates], 10))
+
+
+# the XROTOR formulation a stored solver_list entry is run again with. Velocities solved without recording one, or by
+# the bem engine, use the first of SOLVERS
+def xrotor_solver(solver):
+    return solver if solver in SOLVERS else SOLVERS[0]
+
+
+# the order formulations are tried in, with last_solver moved to the end or first_solver moved to the front if given
+def solver_order(last_solver=None, first_solver=None):
+    if first_solver is not None:
+        return [first_solver] + [solver for solver in SOLVERS if solver != first_solver]
+    if last_solver is None:
+        return SOLVERS
+    return [solver for solver in SOLVERS if solver != last_solver] + [last_solver]
+
+
+# number of runs _get_convergence took to reach solver, trying the formulations in the order of solvers
+def solver_runs(solver, solvers=None):
+    return (SOLVERS if solvers is None else solvers).index(solver) + 1
+
+
 # equation for the advance coefficient
 def advance_ratio_equation(velocity, rpm, diameter):
     return (60 * velocity) / (rpm * diameter)
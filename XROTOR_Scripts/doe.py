@@ -0,0 +1,261 @@
+import os
+import csv
+import time
+import shutil
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import designs
+import speed_calculations
+
+# Design of experiments over the propeller geometry. Each design is a dictionary of PARAMETERS, turned into a
+# make_prop.PropVariant of a base PropGeom and evaluated with ConstantPower or ConstantRPM. Designs run in parallel, one
+# per worker, and each finished design is appended to a single csv file as soon as it is done. The csv is also the
+# checkpoint: running a study again skips every design already in it, so an interrupted run picks up where it stopped.
+#
+# - out_folder
+#       - results.csv: one row per design, with its parameters and the METRICS
+#       - designs: out_folders of the designs being evaluated. Removed once a design is done unless keep_files is on
+#
+# example:
+#     plan = doe.latin_hypercube({'diam': (0.5, 0.7), 'blades': (2, 4), 'beta_offset': (-5, 5)}, 10000, seed=1)
+#     study = doe.Study(geometry, plan, vel_aero, 'out\\DOE', power=300, rpm0=300, race=(0.04, 0.2636, 400.2, 42, 50))
+#     rows = study.run()
+
+# parameters a design can set, and the value that leaves the base geometry unchanged. diam, hub_diam and blades
+# default to the base geometry's. c_over_r and beta are scaled and then offset
+PARAMETERS = {
+    'diam': None,
+    'hub_diam': None,
+    'blades': None,
+    'chord_scale': 1.0,
+    'chord_offset': 0.0,
+    'beta_scale': 1.0,
+    'beta_offset': 0.0
+}
+
+# summary columns written for every design
+#   peak_thrust: highest thrust over the converged velocities, N
+#   peak_thrust_vel: velocity of the peak thrust, m/s
+#   peak_efficiency: highest efficiency over the converged velocities
+#   converged_fraction: fraction of the velocities that converged
+#   race_speed: recorded speed from RaceSpeed between the race gates, knots. NaN without race
+#   max_von_misses: highest von Mises stress of every structural evaluation, Pa. NaN without structural evaluations
+METRICS = ('peak_thrust', 'peak_thrust_vel', 'peak_efficiency', 'converged_fraction', 'race_speed', 'max_von_misses')
+
+
+# latin hypercube sample of count designs. Each range is split into count equal strata and every stratum is used once
+# ranges: dictionary of parameter name to (lowest, highest). blades is sampled as an integer from lowest to highest
+# seed: seed of the random generator, so the same plan can be made again to resume a study
+def latin_hypercube(ranges, count, seed=None):
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, (low, high) in ranges.items():
+        check_parameter(name)
+        fraction = (rng.permutation(count) + rng.random(count)) / count
+        if name == 'blades':
+            columns[name] = np.minimum(low + np.floor(fraction * (high - low + 1)), high).astype(int)
+        else:
+            columns[name] = low + fraction * (high - low)
+    return [{name: column[i].item() for name, column in columns.items()} for i in range(count)]
+
+
+# every combination of the levels of each parameter
+# levels: dictionary of parameter name to a list of values
+def full_factorial(levels):
+    for name in levels:
+        check_parameter(name)
+    names = list(levels)
+    return [dict(zip(names, values)) for values in itertools.product(*[levels[name] for name in names])]
+
+
+def check_parameter(name):
+    if name not in PARAMETERS:
+        raise ValueError(f'{name} is not a design parameter. Options are {list(PARAMETERS)}')
+
+
+# the PropVariant of geom described by a design's parameters. When diam or hub_diam change the hub's share of the
+# radius, the radial sections are moved so the first one sits at the new hub and the last one stays at the tip, which is
+# what XROTOR expects
+def design_geometry(geom, parameters):
+    value = {**PARAMETERS, **parameters}
+    changes = {
+        'c_over_r': geom.c_over_r * value['chord_scale'] + value['chord_offset'],
+        'beta': geom.beta * value['beta_scale'] + value['beta_offset']
+    }
+    for name in ('diam', 'hub_diam', 'blades'):
+        if value[name] is not None:
+            changes[name] = value[name]
+
+    diam = changes.get('diam', geom.diam)
+    hub_diam = changes.get('hub_diam', geom.hub_diam)
+    if not 0 < hub_diam < diam:
+        raise ValueError(f'the hub diameter {hub_diam} has to be between 0 and the diameter {diam}')
+    hub_ratio = hub_diam / diam
+    if hub_ratio != geom.hub_diam / geom.diam:
+        changes['r_over_r'] = rescale_sections(geom.r_over_r, geom.hub_diam / geom.diam, hub_ratio)
+    return geom.variant(**changes)
+
+
+# maps radial sections from a blade whose hub is at hub_ratio of the radius onto one whose hub is at new_hub_ratio,
+# keeping each section's fraction of the way from the hub to the tip
+def rescale_sections(r_over_r, hub_ratio, new_hub_ratio):
+    return new_hub_ratio + (np.asarray(r_over_r, dtype=float) - hub_ratio) * (1 - new_hub_ratio) / (1 - hub_ratio)
+
+
+# A set of designs evaluated over the same velocities
+class Study:
+    # geom: base PropGeom, with init_aero and, for structural results, init_structural already called
+    # plan: list of design parameter dictionaries, from latin_hypercube, full_factorial or made by hand
+    # vel_aero, eval_structural, fluid: same as ConstantPower
+    # out_folder: folder the csv and the design folders are written to
+    # power: power of a ConstantPower design. Leave as None and give rpm for ConstantRPM designs
+    # rpm: rpm of a ConstantRPM design
+    # rpm0: rpm estimate of ConstantPower designs
+    # race: optional (drag_coef, frontal_area, sub_mass, initial_gate, final_gate) used to find the race speed
+    # evaluate_options: keyword arguments for every evaluate_aero, for example {'engine': 'bem'} or {'sweep': True}
+    # keep_files: True keeps every design's out_folder instead of removing it once its row is written
+    def __init__(self, geom, plan, vel_aero, out_folder, power=None, rpm=None, eval_structural=None, fluid=None,
+                 rpm0=200, race=None, evaluate_options=None, keep_files=False):
+        if (power is None) == (rpm is None):
+            raise ValueError('give either a power for ConstantPower designs or an rpm for ConstantRPM designs')
+        self.geom = geom
+        self.plan = plan
+        self.vel_list = vel_aero
+        self.eval_structural = eval_structural
+        self.fluid = fluid
+        self.power = power
+        self.rpm = rpm
+        self.rpm0 = rpm0
+        self.race = race
+        self.evaluate_options = {} if evaluate_options is None else evaluate_options
+        self.keep_files = keep_files
+        self.out_folder = out_folder
+        self.results_file = os.path.join(out_folder, 'results.csv')
+        self.design_folder = os.path.join(out_folder, 'designs')
+        self.parameters = sorted({name for design in plan for name in design}, key=list(PARAMETERS).index)
+        self.fields = ['design'] + self.parameters + list(METRICS) + ['status', 'seconds']
+        self._lock = threading.Lock()
+
+    # evaluates every design not already in the csv, workers at a time, and returns every row of the csv in design
+    # order. Designs that raise are written with their error as the status, so they aren't run again on resume
+    def run(self, workers=None, verbose=False):
+        workers = os.cpu_count() if workers is None else workers
+        os.makedirs(self.design_folder, exist_ok=True)
+        done = self._read_checkpoint()
+        remaining = [i for i in range(len(self.plan)) if i not in done]
+        if verbose:
+            print(f'{len(done)} designs already done, {len(remaining)} to run')
+
+        with open(self.results_file, 'a', newline='') as file:
+            writer = csv.DictWriter(file, self.fields)
+            if file.tell() == 0:
+                writer.writeheader()
+                file.flush()
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+                futures = [pool.submit(self._evaluate, i) for i in remaining]
+                for count, future in enumerate(as_completed(futures)):
+                    with self._lock:
+                        writer.writerow(future.result())
+                        file.flush()
+                        os.fsync(file.fileno())
+                    if verbose:
+                        print(f'design {count + 1} of {len(remaining)} done')
+        return self.read_results()
+
+    # the rows of the csv in design order, with numbers converted back from text
+    def read_results(self):
+        rows = []
+        with open(self.results_file, newline='') as file:
+            for row in csv.DictReader(file):
+                if None in row.values() or None in row:
+                    continue
+                rows.append({key: value if key == 'status' else to_number(value) for key, value in row.items()})
+        return sorted(rows, key=lambda row: row['design'])
+
+    # designs already in the csv. A row cut short by an interruption is removed so the file can be appended to, and a
+    # csv written for a different plan raises instead of being mixed in
+    def _read_checkpoint(self):
+        if not os.path.exists(self.results_file):
+            return set()
+        with open(self.results_file, 'rb+') as file:
+            text = file.read()
+            if text and not text.endswith(b'\n'):
+                file.truncate(text.rfind(b'\n') + 1)
+
+        done = set()
+        with open(self.results_file, newline='') as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames is None:
+                return done
+            if reader.fieldnames != self.fields:
+                raise ValueError(f'{self.results_file} has the columns {reader.fieldnames}, not {self.fields}')
+            for row in reader:
+                i = int(row['design'])
+                expected = self.plan[i] if i < len(self.plan) else None
+                if expected is None or any(not np.isclose(float(row[name]), expected.get(name, np.nan))
+                                           for name in self.parameters if name in expected):
+                    raise ValueError(f'{self.results_file} was written for a different plan, design {i} differs')
+                done.add(i)
+        return done
+
+    # evaluates one design and returns its csv row
+    def _evaluate(self, i):
+        start = time.perf_counter()
+        row = {'design': i, **{name: self.plan[i].get(name, '') for name in self.parameters}}
+        folder = os.path.join(self.design_folder, f'{i:05d}')
+        try:
+            design = self._design(design_geometry(self.geom, self.plan[i]), folder)
+            design.evaluate_aero(**self.evaluate_options)
+            design.compile_data()
+            row.update(self._metrics(design))
+            row['status'] = 'ok'
+        except Exception as error:
+            row.update({key: np.nan for key in METRICS})
+            row['status'] = f'error: {type(error).__name__}: {error}'.replace('\n', ' ')
+        finally:
+            if not self.keep_files:
+                shutil.rmtree(folder, ignore_errors=True)
+        row['seconds'] = time.perf_counter() - start
+        return row
+
+    def _design(self, geom, folder):
+        if self.power is not None:
+            return designs.ConstantPower(geom, self.power, self.vel_list, folder, self.eval_structural, self.fluid,
+                                         self.rpm0)
+        return designs.ConstantRPM(geom, self.rpm, self.vel_list, folder, self.eval_structural, self.fluid)
+
+    # summary METRICS of a compiled design
+    def _metrics(self, design):
+        metrics = {key: np.nan for key in METRICS}
+        converged = np.asarray(design.converged_list, dtype=bool)
+        metrics['converged_fraction'] = np.mean(converged)
+        if np.any(converged):
+            peak = np.nanargmax(np.where(converged, design.thrust_list, -np.inf))
+            metrics['peak_thrust'] = design.thrust_list[peak]
+            metrics['peak_thrust_vel'] = design.vel_list[peak]
+            metrics['peak_efficiency'] = np.nanmax(np.where(converged, design.efficiency_list, np.nan))
+
+        stresses = [np.nanmax(result.von_misses) for result in design.structural
+                    if result is not None and result.von_misses is not None]
+        if stresses:
+            metrics['max_von_misses'] = np.nanmax(stresses)
+
+        if self.race is not None:
+            drag_coef, frontal_area, sub_mass, initial_gate, final_gate = self.race
+            speed = speed_calculations.RaceSpeed(design, drag_coef, frontal_area, sub_mass)
+            speed.find_recorded_speed(initial_gate, final_gate)
+            metrics['race_speed'] = speed.max_speed
+        return metrics
+
+
+# csv text back to an int or float where it is one
+def to_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        try:
+            return float(text)
+        except ValueError:
+            return text
@@ -0,0 +1,375 @@
+import os
+import sys
+import numpy as np
+import bem
+import file_tools
+import run_prop
+
+# A stand-in for bin\xrotor.exe that speaks the same menu protocol as XROTOR for the subset of commands sent by
+# run_prop. It reads commands from stdin, answers with prompts on stdout, and writes aerodynamic and structural output
+# files in the format file_tools expects. The aerodynamics come from the bem module, so the numbers are plausible but
+# are not a replacement for XROTOR.
+#
+# Run it by pointing the XROTOR interface at it:
+#     xrotor.XROTOR_PATH = fake_xrotor.command()
+
+# advance ratio below which a formulation reports that it did not converge. Mimics XROTOR struggling at heavily
+# loaded operating points so that the solver fallbacks get exercised.
+MIN_ADVANCE_RATIO = {'VRTX': 0.15, 'POT': 0.08, 'GRAD': 0.0}
+
+
+# returns the command used to launch this stand-in executable
+def command():
+    return [sys.executable, os.path.abspath(__file__)]
+
+
+class FakeXRotor:
+    def __init__(self, stdin, stdout):
+        self.stdin = stdin
+        self.stdout = stdout
+
+        self.rho = 1.226
+        self.mu = 1.78e-5
+        self.vsound = 340.0
+
+        self.blades = 2
+        self.r_tip = 1.0
+        self.r_hub = 0.1
+        self.geometry = None
+
+        # aerodynamic sections. Each entry is [r/R, dictionary of section parameters]
+        self.aero = [[0.0, default_section()]]
+        self.new_sections = 0
+
+        self.solver = 'VRTX'
+        self.vel = 0.0
+        self.rpm = 0.0
+        self.solution = None
+
+        self.structure = None
+
+    # reads the next line from stdin. Returns None at the end of the stream
+    def read(self):
+        line = self.stdin.readline()
+        if line == '':
+            return None
+        return line.rstrip('\r\n')
+
+    def prompt(self, text):
+        self.stdout.write(f' {text}\n')
+        self.stdout.flush()
+
+    # reads the argument of a command from the same line or, if it is missing, the next line
+    def argument(self, tokens):
+        if len(tokens) > 1:
+            return ' '.join(tokens[1:])
+        return self.read()
+
+    def main_menu(self):
+        while True:
+            self.prompt('XROTOR^c>')
+            line = self.read()
+            if line is None:
+                return
+            tokens = line.split()
+            if len(tokens) == 0:
+                continue
+            command = tokens[0].upper()
+            if command == 'QUIT':
+                return
+            elif command == 'DENS':
+                self.rho = float(self.argument(tokens))
+            elif command == 'VISC':
+                self.mu = float(self.argument(tokens))
+            elif command == 'VSOU':
+                self.vsound = float(self.argument(tokens))
+            elif command == 'ARBI':
+                self.arbitrary_geometry()
+            elif command == 'AERO':
+                if self.aero_menu() is None:
+                    return
+            elif command == 'OPER':
+                if self.oper_menu() is None:
+                    return
+            elif command == 'BEND':
+                if self.bend_menu() is None:
+                    return
+            else:
+                self.prompt(f"'{line}' command not recognized")
+
+    def arbitrary_geometry(self):
+        self.blades = int(float(self.read()))
+        self.vel = float(self.read())
+        self.r_tip = float(self.read())
+        self.r_hub = float(self.read())
+        num_sections = int(float(self.read()))
+        geometry = np.zeros([num_sections, 3])
+        for i in range(num_sections):
+            geometry[i, :] = [float(token) for token in self.read().split()[:3]]
+        self.geometry = geometry
+        self.read()     # answer to "Any corrections?"
+        self.solution = None
+
+    def aero_menu(self):
+        while True:
+            self.prompt('.AERO^c>')
+            line = self.read()
+            if line is None:
+                return None
+            tokens = line.split()
+            if len(tokens) == 0:
+                return True
+            command = tokens[0].upper()
+            if command == 'NEW':
+                # after the first new section XROTOR asks which section to copy from
+                copy_from = 0
+                if self.new_sections > 0:
+                    copy_from = int(float(self.read())) - 1
+                r_over_r = float(self.read())
+                self.aero.append([r_over_r, dict(self.aero[copy_from][1])])
+                self.aero.sort(key=lambda section: section[0])
+                self.new_sections += 1
+            elif command == 'DEL':
+                index = int(float(self.argument(tokens))) - 1
+                self.read()     # confirmation
+                del self.aero[index]
+            elif command == 'EDIT':
+                index = int(float(self.argument(tokens))) - 1
+                if self.edit_menu(self.aero[index][1]) is None:
+                    return None
+
+    def edit_menu(self, section):
+        while True:
+            self.prompt('..EDIT^c>')
+            line = self.read()
+            if line is None:
+                return None
+            tokens = line.split()
+            if len(tokens) == 0:
+                return True
+            command = tokens[0].upper()
+            if command == 'LIFT':
+                for key in run_prop.LIFT_KEYS:
+                    section[key] = float(self.read())
+            elif command == 'DRAG':
+                for key in run_prop.DRAG_KEYS:
+                    section[key] = float(self.read())
+
+    def oper_menu(self):
+        while True:
+            self.prompt('.OPERv^c>')
+            line = self.read()
+            if line is None:
+                return None
+            tokens = line.split()
+            if len(tokens) == 0:
+                return True
+            command = tokens[0].upper()
+            if command == 'FORM':
+                self.formulation_menu()
+            elif command == 'ITER':
+                self.argument(tokens)
+            elif command == 'VELO':
+                self.vel = float(self.argument(tokens))
+            elif command == 'RPM':
+                self.rpm = float(self.argument(tokens))
+                self.solve(rpm=self.rpm)
+            elif command == 'POWE':
+                power = float(self.argument(tokens))
+                self.read()     # fix pitch or rpm
+                self.solve(power=power)
+            elif command == 'DISP':
+                self.stdout.write(self.aero_output())
+                self.stdout.flush()
+            elif command == 'WRIT':
+                file_name = self.argument(tokens)
+                with open(file_name, 'w') as file:
+                    file.write(self.aero_output())
+
+    def formulation_menu(self):
+        while True:
+            line = self.read()
+            if line is None or line.strip() == '':
+                return
+            if line.strip().upper() in MIN_ADVANCE_RATIO:
+                self.solver = line.strip().upper()
+
+    def bend_menu(self):
+        while True:
+            self.prompt('.BEND^c>')
+            line = self.read()
+            if line is None:
+                return None
+            tokens = line.split()
+            if len(tokens) == 0:
+                return True
+            command = tokens[0].upper()
+            if command == 'READ':
+                self.structure = np.loadtxt(self.argument(tokens), skiprows=3, ndmin=2)
+            elif command == 'EVAL':
+                self.structural_solution = self.bend()
+            elif command == 'WRIT':
+                with open(self.argument(tokens), 'w') as file:
+                    file.write(self.structural_output())
+
+    # interpolates the geometry and the aerodynamic section data onto the radial stations
+    def blade(self):
+        xi = bem.stations(self.r_hub / self.r_tip)
+        c_over_r = np.interp(xi, self.geometry[:, 0], self.geometry[:, 1])
+        beta = np.interp(xi, self.geometry[:, 0], self.geometry[:, 2])
+        sections = {}
+        section_r = np.array([section[0] for section in self.aero])
+        for key in run_prop.LIFT_KEYS + run_prop.DRAG_KEYS:
+            values = np.array([section[1][key] for section in self.aero])
+            sections[key] = np.interp(xi, section_r, values)
+        return xi, c_over_r, beta, sections
+
+    # solves the operating point at the current velocity for either a fixed rpm or a fixed power
+    def solve(self, rpm=None, power=None):
+        if self.geometry is None:
+            self.prompt('*** No geometry defined')
+            return
+        blade = self.blade()
+        if rpm is None:
+            rpm = rpm_at_power(self, blade, power)
+        converged = rpm is not None and np.isfinite(rpm)
+        if not converged:
+            rpm = self.rpm if self.rpm > 0 else 1.0
+        self.rpm = rpm
+        solution = element_loads(self, blade, rpm)
+        advance = self.vel * 60 / (rpm * 2 * self.r_tip)
+        if advance < MIN_ADVANCE_RATIO[self.solver]:
+            converged = False
+        solution['converged'] = converged
+        self.solution = solution
+        self.stdout.write(self.aero_output())
+        self.stdout.flush()
+
+    def aero_output(self):
+        if self.solution is None:
+            return '\n'
+        solution = self.solution
+        point = {
+            'blades': self.blades, 'radius': self.r_tip, 'hub_radius': self.r_hub,
+            'rho': self.rho, 'vsound': self.vsound, 'mu': self.mu,
+            'vel': self.vel, 'rpm': solution['rpm'], 'thrust': solution['thrust'], 'power': solution['power'],
+            'torque': solution['torque'], 'converged': solution['converged'],
+            'efficiency': bem.efficiency(solution['thrust'], self.vel, solution['power']),
+            'eff_ideal': bem.ideal_efficiency(solution['thrust'], self.vel, self.rho, self.r_tip),
+            'r_over_r': solution['xi'], 'c_over_r': solution['c_over_r'], 'beta': solution['beta'],
+            'cl': solution['cl'], 'cd': solution['cd'], 're': solution['re'], 'mach': solution['w'] / self.vsound,
+            'induced': solution['a']
+        }
+        return file_tools.format_aero(point)
+
+    # simple cantilever beam model of the blade under the loads of the last solution
+    def bend(self):
+        solution = self.solution
+        r = solution['xi'] * self.r_tip
+        structure = self.structure
+        ei_out = np.interp(r, structure[:, 0], structure[:, 1])
+        ei_in = np.interp(r, structure[:, 0], structure[:, 2])
+        ea = np.interp(r, structure[:, 0], structure[:, 3])
+        gj = np.interp(r, structure[:, 0], structure[:, 4])
+        mass = np.interp(r, structure[:, 0], structure[:, 6])
+        r_st = np.interp(r, structure[:, 0], structure[:, 10])
+
+        omega = solution['rpm'] * np.pi / 30
+        forward_load = solution['dT'] / self.blades
+        tangent_load = solution['dQ'] / (self.blades * r)
+        spanwise_load = mass * omega**2 * r
+
+        forward_force = tip_integral(forward_load, r)
+        tangent_force = tip_integral(tangent_load, r)
+        spanwise_force = tip_integral(spanwise_load, r)
+        forward_moment = tip_integral(forward_force, r)
+        tangent_moment = tip_integral(tangent_force, r)
+        torsion = 0.25 * solution['chord'] * forward_force
+
+        forward_strain = forward_moment * r_st / ei_out
+        tangent_strain = tangent_moment * r_st / ei_in
+        spanwise_strain = spanwise_force / ea
+        shear = torsion * r_st / gj
+        max_strain = np.abs(forward_strain) + np.abs(tangent_strain) + np.abs(spanwise_strain)
+
+        curvature = forward_moment / ei_out
+        forward_displacement = root_integral(root_integral(curvature, r), r)
+        tangent_displacement = root_integral(root_integral(tangent_moment / ei_in, r), r)
+        twist = root_integral(torsion / gj, r)
+
+        return {
+            'xi': solution['xi'],
+            'top': np.column_stack([forward_displacement / self.r_tip, tangent_displacement / self.r_tip,
+                                    np.degrees(twist), forward_moment, tangent_moment, torsion, spanwise_force,
+                                    forward_force, tangent_force]),
+            'bottom': 1000 * np.column_stack([forward_strain, tangent_strain, spanwise_strain, max_strain, shear])
+        }
+
+    def structural_output(self):
+        solution = self.structural_solution
+        lines = ['\n',
+                 ' Blade structural solution\n',
+                 '   i    r/R      u/R       w/R      t(deg)    Mz(N-m)    Mx(N-m)    T(N-m)     P(N)'
+                 '       Sy(N)      Sx(N)\n']
+        for i in range(len(solution['xi'])):
+            values = ' '.join(f'{value:10.3E}' for value in solution['top'][i])
+            lines.append(f'{i + 1:4d} {solution["xi"][i]:7.4f} {values}\n')
+        lines.append('\n')
+        lines.append('   i    r/R    Ex*1000    Ey*1000    Ez*1000  Emax*1000     g*1000\n')
+        for i in range(len(solution['xi'])):
+            values = ' '.join(f'{value:10.3E}' for value in solution['bottom'][i])
+            lines.append(f'{i + 1:4d} {solution["xi"][i]:7.4f} {values}\n')
+        return ''.join(lines)
+
+
+# the aerodynamic section XROTOR starts with before any sections are defined
+def default_section():
+    values = [0.0, 6.28, 0.1, 1.5, -0.5, 0.2, -0.1, 0.013, 0.5, 0.004, 2.0e5, -0.4, 0.8]
+    return dict(zip(run_prop.LIFT_KEYS + run_prop.DRAG_KEYS, values))
+
+
+# blade element momentum solution of the blade at an rpm
+def element_loads(xrotor, blade, rpm):
+    xi, c_over_r, beta, sections = blade
+    fluid = {'density': xrotor.rho, 'viscosity': xrotor.mu / xrotor.rho, 'speed_sound': xrotor.vsound}
+    solution = bem.element_loads(xi, c_over_r, beta, sections, xrotor.blades, xrotor.r_tip, xrotor.vel,
+                                 rpm * np.pi / 30, fluid)
+    solution.update({'xi': xi, 'c_over_r': c_over_r, 'beta': beta, 'rpm': rpm})
+    return solution
+
+
+# finds the rpm that absorbs the requested power through bisection on a log scale. Returns None when no rpm in the
+# search range absorbs that power
+def rpm_at_power(xrotor, blade, power):
+    lower, upper = np.log(1.0), np.log(50000.0)
+    if element_loads(xrotor, blade, np.exp(upper))['power'] < power:
+        return None
+    if element_loads(xrotor, blade, np.exp(lower))['power'] > power:
+        return None
+    for _ in range(50):
+        middle = 0.5 * (lower + upper)
+        if element_loads(xrotor, blade, np.exp(middle))['power'] < power:
+            lower = middle
+        else:
+            upper = middle
+    return np.exp(0.5 * (lower + upper))
+
+
+# integrates a distributed quantity from each station out to the tip
+def tip_integral(values, r):
+    segments = 0.5 * (values[1:] + values[:-1]) * np.diff(r)
+    result = np.zeros(len(r))
+    result[:-1] = np.cumsum(segments[::-1])[::-1]
+    return result
+
+
+# integrates a distributed quantity from the root out to each station
+def root_integral(values, r):
+    segments = 0.5 * (values[1:] + values[:-1]) * np.diff(r)
+    result = np.zeros(len(r))
+    result[1:] = np.cumsum(segments)
+    return result
+
+
+if __name__ == '__main__':
+    FakeXRotor(sys.stdin, sys.stdout).main_menu()
@@ -1,11 +1,42 @@
 import os
 import shutil
 import numpy as np
+import stress
+
+# columns of the radial table XROTOR prints below every solution, in order. re is the actual reynolds number, XROTOR
+# prints it in thousands
+RADIAL_KEYS = ('r_over_r', 'c_over_r', 'beta', 'cl', 'cd', 're', 'mach', 'effi', 'effp', 'induced')
+
+# (start, end) character columns of each RADIAL_KEYS entry in a row of the radial table. The fields are fixed width
+# fortran output, and a field that overflows is filled with * right up to its neighbours, so rows are sliced rather
+# than split on whitespace
+RADIAL_COLUMNS = ((3, 9), (9, 16), (16, 23), (23, 30), (30, 39), (39, 46), (46, 53), (53, 60), (60, 66), (66, 74))
+RADIAL_WIDTH = 74
+# character of a padded table row at each position of each field, right aligned in the width of the widest field.
+# Positions left of a narrower field point at the space added to the end of every row
+FIELD_WIDTH = max(end - start for start, end in RADIAL_COLUMNS)
+FIELD_INDEX = np.full((len(RADIAL_COLUMNS), FIELD_WIDTH), RADIAL_WIDTH)
+for _column, (_start, _end) in enumerate(RADIAL_COLUMNS):
+    FIELD_INDEX[_column, FIELD_WIDTH - (_end - _start):] = np.arange(_start, _end)
+
+# label of each summary line ExtractAero reads, and the attributes its three values go to. None skips a value
+HEADER_LINES = (
+    ('radius(m)', (None, 'rad', None)),
+    ('thrust(N)', ('T', 'pwr', 'Q')),
+    ('Efficiency :', ('eff', 'vel', 'rpm')),
+    ('Eff ideal', (None, 'eff_ideal', None))
+)
 
 
 # extracts the data from a XROTOR aerodynamic output file
+# file_name: file written by XROTOR's WRIT command
+# text: the same output already in memory, for example a solution read from XROTOR's screen output by AeroStream.
+#       Used in place of file_name
+# The summary lines are found with string searches over the whole text, and the radial table, with any number of
+# stations, is read into one preallocated (stations, RADIAL_KEYS) array. Fields XROTOR overflowed with * are NaN. When
+# the text holds more than one solution the last one is read.
 class ExtractAero:
-    def __init__(self, file_name):
+    def __init__(self, file_name=None, text=None):
         self.converged = True
         self.rad = 0
         self.T = 0
@@ -15,18 +46,65 @@ class ExtractAero:
         self.vel = 0
         self.rpm = 0
         self.eff_ideal = 0
-        with open(file_name, 'r') as f:
-            for i, line in enumerate(f):
-                if 'NOT CONVERGED' in line:
-                    self.converged = False
-                if 'radius' in line:
-                    _, self.rad, _ = remove_words(line)
-                if 'thrust' in line:
-                    self.T, self.pwr, self.Q = remove_words(line)
-                if 'Efficiency' in line:
-                    self.eff, self.vel, self.rpm = remove_words(line)
-                if 'Eff ideal' in line:
-                    _, self.eff_ideal, _ = remove_words(line)
+        # the radial table, one row per station and one column per RADIAL_KEYS entry
+        self.table = np.empty((0, len(RADIAL_KEYS)))
+        # radial distributions, one array per RADIAL_KEYS entry with a value per station. Columns of table
+        self.radial = {}
+        if text is None:
+            with open(file_name, 'r') as f:
+                text = f.read()
+        self._parse(text)
+
+    def _parse(self, text):
+        start = text.rfind('=====')
+        start = 0 if start < 0 else start
+        self.converged = 'NOT CONVERGED' not in text[start:]
+        for label, names in HEADER_LINES:
+            line = find_line(text, label, start)
+            if line is not None:
+                for name, value in zip(names, remove_words(line)):
+                    if name is not None:
+                        setattr(self, name, value)
+
+        table_start = text.find('r/R', start)
+        if table_start >= 0:
+            self.table = read_table(text, text.find('\n', table_start) + 1)
+        for column, key in enumerate(RADIAL_KEYS):
+            self.radial[key] = self.table[:, column]
+        self.table[:, RADIAL_KEYS.index('re')] *= 1000
+
+
+# the line of text containing label at or after start, with its newline. None when there is no such line
+def find_line(text, label, start=0):
+    position = text.find(label, start)
+    if position < 0:
+        return None
+    line_start = text.rfind('\n', 0, position) + 1
+    line_end = text.find('\n', position)
+    return text[line_start:] if line_end < 0 else text[line_start:line_end + 1]
+
+
+# reads the rows of a radial table starting at character start into a (stations, RADIAL_KEYS) array. The table ends at
+# the first line that doesn't start with a station number. Every field is gathered into one fixed width byte array and
+# converted in a single call, with overflowed and blank fields swapped for nan first
+def read_table(text, start):
+    lines = text[start:].splitlines()
+    stations = 0
+    while stations < len(lines) and lines[stations][:3].strip().isdigit():
+        stations += 1
+    if stations == 0:
+        return np.empty((0, len(RADIAL_KEYS)))
+
+    rows = [line[:RADIAL_WIDTH] for line in lines[:stations]]
+    short = any(len(row) < RADIAL_WIDTH for row in rows)
+    rows = ''.join([row.ljust(RADIAL_WIDTH + 1) for row in rows])
+    chars = np.frombuffer(rows.encode('ascii', 'replace'), dtype=np.uint8).reshape(stations, RADIAL_WIDTH + 1)
+    fields = chars.take(FIELD_INDEX, axis=1)
+    # checking every field is slower than the conversion itself, so it is only done when the text has a field to swap
+    if '*' in rows or short:
+        missing = np.any(fields == ord('*'), axis=-1) | np.all(fields == ord(' '), axis=-1)
+        fields[missing] = np.frombuffer(b'nan'.rjust(FIELD_WIDTH), dtype=np.uint8)
+    return fields.view(f'S{FIELD_WIDTH}')[..., 0].astype(float)
 
 
 # takes in a line from an aerodynamic file and parses the line into 3 numbers
@@ -37,80 +115,210 @@ def remove_words(line):
     return token_1, token_2, token_3
 
 
+# formats one operating point the same way XROTOR writes it to the screen and to output files, so solutions from
+# fake_xrotor and the bem engine can be read back with ExtractAero
+# point: dictionary with the keys
+#     blades, radius, hub_radius, rho, vsound, mu: propeller and fluid. mu is the dynamic viscosity
+#     vel, rpm, thrust, power, torque, efficiency, eff_ideal, converged: operating point
+#     r_over_r, c_over_r, beta, cl, cd, re, mach, induced: arrays of the radial distributions
+def format_aero(point):
+    vel = point['vel']
+    rpm = point['rpm']
+    radius = point['radius']
+    advance = vel / (rpm * np.pi / 30 * radius) if rpm != 0 else 0.0
+    t_coef = 2 * point['thrust'] / (point['rho'] * max(vel, 1e-6)**2 * np.pi * radius**2)
+    n = rpm / 60
+    d = 2 * radius
+    ct = point['thrust'] / (point['rho'] * n**2 * d**4) if rpm != 0 else 0.0
+    cp = point['power'] / (point['rho'] * n**3 * d**5) if rpm != 0 else 0.0
+    j = vel / (n * d) if rpm != 0 else 0.0
+    title = 'Free Tip Potential Formulation Solution:  '
+    if not point['converged']:
+        title = title + '***** NOT CONVERGED *****'
+
+    def row(label_1, value_1, label_2, value_2, label_3, value_3):
+        return f' {label_1:<11}:{value_1:<14} {label_2:<11}:{value_2:<13} {label_3:<11}:{value_3}\n'
+
+    lines = ['\n',
+             ' ' + '=' * 75 + '\n',
+             f' {title:<74}\n',
+             f'{"Wake adv. ratio:":>66}{field(advance, 11, 5)}\n',
+             row('no. blades', f'{point["blades"]:3d}', 'radius(m)', field(radius, 9, 4),
+                 'adv. ratio', field(advance, 12, 5)),
+             row('thrust(N)', field(point['thrust'], 7, 1), 'power(W)', field(point['power'], 7, 0),
+                 'torque(N-m)', field(point['torque'], 7, 2)),
+             row('Efficiency', field(point['efficiency'], 7, 4), 'speed(m/s)', field(vel, 9, 3),
+                 'rpm', field(rpm, 11, 3)),
+             row('Eff induced', field(min(point['efficiency'] / 0.95, 1.0), 7, 4),
+                 'Eff ideal', field(point['eff_ideal'], 8, 4), 'Tcoef', field(t_coef, 11, 4)),
+             row('Tnacel(N)', field(0.0, 10, 4), 'hub rad.(m)', field(point['hub_radius'], 7, 4),
+                 'disp. rad.', field(0.0, 10, 4)),
+             f' {"Tvisc(N)":<11}:{field(0.0, 10, 4):<14} {"Pvisc(W)":<11}:{field(0.0, 7, 2)}\n',
+             f' {"rho(kg/m3)":<11}:{point["rho"]:10.5f}     {"Vsound(m/s)":<11}:{point["vsound"]:9.3f}     '
+             f'{"mu(kg/m-s)":<11}: {point["mu"]:10.4E}\n',
+             ' ' + '-' * 75 + '\n',
+             f' Sigma: {field(0.0, 10, 5)}\n',
+             f'                Ct: {field(ct, 10, 5)}     Cp: {field(cp, 10, 5)}    J: {field(j, 10, 5)}\n',
+             f'                Tc: {field(t_coef / 2, 10, 5)}     Pc: {field(0.0, 10, 5)}  adv: {field(advance, 10, 5)}\n',
+             '\n',
+             '  i  r/R   c/R  beta(deg)  CL     Cd    REx10^3 Mach   effi  effp  na.u/U\n']
+    for i in range(len(point['r_over_r'])):
+        lines.append(f'{i + 1:3d}{field(point["r_over_r"][i], 6, 3)}{field(point["c_over_r"][i], 7, 4)}'
+                     f'{field(point["beta"][i], 7, 2)}{field(point["cl"][i], 7, 3)}'
+                     f'{field(point["cd"][i], 9, 4)}{field(point["re"][i] / 1000, 7, 2)}'
+                     f'{field(point["mach"][i], 7, 3)}{field(1.0, 7, 3)}{field(point["efficiency"], 6, 3)}'
+                     f'{field(point["induced"][i], 8, 3)}\n')
+    return ''.join(lines)
+
+
+# writes a number into a fixed width field the same way fortran does, filling the field with * when it overflows
+def field(value, width, decimals):
+    if not np.isfinite(value):
+        return '*' * width
+    text = f'{value:{width}.{decimals}f}'
+    if len(text) > width:
+        return '*' * width
+    return text
+
+
+# writes one operating point to file_name in XROTOR's output format. See format_aero for the keys of point
+def write_aero(file_name, point):
+    with open(file_name, 'w') as file:
+        file.write(format_aero(point))
+
+
+# reads operating points out of XROTOR's screen output as it arrives. XROTOR prints the same summary and radial table
+# to the screen that WRIT puts in a file, so solutions can be parsed without a file round trip. Text is fed in whatever
+# pieces it is read in. A solution is complete once the first line after its radial table arrives, which is at the
+# latest the prompt XROTOR shows when it is done.
+class AeroStream:
+    def __init__(self):
+        self.partial = ''       # text after the last newline
+        self.lines = None       # lines of the solution being read
+        self.in_table = False
+        self.text = None        # text of the last complete solution
+        self.solutions = 0      # number of complete solutions read
+        self.prompts = 0        # number of OPER menu prompts read
+        # the last complete solution at each OPER menu prompt, for matching solutions to the commands that printed them
+        self.oper_solutions = []
+
+    def feed(self, text):
+        lines = (self.partial + text).split('\n')
+        self.partial = lines.pop()
+        for line in lines:
+            self._line(line + '\n')
+        # prompts aren't followed by a newline, XROTOR leaves them waiting for input
+        if self.partial.rstrip().endswith('>'):
+            self._line(self.partial)
+            self.partial = ''
+
+    # the last complete solution parsed as an ExtractAero, or None before any solution
+    def result(self):
+        if self.text is None:
+            return None
+        return ExtractAero(text=self.text)
+
+    def _line(self, line):
+        if self.lines is not None:
+            row = line[:3].strip().isdigit()
+            if self.in_table and not row:
+                self.text = ''.join(self.lines)
+                self.solutions += 1
+                self.lines = None
+            else:
+                self.lines.append(line)
+                self.in_table = self.in_table or 'r/R' in line
+        if '=====' in line:
+            self.lines = ['\n', line]
+            self.in_table = False
+        if '.OPER' in line and line.rstrip().endswith('>'):
+            self.prompts += 1
+            self.oper_solutions.append(self.text)
+
+
+# columns of the two tables of a XROTOR structural output file, in order. The top table has the displacements, moments
+# and forces at each station, the bottom table the strains, which XROTOR prints multiplied by 1000
+STRUCTURAL_TOP_KEYS = ('r_over_r', 'forward_displacement', 'tangent_displacement', 'torsional_displacement',
+                       'forward_moment', 'tangent_moment', 'torsion', 'spanwise_force', 'forward_force',
+                       'tangent_force')
+STRUCTURAL_BOTTOM_KEYS = ('forward_strain', 'tangent_strain', 'spanwise_strain', 'max_strain', 'shear')
+
+
 # extracts the data from a XROTOR structural output file
+# file_name: file written by XROTOR's BEND WRIT command. Without one the arrays are left as zeros to be filled in, which
+#            is how result_store rebuilds structural results
+# text: the same output already in memory. Used in place of file_name
+# num_sections: number of stations of the zero arrays made without a file. Files set it from the tables they hold
+# The tables are read into the 2-D arrays top, (stations, STRUCTURAL_TOP_KEYS), and bottom, (stations,
+# STRUCTURAL_BOTTOM_KEYS), each converted in one call. data_top and data_bottom hold their columns as views by name.
 class ExtractStructural:
-    def __init__(self, file_name):
-        # number of airfoil sections made by XROTOR
-        num_sections = 30
+    def __init__(self, file_name=None, text=None, num_sections=30):
         self.sxx = None
         self.syy = None
         self.szz = None
         self.sxy = None
         self.von_misses = None
-
-        self.data_top = {
-            "r_over_r": np.zeros(num_sections),
-            "forward_displacement": np.zeros(num_sections),
-            "tangent_displacement": np.zeros(num_sections),
-            "torsional_displacement": np.zeros(num_sections),
-            "forward_moment": np.zeros(num_sections),
-            "self.tangent_moment": np.zeros(num_sections),
-            "self.torsion": np.zeros(num_sections),
-            "spanwise_force": np.zeros(num_sections),
-            "forward_force": np.zeros(num_sections),
-            "tangent_force": np.zeros(num_sections)
-        }
-
-        self.data_bottom = {
-            "forward_strain": np.zeros(num_sections),
-            "tangent_strain": np.zeros(num_sections),
-            "spanwise_strain": np.zeros(num_sections),
-            "max_strain": np.zeros(num_sections),
-            "shear": np.zeros(num_sections)
-        }
-
-        with open(file_name) as file:
-            # first 3 lines don't include data
-            for _ in range(3):
-                file.readline()
-
-            # takes top section of data. Makes more sense if you look at a structural file
-            for radial_section in range(num_sections):
-                line_array = file.readline().split()
-                for column, dict_name in enumerate(self.data_top.keys()):
-                    self.data_top[dict_name][radial_section] = float(line_array[column + 1])
-
-            # skips 2 lines that don't include data
-            for _ in range(2):
-                file.readline()
-
-            # takes bottom section of data.
-            for radial_section in range(num_sections):
-                line_array = file.readline().split()
-                for column, dict_name in enumerate(self.data_bottom.keys()):
-                    self.data_bottom[dict_name][radial_section] = float(line_array[column + 2])
-
-            # divides all data by 1000
-            for dict_name in self.data_bottom.keys():
-                self.data_bottom[dict_name] = self.data_bottom[dict_name] / 1000
+        self.top = None
+        self.bottom = None
+        self.data_top = {}
+        self.data_bottom = {}
+
+        if file_name is None and text is None:
+            self.set_tables(np.zeros((num_sections, len(STRUCTURAL_TOP_KEYS))),
+                            np.zeros((num_sections, len(STRUCTURAL_BOTTOM_KEYS))))
+            return
+        if text is None:
+            with open(file_name) as file:
+                text = file.read()
+
+        top, bottom = read_structural_tables(text)
+        # the row number and r/R start every bottom row, r/R is already in the top table
+        self.set_tables(top[:, 1:], bottom[:, 2:] / 1000)
+
+    # points top, bottom, data_top and data_bottom at two (stations, columns) arrays without copying them
+    def set_tables(self, top, bottom):
+        self.top = top
+        self.bottom = bottom
+        self.data_top = {key: top[:, column] for column, key in enumerate(STRUCTURAL_TOP_KEYS)}
+        self.data_bottom = {key: bottom[:, column] for column, key in enumerate(STRUCTURAL_BOTTOM_KEYS)}
 
     def calc_stress(self, elastic_modulus, poissons_ratio):
-        self.sxx = (1 - poissons_ratio) * (self.data_bottom['forward_strain'] +
-                    poissons_ratio * (self.data_bottom['tangent_strain'] + self.data_bottom['spanwise_strain']))
-        self.sxx = (elastic_modulus / ((1+poissons_ratio) * (1-2*poissons_ratio))) * self.sxx
-
-        self.syy = (1 - poissons_ratio) * (self.data_bottom['spanwise_strain'] +
-                    poissons_ratio * (self.data_bottom['forward_strain'] + self.data_bottom['tangent_strain']))
-        self.syy = (elastic_modulus / ((1+poissons_ratio) * (1-2*poissons_ratio))) * self.syy
-
-        self.szz = (1 - poissons_ratio) * (self.data_bottom['tangent_strain'] +
-                    poissons_ratio * (self.data_bottom['forward_strain'] + self.data_bottom['spanwise_strain']))
-        self.szz = (elastic_modulus / ((1+poissons_ratio) * (1-2*poissons_ratio))) * self.szz
-
-        self.sxy = (1-2*poissons_ratio) * self.data_bottom['shear']
-        self.sxy = (elastic_modulus / ((1+poissons_ratio) * (1-2*poissons_ratio))) * self.sxy
-
-        self.von_misses = von_misses(self.sxx, self.syy, self.szz, self.sxy)
+        self.sxx, self.syy, self.szz, self.sxy = stress.hooke_stresses(
+            self.data_bottom['forward_strain'], self.data_bottom['tangent_strain'], self.data_bottom['spanwise_strain'],
+            self.data_bottom['shear'], elastic_modulus, poissons_ratio)
+        self.von_misses = stress.von_misses(self.sxx, self.syy, self.szz, self.sxy)
+
+
+# the two tables of a structural output file as 2-D arrays, with the row number still in the first column. A table is
+# a run of lines that start with a row number, so any number of stations is read. Each table is joined and converted in
+# one call. Fields XROTOR overflowed with * are NaN
+def read_structural_tables(text):
+    tables = []
+    rows = []
+    for line in text.splitlines():
+        if line[:6].strip().isdigit():
+            rows.append(line)
+        elif rows:
+            tables.append(rows)
+            rows = []
+    if rows:
+        tables.append(rows)
+    if len(tables) != 2:
+        raise ValueError(f'expected the 2 tables of a structural output file, found {len(tables)}')
+    return table_array(tables[0]), table_array(tables[1])
+
+
+# whitespace separated rows of numbers as a (rows, columns) array
+def table_array(rows):
+    columns = len(rows[0].split())
+    values = np.fromstring(' '.join(rows), sep=' ') if '*' not in ''.join(rows) else np.empty(0)
+    if values.size != len(rows) * columns:
+        values = np.array([np.nan if '*' in value else float(value) for row in rows for value in row.split()])
+    return values.reshape(len(rows), columns)
+
+
+# entries of an out_folder that survive reset_data, so a ResultCache can be kept at <out_folder>/cache
+KEEP_ON_RESET = ('cache',)
 
 
 # manages the folder hierarchy for the ConstantPower design class and ConstantRPM class
@@ -132,12 +340,14 @@ class ConstantFolder:
         self.structural_folder = os.path.join(self.out_folder, 'structural')
         self.structural_plots = os.path.join(self.out_folder, 'structural_plots')
         self.speed_file = os.path.join(self.out_folder, 'max_speed.txt')
+        self.results_file = os.path.join(self.out_folder, 'results.npz')
         self.structural_geometry = os.path.join(self.out_folder, 'structural_geom.txt')
         make_folder(self.out_folder)
 
-    # resets everything. Called before creating new aerodynamic and structural data
+    # resets everything except a result cache kept inside out_folder. Called before creating new aerodynamic and
+    # structural data
     def reset_data(self):
-        clear_path(self.out_folder)
+        clear_path(self.out_folder, keep=KEEP_ON_RESET)
         make_folder(self.out_folder)
 
     # returns a velocity file name
@@ -178,11 +388,12 @@ class VariableFolder:
         self.aero_plots = os.path.join(out_folder, 'aero_plots')
         self.structural_plots = os.path.join(out_folder, 'structural_plots')
         self.speed_file = os.path.join(out_folder, 'max_speed.txt')
+        self.results_file = os.path.join(out_folder, 'results.npz')
         make_folder(out_folder)
 
     # resets the folders prior to evaluating new data
     def reset_data(self):
-        clear_path(self.out_folder)
+        clear_path(self.out_folder, keep=KEEP_ON_RESET)
         make_folder(self.out_folder)
 
     # returns the plot file name
@@ -199,17 +410,27 @@ def overwrite(file):
         os.remove(file)
 
 
-def clear_path(path):
-    if os.path.exists(path):
+# removes path. When keep is given path itself is left in place and only its entries not named in keep are removed
+def clear_path(path, keep=()):
+    if not os.path.exists(path):
+        return
+    if not keep:
         shutil.rmtree(path)
-
-
+        return
+    for name in os.listdir(path):
+        if name in keep:
+            continue
+        entry = os.path.join(path, name)
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        else:
+            os.remove(entry)
+
+
+# workers can make the same folder at once, so one that already exists isn't an error
 def make_folder(path):
-    if not os.path.exists(path):
-        os.mkdir(path)
+    os.makedirs(path, exist_ok=True)
 
 
 def von_misses(sxx, syy, szz, sxy):
-    term1 = (sxx-syy)**2 + (syy-szz)**2 + (szz-sxx)**2
-    term2 = sxy**2
-    return np.sqrt(0.5*term1) + np.sqrt(3*term2)
\ No newline at end of file
+    return stress.von_misses(sxx, syy, szz, sxy)
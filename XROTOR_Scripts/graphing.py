@@ -177,7 +177,7 @@ def nullify_negatives(vector):
     for i in range(len(vector)):
         if not np.isnan(vector[i]):
             if vector[i] < 0:
-                new_vector[i] = np.NaN
+                new_vector[i] = np.nan
     return new_vector
 
 
@@ -186,9 +186,9 @@ def nullify_efficiency(vector):
     for i in range(len(vector)):
         if not np.isnan(vector[i]):
             if vector[i] > 1:
-                new_vector[i] = np.NaN
+                new_vector[i] = np.nan
             elif vector[i] < 0:
-                new_vector[i] = np.NaN
+                new_vector[i] = np.nan
     return new_vector
 
 
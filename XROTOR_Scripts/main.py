@@ -16,10 +16,8 @@ aluminum = {
 geometry.init_structural(aluminum)   # sets the structural information about airfoil
 
 
-a = np.linspace(0.1, 2.5, 10)
-b = np.linspace(2.6, 3.2, 40)
-c = np.linspace(3.2, 3.5, 4)
-vel_aero = np.concatenate((a, b, c), axis=0)
+# coarse starting grid. evaluate_adaptive adds velocities where the curves bend, up to its budget
+vel_aero = np.linspace(0.1, 3.5, 10)
 
 eval_structural = np.zeros(len(vel_aero), dtype=bool)
 eval_structural[0:3] = True
@@ -34,7 +32,7 @@ water = {'density': 1000,
 pwr = 300
 design_pwr = designs.ConstantPower(geometry, pwr, vel_aero, 'out\\ConstPwr', eval_structural, rpm0=300)
 
-design_pwr.evaluate_aero()
+design_pwr.evaluate_adaptive(budget=54)
 design_pwr.compile_data()
 
 design_pwr.plot_aero('thrust', save=True)
@@ -51,7 +49,7 @@ design_pwr.plot_struct('von_misses', save=True)
 rpm = 400
 design_rpm = designs.ConstantRPM(geometry, rpm, vel_aero, 'out\\ConstantRPM', eval_structural, water)
 
-design_rpm.evaluate_aero()
+design_rpm.evaluate_adaptive(budget=54)
 design_rpm.compile_data()
 
 design_rpm.plot_aero('thrust', save=True)
@@ -70,7 +68,7 @@ offset_list = np.linspace(-10, 10, 10)
 design_vpp = designs.VariablePitch(geometry, power, vel_aero, offset_list,
                                    'out\\VPP', eval_structural, fluid=None, rpm0=6000)
 
-design_vpp.evaluate_aero()
+design_vpp.evaluate_adaptive(budget=54)
 design_vpp.compile_data()
 
 design_vpp.plot_aero('thrust', save=True)
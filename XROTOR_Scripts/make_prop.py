@@ -1,6 +1,18 @@
 import numpy as np
 import copy
+import hashlib
 import os
+import threading
+
+
+# columns of an airfoil aerodynamic performance file, in order. Also the keys of FoilAero's performance dictionaries
+FOIL_KEYS = ('reference Re number', 'zero-lift alpha(deg)', 'd(Cl)/d(alpha)', 'd(Cl)/d(alpha)@Stall', 'maximum Cl',
+             'minimum Cl', 'Cl increment to stall', 'Cm', 'minimum Cd', 'Cl at minimum Cd', 'd^2(Cd)/d^2(Cl)',
+             'Re scaling exponent', 'critical mach')
+
+
+# geometry arrays a PropVariant can change
+VARIANT_FIELDS = ('beta', 'c_over_r', 'r_over_r', 'diam', 'hub_diam', 'blades')
 
 
 # defines the path to airfoil aerodynamic performance files
@@ -48,49 +60,115 @@ class PropGeom:
         self.material = None
         # list of Foil objects at each radial location. Handles each airfoils performance information.
         self.foil_aero = []
+        # whether airfoil tables are interpolated in reynolds number. Set by init_aero
+        self.interpolate_re = False
+        # airfoil performance dictionary at each section from the last set_re_blade
+        self.performance = None
         # list of airfoil structural property objects at each radial location
         self.foil_bend = []
 
-    # compiles aerodynamic data for each airfoil on the propeller.
-    def init_aero(self):
-        for i in range(self.num_sections):
-            self.foil_aero.append(FoilAero(aero_path(self.foil_names[i])))
+    # compiles aerodynamic data for each airfoil on the propeller. Each section gets its own copy of the registry's
+    # FoilAero, so set_re on one section leaves the others alone, while sections and propellers using the same airfoil
+    # still share one parsed table
+    # interpolate: True interpolates each section's airfoil table in log(Re) instead of taking the first row above the
+    #              section's reynolds number. See FoilAero.lookup_table
+    def init_aero(self, interpolate=False):
+        self.interpolate_re = interpolate
+        self.foil_aero = [registry.aero(name).copy() for name in self.foil_names]
 
-    # sets the Reynolds number at each airfoil along the blade
+    # sets the Reynolds number at each airfoil along the blade. The performance dictionaries are kept in performance,
+    # since the FoilAero objects are shared
     def set_re_blade(self, v, rpm, nu):
-        omega = rpm * (np.pi/30)
+        self.performance = self.blade_performance(v, rpm, nu)
+
+    # returns the Reynolds number at each airfoil along the blade. v and rpm can be arrays of operating points, which
+    # adds their broadcast shape in front of the section axis
+    def re_blade(self, v, rpm, nu):
+        v = np.asarray(v, dtype=float)[..., None]
+        omega = np.asarray(rpm, dtype=float)[..., None] * (np.pi/30)
         vt = omega * self.r_over_r * self.diam / 2
         v_total = np.sqrt(v**2 + vt**2)
         chord = self.c_over_r * self.diam / 2
-        reynolds = v_total*chord/nu
-        for i, re in enumerate(reynolds):
-            self.foil_aero[i].set_re(re)
+        return v_total*chord/nu
+
+    # returns the airfoil table rows at each section for any number of operating points, with shape
+    # (operating point shape) + (num_sections, len(FOIL_KEYS)). Sections sharing an airfoil are looked up together
+    def blade_table(self, v, rpm, nu):
+        reynolds = self.re_blade(v, rpm, nu)
+        table = np.zeros(reynolds.shape + (len(FOIL_KEYS),))
+        for name in np.unique(self.foil_names):
+            sections = np.flatnonzero(self.foil_names == name)
+            table[..., sections, :] = self.foil_aero[sections[0]].lookup_table(reynolds[..., sections],
+                                                                                self.interpolate_re)
+        return table
 
-    # creates a copy of the geometry object, but with an offset angle distribution. Made for VPP design
+    # returns the airfoil performance dictionary at each section without changing the FoilAero objects. Safe to call
+    # while other threads are using the geometry
+    def blade_performance(self, v, rpm, nu):
+        return [dict(zip(FOIL_KEYS, row)) for row in self.blade_table(v, rpm, nu).tolist()]
+
+    # creates a variant of the geometry with an offset angle distribution. Made for VPP design
     def create_offset(self, offset):
-        prop = copy.deepcopy(self)
-        prop.beta = prop.beta + offset
-        return prop
+        return self.variant(beta=self.beta + offset)
+
+    # creates a PropVariant of the geometry that only stores the arrays in changes. See PropVariant
+    def variant(self, **changes):
+        return PropVariant(self, **changes)
+
+    # hex digest identifying everything about the geometry that changes an XROTOR run. Equal geometries, variants
+    # included, give equal keys
+    def geometry_key(self):
+        digest = hashlib.sha1()
+        digest.update(np.array([self.diam, self.hub_diam, self.blades, self.interpolate_re], dtype=float).tobytes())
+        for values in (self.r_over_r, self.c_over_r, self.beta):
+            digest.update(np.ascontiguousarray(values, dtype=float).tobytes())
+        digest.update(' '.join(self.foil_names).encode())
+        digest.update(repr(sorted((self.material or {}).items())).encode())
+        return digest.hexdigest()
 
     # compiles structural data for each airfoil on the propeller.
-    # material: dictionary with 3 keys: 'density', 'elastic_modulus', and 'poissons'
+    # material: dictionary with 3 keys: 'density', 'elastic_modulus', and 'poissons'. An optional 'yield_strength' is
+    #           used for the safety factors of stress.StressField
     def init_structural(self, material):
         self.material = material
+        self.foil_bend = self._structural_sections(material)
+
+    # the FoilStruct of each section in material
+    def _structural_sections(self, material):
+        foil_bend = []
         for i in range(self.num_sections):
-            self.foil_bend.append(FoilStruct(self.foil_names[i]))
-            self.foil_bend[i].set_material(material['density'], material['elastic_modulus'], material['poissons'])
-            self.foil_bend[i].set_chord(self.r_over_r[i] * self.diam / 2, self.c_over_r[i] * self.diam / 2)
+            foil_bend.append(FoilStruct(self.foil_names[i]))
+            foil_bend[i].set_material(material['density'], material['elastic_modulus'], material['poissons'])
+            foil_bend[i].set_chord(self.r_over_r[i] * self.diam / 2, self.c_over_r[i] * self.diam / 2)
+        return foil_bend
+
+    # writes the geometry out in the format of the files in propellers/, so PropGeom can read it back
+    def write_propeller(self, file_name):
+        with open(file_name, 'w') as file:
+            file.write('# entire lines can be commented out with the "#" character\n')
+            file.write(f'# Propeller Diameter [mm]\n{self.diam}\n')
+            file.write(f'# Hub Diameter [mm]\n{self.hub_diam}\n')
+            file.write(f'# number of blades\n{self.blades}\n')
+            file.write('# r/R c/R  Airfoil  beta\n')
+            for r, c, foil, beta in zip(self.r_over_r, self.c_over_r, self.foil_names, self.beta):
+                file.write(f'{r:.6g} {c:.6g} {foil} {beta:.6g}\n')
 
     # writes out a file of the propellers structural properties in the format XROTOR wants
-    def write_structural(self, file_name):
+    # properties: optional dictionary of one material's (sections,) arrays from section_properties, written in place of
+    #             the sections init_structural made
+    def write_structural(self, file_name, properties=None):
+        if properties is None:
+            sections = [section.main_dict for section in self.foil_bend]
+        else:
+            sections = [{key: values[i] for key, values in properties.items()} for i in range(self.num_sections)]
         with open(file_name, 'w') as file:
             file.write('\n')
             file.write('structural\n')
             file.write('   R      EIout     EIin     EA       GJ        EK       m'
                        '       MXX     xCG/c    xSC/C     rST \n')
 
-            for section in self.foil_bend:
-                rounded_dict = format_dictionary(section.main_dict)
+            for section in sections:
+                rounded_dict = format_dictionary(section)
                 file.write(
                            f"{rounded_dict['R']} {rounded_dict['EIout']} {rounded_dict['EIin']} "
                            f"{rounded_dict['EA']} {rounded_dict['GJ']} {rounded_dict['EK']} "
@@ -99,45 +177,137 @@ class PropGeom:
                            )
 
 
-# Class handles airfoil aerodynamic performance information
+# a PropGeom that only stores the values that differ from a base geometry. Everything else, including the airfoil data,
+# is read from the base, so a variant costs little more than the arrays it changes. The changed arrays are read only,
+# so a variant never changes after it is made. The variant's FoilAero objects are copies of the base's, sharing their
+# tables, so set_re on a variant leaves the base alone. When the chord, radial sections or diameter change the structural
+# sections are rebuilt for the new chords and radii, since they are scaled by them. Both follow the base: they are made
+# again the first time
+# they are used after the base's init_aero or init_structural. init_aero and init_structural on the variant itself give
+# it data of its own, which stops it following the base. Variants of a variant share the first base
+# base: the PropGeom the variant is made from
+# changes: new values for any of VARIANT_FIELDS
+class PropVariant(PropGeom):
+    def __init__(self, base, **changes):
+        # data set by the variant's own init_aero and init_structural
+        self._foil_aero = None
+        self._material = None
+        self._foil_bend = None
+        # (base list, variant list) of the FoilAero copies and rebuilt structural sections made from the base
+        self._aero_copies = (None, None)
+        self._bend_copies = (None, None)
+        if isinstance(base, PropVariant):
+            changes = {**{name: getattr(base, name) for name in base.changed}, **changes}
+            base = base.base
+        self.base = base
+        self.changed = sorted(changes)
+        for name, values in changes.items():
+            if name not in VARIANT_FIELDS:
+                raise ValueError(f'a variant can only change {VARIANT_FIELDS}, not {name}')
+            if name in ('diam', 'hub_diam'):
+                values = float(values)
+            elif name == 'blades':
+                values = int(values)
+            else:
+                values = np.array(values, dtype=float)
+                if values.shape != base.beta.shape:
+                    raise ValueError(f'{name} needs {base.num_sections} sections, not {values.shape}')
+                values.setflags(write=False)
+            setattr(self, name, values)
+        # the base's performance is for its own blade, so a variant starts without one
+        self.performance = None
+
+    # anything the variant doesn't store itself comes from the base
+    def __getattr__(self, name):
+        if name == 'base':
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    @property
+    def foil_aero(self):
+        if self._foil_aero is not None:
+            return self._foil_aero
+        source, copies = self._aero_copies
+        if source is not self.base.foil_aero:
+            source = self.base.foil_aero
+            copies = [foil.copy() for foil in source]
+            self._aero_copies = (source, copies)
+        return copies
+
+    @foil_aero.setter
+    def foil_aero(self, foil_aero):
+        self._foil_aero = foil_aero
+
+    @property
+    def material(self):
+        return self.base.material if self._material is None else self._material
+
+    @material.setter
+    def material(self, material):
+        self._material = material
+
+    @property
+    def foil_bend(self):
+        if self._foil_bend is not None:
+            return self._foil_bend
+        if not {'c_over_r', 'r_over_r', 'diam'} & set(self.changed):
+            return self.base.foil_bend
+        source, sections = self._bend_copies
+        if source is not self.base.foil_bend:
+            source = self.base.foil_bend
+            sections = [] if self.base.material is None else self._structural_sections(self.base.material)
+            self._bend_copies = (source, sections)
+        return sections
+
+    @foil_bend.setter
+    def foil_bend(self, foil_bend):
+        self._foil_bend = foil_bend
+
+
+# Class handles airfoil aerodynamic performance information. The polar of each reynolds number is a row of table, in the
+# column order of FOIL_KEYS, sorted by reynolds number
 class FoilAero:
     def __init__(self, foil_file):
         # dictionary of the airfoil performance at current reynolds number
         self.performance = {}
-        # list of dictionaries containing airfoil performance at several different reynolds numbers
-        self.foil_data = []
-
-        with open(foil_file) as f:
-            f.readline()
-            for line in f:
-                line_array = line.split()
-                line_dict = {
-                    'reference Re number': float(line_array[0]),
-                    'zero-lift alpha(deg)': float(line_array[1]),
-                    'd(Cl)/d(alpha)': float(line_array[2]),
-                    'd(Cl)/d(alpha)@Stall': float(line_array[3]),
-                    'maximum Cl': float(line_array[4]),
-                    'minimum Cl': float(line_array[5]),
-                    'Cl increment to stall': float(line_array[6]),
-                    'Cm': float(line_array[7]),
-                    'minimum Cd': float(line_array[8]),
-                    'Cl at minimum Cd': float(line_array[9]),
-                    'd^2(Cd)/d^2(Cl)': float(line_array[10]),
-                    'Re scaling exponent': float(line_array[11]),
-                    'critical mach': float(line_array[12])
-                }
-                self.foil_data.append(line_dict)
+        # (reynolds numbers, FOIL_KEYS) array of the airfoil performance at several different reynolds numbers
+        table = np.loadtxt(foil_file, skiprows=1, ndmin=2)
+        self.table = table[np.argsort(table[:, 0], kind='stable')]
+        # reynolds number of each row of table
+        self.re_index = self.table[:, 0]
+
+    # a copy with its own performance that shares the read only table. What PropGeom holds, so set_re never changes
+    # the registry's object
+    def copy(self):
+        foil = copy.copy(self)
+        foil.performance = {}
+        return foil
 
     # sets performance to contain data from the proper reynolds number
-    def set_re(self, re):
-        for dictionary in self.foil_data:
-            self.performance = None
-            if dictionary['reference Re number'] > re:
-                self.performance = dictionary
-                break
+    def set_re(self, re, interpolate=False):
+        self.performance = self.lookup(re, interpolate)
+
+    # returns the performance dictionary for the first reynolds number above re
+    def lookup(self, re, interpolate=False):
+        return dict(zip(FOIL_KEYS, self.lookup_table(re, interpolate).tolist()))
 
-        if self.performance is None:
-            self.performance = self.foil_data[-1]
+    # returns the table rows for an array of reynolds numbers, with shape re.shape + (len(FOIL_KEYS),)
+    # interpolate: False takes the first row above each reynolds number, or the last row, like XROTOR's own tables.
+    #              True interpolates every column linearly in log(Re) between the rows on either side, holding the end
+    #              rows outside the table, and sets the reference Re to the reynolds number itself
+    def lookup_table(self, re, interpolate=False):
+        re = np.asarray(re, dtype=float)
+        if not interpolate or len(self.re_index) == 1:
+            rows = np.minimum(np.searchsorted(self.re_index, re, side='right'), len(self.re_index) - 1)
+            return self.table[rows]
+
+        log_index = np.log(self.re_index)
+        log_re = np.clip(np.log(np.maximum(re, self.re_index[0])), log_index[0], log_index[-1])
+        upper = np.clip(np.searchsorted(log_index, log_re, side='right'), 1, len(log_index) - 1)
+        fraction = (log_re - log_index[upper - 1]) / (log_index[upper] - log_index[upper - 1])
+        rows = self.table[upper - 1] + fraction[..., None] * (self.table[upper] - self.table[upper - 1])
+        rows[..., 0] = np.exp(log_re)
+        return rows
 
 
 # Class contains contains all of the information necessary to evaluate the bending, and stress of a propeller through
@@ -145,18 +315,11 @@ class FoilAero:
 class FoilStruct:
     # airfoil: the name of the airfoil
     def __init__(self, airfoil):
-        with open(structural_path(airfoil)) as file:
-            # dictionary containing all the information from a foil structural file
-            self.file_dict = {}
-            self.file_dict.update({'A': get_third(file.readline())})
-            self.file_dict.update({'IYY': get_third(file.readline())})
-            self.file_dict.update({'IXX': get_third(file.readline())})
-            self.file_dict.update({'J': get_third(file.readline())})
-            self.file_dict.update({'XOCG': get_third(file.readline())})
-            self.file_dict.update({'RST': get_third(file.readline())})
-
-            # dictionary of structural information with material and chord length taken into account
-            self.main_dict = {}
+        # read only dictionary containing all the information from a foil structural file, shared through the registry
+        self.file_dict = registry.structural(airfoil)
+
+        # dictionary of structural information with material and chord length taken into account
+        self.main_dict = {}
 
     # sets the material of the airfoil section
     def set_material(self, rho, elastic_modulus, poissons_ratio):
@@ -185,6 +348,144 @@ class FoilStruct:
         self.main_dict['RST'] = chord * self.file_dict['RST']
 
 
+# the structural properties of every section of geom for several materials at once, the same values FoilStruct works
+# out one section and one material at a time. Returns a dictionary with the keys of FoilStruct.main_dict of
+# (materials, sections) arrays
+# materials: list of material dictionaries, see PropGeom.init_structural
+def section_properties(geom, materials):
+    files = [registry.structural(name) for name in geom.foil_names]
+
+    def column(key):
+        return np.array([file_dict[key] for file_dict in files])
+
+    def material(key):
+        return np.array([values[key] for values in materials], dtype=float)[:, None]
+
+    rho = material('density')
+    elastic_modulus = material('elastic_modulus')
+    shear_modulus = elastic_modulus / (2 * (1 + material('poissons')))
+    radius = np.asarray(geom.r_over_r, dtype=float) * geom.diam / 2
+    chord = np.asarray(geom.c_over_r, dtype=float) * geom.diam / 2
+    shape = (len(materials), geom.num_sections)
+    return {
+        'R': np.broadcast_to(radius, shape),
+        'EIin': chord**4 * (elastic_modulus * column('IXX')),
+        'EIout': chord**4 * (elastic_modulus * column('IYY')),
+        'EA': chord**2 * (elastic_modulus * column('A')),
+        'GJ': chord**4 * (shear_modulus * column('J')),
+        'EK': np.zeros(shape),
+        'M': chord**2 * (rho * column('A')),
+        'MXX': np.zeros(shape),
+        'XOCG': np.broadcast_to(column('XOCG'), shape),
+        'XOSC': np.broadcast_to(column('XOCG'), shape),
+        'RST': np.broadcast_to(chord * column('RST'), shape)
+    }
+
+
+# mass of the blades from the mass per length of section_properties. One mass per material
+def blade_mass(geom, properties):
+    return geom.blades * trapezoid(properties['M'], properties['R'])
+
+
+# integrates along the last axis. np.trapezoid is only in numpy 2, where np.trapz is deprecated, so it is written out
+def trapezoid(values, x):
+    return np.sum(0.5 * (values[..., 1:] + values[..., :-1]) * np.diff(x), axis=-1)
+
+
+# Per process database of the airfoil files. The files under airfoils/ and structural/ are indexed by name the first time
+# any foil is asked for, and each file is parsed the first time its foil is used. Every PropGeom gets the same objects,
+# so they are read only: FoilAero tables are read only arrays and structural data is a read only dictionary. Safe to use
+# from several threads. Names are matched without case, as they are on windows
+class AirfoilRegistry:
+    # aero_folder, structural_folder: the folders aero_path and structural_path read from
+    def __init__(self, aero_folder='airfoils', structural_folder='structural'):
+        self.aero_folder = aero_folder
+        self.structural_folder = structural_folder
+        self._lock = threading.Lock()
+        self.clear()
+
+    # forgets every parsed file and the index. Files changed on disk are read again the next time they are used
+    def clear(self):
+        self._aero_index = None
+        self._structural_index = None
+        self._aero = {}
+        self._structural = {}
+
+    # names of the airfoils with aerodynamic data
+    def names(self):
+        with self._lock:
+            self._index()
+            return sorted(os.path.splitext(os.path.basename(path))[0] for path in self._aero_index.values())
+
+    # the shared FoilAero of an airfoil
+    def aero(self, foil):
+        with self._lock:
+            key = foil.lower()
+            if key not in self._aero:
+                self._index()
+                foil_aero = FoilAero(self._aero_index.get(key, aero_path(foil)))
+                foil_aero.table.setflags(write=False)
+                foil_aero.re_index.setflags(write=False)
+                self._aero[key] = foil_aero
+            return self._aero[key]
+
+    # the shared, read only dictionary of an airfoil's structural file
+    def structural(self, foil):
+        with self._lock:
+            key = foil.lower()
+            if key not in self._structural:
+                self._index()
+                self._structural[key] = ReadOnlyDict(
+                    read_structural(self._structural_index.get(key, structural_path(foil))))
+            return self._structural[key]
+
+    def _index(self):
+        if self._aero_index is None:
+            self._aero_index = index_folder(self.aero_folder)
+            self._structural_index = index_folder(self.structural_folder)
+
+
+# dictionary that can't be changed once made. Copies of it are itself, and it pickles as a plain dictionary would
+class ReadOnlyDict(dict):
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('airfoil data from the registry is read only')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return ReadOnlyDict, (dict(self),)
+
+
+# maps the lower case name of every .txt file in folder to its path. Empty if the folder doesn't exist
+def index_folder(folder):
+    if not os.path.isdir(folder):
+        return {}
+    return {os.path.splitext(name)[0].lower(): os.path.join(folder, name)
+            for name in os.listdir(folder) if name.endswith('.txt')}
+
+
+# reads a foil structural file into a dictionary
+def read_structural(file_name):
+    with open(file_name) as file:
+        file_dict = {}
+        file_dict.update({'A': get_third(file.readline())})
+        file_dict.update({'IYY': get_third(file.readline())})
+        file_dict.update({'IXX': get_third(file.readline())})
+        file_dict.update({'J': get_third(file.readline())})
+        file_dict.update({'XOCG': get_third(file.readline())})
+        file_dict.update({'RST': get_third(file.readline())})
+    return file_dict
+
+
+registry = AirfoilRegistry()
+
+
 # makes sure to skip over lines with # at the start
 def next_line(file):
     line = file.readline()
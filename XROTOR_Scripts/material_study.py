@@ -0,0 +1,146 @@
+import os
+import numpy as np
+import designs
+import make_prop
+import run_prop
+import result_store
+import stress
+
+# Trade study of blade materials on a design whose aerodynamics are already solved. Only XROTOR's structural step is run
+# for each material, at the rpm and formulation the design stored for each velocity. The velocities are spread across
+# workers, and each worker keeps one XROTOR session that solves its velocity once and then evaluates every material
+# there. The section properties of every material are built at once with make_prop.section_properties, and the
+# stresses of every material at every velocity in one stress.StressField. Materials added later only run their own
+# structural step, and with the design's ResultCache a material seen before doesn't run XROTOR at all.
+#
+# - out_folder
+#       - each material
+#           - structural_geom.txt: the material's structural geometry file
+#           - structural output files by velocity
+#
+# example:
+#     study = material_study.MaterialStudy(design, {'aluminum': aluminum, 'carbon': carbon}, 'out\\Materials')
+#     ranking = study.run(workers=4)
+#     study.add_materials({'titanium': titanium})
+#     ranking = study.run(workers=4)
+
+# columns of every ranking row
+#   material: name of the material
+#   mass: mass of the blades, kg
+#   peak_von_misses: highest von Mises stress over every velocity and station, Pa
+#   min_safety_factor: yield_strength over peak_von_misses. NaN without a yield_strength
+#   margin: how far min_safety_factor is above required_safety, as a fraction of it
+#   worst_vel, worst_r_over_r: velocity and station of peak_von_misses
+#   passes: whether min_safety_factor is at least required_safety
+RANKING_KEYS = ('material', 'mass', 'peak_von_misses', 'min_safety_factor', 'margin', 'worst_vel', 'worst_r_over_r',
+                'passes')
+
+
+class MaterialStudy:
+    # design: a ConstantPower, ConstantRPM, VariablePitch or OptimalPitch after compile_data or load_results
+    # materials: dictionary of name to material dictionary, see PropGeom.init_structural. A 'yield_strength' gives the
+    #            safety factor
+    # out_folder: folder the structural files of each material are written to
+    # velocities: indices of the velocities to check. Defaults to the design's eval_structural velocities, or every
+    #             velocity when it has none. Only converged velocities are run
+    # required_safety: lowest safety factor a material passes with
+    def __init__(self, design, materials, out_folder, velocities=None, required_safety=1.0):
+        self.design = design
+        self.materials = dict(materials)
+        self.out_folder = out_folder
+        self.required_safety = required_safety
+        if velocities is None:
+            evaluate = np.asarray(design.eval_structural, dtype=bool)
+            velocities = np.flatnonzero(evaluate) if np.any(evaluate) else np.arange(len(design.vel_list))
+        self.velocities = [i for i in velocities if design.converged_list[i]]
+        # ExtractStructural results of each material evaluated, one per velocity
+        self.results = {}
+        # StressField over (material, velocity, station) and the ranking. Set by run
+        self.field = None
+        self.ranking = []
+
+    def add_materials(self, materials):
+        self.materials.update(materials)
+
+    # evaluates every material without results and ranks them all. Materials that pass come first, lightest first,
+    # followed by the rest, closest to passing first, and materials without a yield_strength last. Returns the ranking,
+    # a list of dictionaries of RANKING_KEYS
+    # persistent, workers: same as evaluate_aero
+    def run(self, workers=1, verbose=False, persistent=True):
+        names = list(self.materials)
+        new = [name for name in names if name not in self.results]
+        if new:
+            self._evaluate(new, workers, verbose, persistent)
+
+        properties = make_prop.section_properties(self.design.geom, [self.materials[name] for name in names])
+        mass = make_prop.blade_mass(self.design.geom, properties)
+        self.field = self._stress_field(names)
+        self.ranking = [self._row(k, name, mass[k]) for k, name in enumerate(names)]
+        self.ranking.sort(key=ranking_key)
+        return self.ranking
+
+    # runs the structural step of each new material at every velocity
+    def _evaluate(self, names, workers, verbose, persistent):
+        design = self.design
+        properties = make_prop.section_properties(design.geom, [self.materials[name] for name in names])
+        struct_files = []
+        for k, name in enumerate(names):
+            folder = os.path.join(self.out_folder, name)
+            os.makedirs(folder, exist_ok=True)
+            struct_files.append(os.path.join(folder, 'structural_geom.txt'))
+            design.geom.write_structural(struct_files[-1], {key: values[k] for key, values in properties.items()})
+
+        # every material at one velocity, so a session solves the velocity once and only bends the blade after that
+        def strength(i, session):
+            vel = design.vel_list[i]
+            solver = designs.xrotor_solver(design.solver_list[i])
+            geom = design._structural_geometry(i)
+            return [run_prop.evaluate_strength(geom, vel, design.rpm_list[i], solver, struct_file,
+                                               os.path.join(os.path.dirname(struct_file), f'{vel:.2f}.txt'),
+                                               design.fluid, verbose, session=session, cache=design.cache)
+                    for struct_file in struct_files]
+        results = run_prop.map_points(strength, self.velocities, design.geom, design.fluid, verbose, persistent,
+                                      workers)
+        for k, name in enumerate(names):
+            self.results[name] = [point[k] for point in results]
+
+    # stresses of every material at every velocity in one pass
+    def _stress_field(self, names):
+        columns = [result_store.structural_columns(self.results[name]) for name in names]
+        strain = np.stack([material_columns['structural_bottom'] for material_columns in columns])
+        r_over_r = np.stack([material_columns['structural_top'][..., 0, :] for material_columns in columns])
+
+        def material(key, default=None):
+            return np.array([self.materials[name].get(key, default) for name in names], dtype=float)[:, None, None]
+
+        axes = {'material': names, 'vel': np.asarray(self.design.vel_list, dtype=float)[self.velocities]}
+        return stress.StressField(strain, r_over_r, material('elastic_modulus'), material('poissons'),
+                                  material('yield_strength', np.nan), axes)
+
+    def _row(self, k, name, mass):
+        peak = self.field.peak[k]
+        row = {key: np.nan for key in RANKING_KEYS}
+        row.update({'material': name, 'mass': mass, 'passes': False})
+        if peak.size == 0 or np.all(np.isnan(peak)):
+            return row
+        point = np.nanargmax(peak)
+        station = self.field.peak_station[k, point]
+        safety = self.field.min_safety_factor[k, point]
+        row.update({
+            'peak_von_misses': peak[point],
+            'min_safety_factor': safety,
+            'margin': safety / self.required_safety - 1,
+            'worst_vel': self.field.axes['vel'][point],
+            'worst_r_over_r': self.field.r_over_r[k, point, station],
+            'passes': bool(safety >= self.required_safety)
+        })
+        return row
+
+
+# sort key of a ranking row. See MaterialStudy.run
+def ranking_key(row):
+    if row['passes']:
+        return 0, row['mass']
+    if np.isnan(row['margin']):
+        return 2, row['mass']
+    return 1, -row['margin']
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+import numpy as np
+import xrotor
+
+# On-disk cache of XROTOR results. Each entry is keyed by a hash of everything XROTOR is sent for a run: blade geometry,
+# the airfoil table picked at each section, fluid, velocity, rpm or power, formulation, and for structural runs the
+# structural geometry file. An entry holds the text XROTOR wrote along with its parsed ExtractAero or
+# ExtractStructural object, so a hit never starts XROTOR.
+#
+# - folder
+#       - first two characters of the key
+#           - <key>.pkl
+
+
+class ResultCache:
+    # folder: where entries are stored. The default sits under out/ next to the design out_folders. A cache can also be
+    #         kept inside a design's out_folder as <out_folder>/cache, which reset_data leaves alone, see
+    #         file_tools.KEEP_ON_RESET
+    # max_bytes: entries are evicted, least recently used first, once the cache grows past this size. None is unlimited
+    # max_age: entries not used within this many seconds are evicted. None keeps entries forever
+    def __init__(self, folder=os.path.join('out', 'cache'), max_bytes=None, max_age=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.folder, exist_ok=True)
+        self.size = sum(os.path.getsize(path) for path in self._entries())
+        self.evict()
+
+    # key of an aerodynamic run. Same arguments as run_prop.run
+    def aero_key(self, geom, vel, rpm, solver, fluid, pwr=False):
+        return self._key('aero', geom, vel, rpm, solver, fluid, pwr)
+
+    # key of a structural run. Same arguments as run_prop.evaluate_strength
+    def structural_key(self, geom, vel, rpm, solver, fluid, struct_file, pwr=None):
+        with open(struct_file, 'rb') as file:
+            structure = hashlib.sha256(file.read()).hexdigest()
+        return self._key('structural', geom, vel, rpm, solver, fluid, False if pwr is None else pwr, structure)
+
+    # returns the parsed result stored under key, or None on a miss. On a hit the text XROTOR originally wrote is
+    # restored to outfile so the design folders look the same as after a real run. outfile can be None when no file is
+    # wanted
+    def get(self, key, outfile=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        if outfile is not None:
+            with open(outfile, 'w') as file:
+                file.write(entry['text'])
+        self.hits += 1
+        return entry['result']
+
+    # stores the text XROTOR wrote and its parsed result under key
+    def put(self, key, text, result):
+        entry = {'text': text, 'result': result}
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as file:
+            pickle.dump(entry, file, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            old_size = os.path.getsize(path) if os.path.isfile(path) else 0
+            os.replace(temporary, path)
+            self.size += os.path.getsize(path) - old_size
+            full = self.max_bytes is not None and self.size > self.max_bytes
+        if full:
+            self.evict()
+
+    # removes entries older than max_age, then the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        with self.lock:
+            self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self._entries():
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        size = sum(entry[1] for entry in entries)
+        now = time.time()
+        for modified, entry_size, path in entries:
+            expired = self.max_age is not None and now - modified > self.max_age
+            too_big = self.max_bytes is not None and size > self.max_bytes
+            if not (expired or too_big):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self.size = size
+
+    # removes every entry
+    def clear(self):
+        for path in self._entries():
+            os.remove(path)
+        self.size = 0
+
+    def _key(self, kind, geom, vel, rpm, solver, fluid, pwr, *extra):
+        # in power mode the rpm is only used to pick each section's airfoil table, it is never sent to XROTOR
+        performance = geom.blade_performance(vel, rpm, fluid['viscosity'])
+        inputs = {
+            'kind': kind,
+            'xrotor': str(xrotor.XROTOR_PATH),
+            'diam': float(geom.diam),
+            'hub_diam': float(geom.hub_diam),
+            'blades': int(geom.blades),
+            'r_over_r': np.asarray(geom.r_over_r, dtype=float).tolist(),
+            'c_over_r': np.asarray(geom.c_over_r, dtype=float).tolist(),
+            'beta': np.asarray(geom.beta, dtype=float).tolist(),
+            'foils': [sorted((name, float(value)) for name, value in section.items()) for section in performance],
+            'fluid': sorted((name, float(value)) for name, value in fluid.items()),
+            'vel': float(vel),
+            'rpm': None if pwr is not False else float(rpm),
+            'pwr': None if pwr is False else float(pwr),
+            'solver': solver,
+            'extra': list(extra)
+        }
+        text = json.dumps(inputs, sort_keys=True)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, key[:2], f'{key}.pkl')
+
+    def _entries(self):
+        for directory, _, files in os.walk(self.folder):
+            for name in files:
+                if name.endswith('.pkl'):
+                    yield os.path.join(directory, name)
@@ -0,0 +1,124 @@
+import struct
+import zipfile
+import numpy as np
+import file_tools
+
+# Columnar store for the compiled results of a design. Every result of a sweep is kept as one array per quantity in a
+# single uncompressed .npz file, instead of being re-parsed out of hundreds of velocity files. Because the arrays are
+# stored uncompressed, load maps each one straight out of the file, so only the parts that are used are ever read.
+#
+# Columns written by designs.ConstantPower.result_columns, with n velocities and s stations:
+#   vel, thrust, torque, rpm, efficiency, efficiency_ideal, converged, advance_ratio, thrust_coef, torque_coef: (n,)
+#   solver: (n,) formulation that converged, 'bem' where the bem engine solved it, '' where none did
+#   eval_structural: (n,) whether a structural evaluation was asked for
+#   radial_<key>: (n, s) for each file_tools.RADIAL_KEYS entry. NaN where the velocity has no solution
+#   structural: (n,) whether the velocity has structural results
+#   structural_top, structural_bottom: (n, columns, s) ExtractStructural's data_top and data_bottom
+#   structural_top_keys, structural_bottom_keys: names of those columns
+#   stress_sxx, stress_syy, stress_szz, stress_sxy, stress_von_misses: (n, s)
+# designs.VariablePitch stacks the same columns of every offset along a new first axis and adds offset.
+
+STRESS_KEYS = ('sxx', 'syy', 'szz', 'sxy', 'von_misses')
+
+
+# writes a dictionary of arrays to file_name
+def save(file_name, columns):
+    # np.savez stores without compression, which is what lets load map the arrays
+    with open(file_name, 'wb') as file:
+        np.savez(file, **columns)
+
+
+# reads a file written by save into a dictionary of arrays
+# mmap: True maps each array from the file instead of reading it. The maps are copy on write, so arrays can be changed
+#       in memory without touching the file
+def load(file_name, mmap=True):
+    columns = {}
+    with zipfile.ZipFile(file_name) as archive, open(file_name, 'rb') as file:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+            if mmap and info.compress_type == zipfile.ZIP_STORED:
+                columns[name] = _map(file_name, file, info)
+            else:
+                with archive.open(info) as member:
+                    columns[name] = np.lib.format.read_array(member)
+    return columns
+
+
+# maps one array of an npz file. The array's npy data starts after the member's local zip header
+def _map(file_name, file, info):
+    file.seek(info.header_offset)
+    header = file.read(30)
+    name_length, extra_length = struct.unpack('<HH', header[26:30])
+    file.seek(info.header_offset + 30 + name_length + extra_length)
+
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+    if dtype.hasobject or 0 in shape or shape == ():
+        # nothing worth mapping, or nothing that can be mapped
+        file.seek(info.header_offset + 30 + name_length + extra_length)
+        return np.lib.format.read_array(file)
+    return np.memmap(file_name, dtype=dtype, mode='c', shape=shape, order='F' if fortran_order else 'C',
+                     offset=file.tell())
+
+
+# stacks the radial distributions of a list of ExtractAero objects into one (n, stations) array per RADIAL_KEYS entry.
+# None entries and solutions without a radial table are left as NaN
+def radial_columns(results):
+    stations = max([len(result.radial.get('r_over_r', [])) for result in results if result is not None] + [0])
+    columns = {}
+    for key in file_tools.RADIAL_KEYS:
+        column = np.full([len(results), stations], np.nan)
+        for i, result in enumerate(results):
+            if result is not None and len(result.radial.get(key, [])) == stations:
+                column[i, :] = result.radial[key]
+        columns[key] = column
+    return columns
+
+
+# stacks a list of ExtractStructural objects, None where a velocity has no structural results
+def structural_columns(structural):
+    present = [result for result in structural if result is not None]
+    stations = len(present[0].top) if present else 0
+
+    count = len(structural)
+    columns = {
+        'structural': np.array([result is not None for result in structural], dtype=bool),
+        'structural_top': np.full([count, len(file_tools.STRUCTURAL_TOP_KEYS), stations], np.nan),
+        'structural_bottom': np.full([count, len(file_tools.STRUCTURAL_BOTTOM_KEYS), stations], np.nan),
+        'structural_top_keys': np.array(file_tools.STRUCTURAL_TOP_KEYS),
+        'structural_bottom_keys': np.array(file_tools.STRUCTURAL_BOTTOM_KEYS)
+    }
+    for key in STRESS_KEYS:
+        columns[f'stress_{key}'] = np.full([count, stations], np.nan)
+
+    for i, result in enumerate(structural):
+        if result is None:
+            continue
+        columns['structural_top'][i] = result.top.T
+        columns['structural_bottom'][i] = result.bottom.T
+        for key in STRESS_KEYS:
+            if getattr(result, key) is not None:
+                columns[f'stress_{key}'][i, :] = getattr(result, key)
+    return columns
+
+
+# rebuilds the ExtractStructural list from structural_columns. The arrays of each result are views into columns
+def structural_results(columns):
+    structural = []
+    top_keys = tuple(str(key) for key in columns['structural_top_keys'])
+    bottom_keys = tuple(str(key) for key in columns['structural_bottom_keys'])
+    if top_keys != file_tools.STRUCTURAL_TOP_KEYS or bottom_keys != file_tools.STRUCTURAL_BOTTOM_KEYS:
+        raise ValueError('the structural columns of the store are not the ones ExtractStructural reads')
+    for i, present in enumerate(columns['structural']):
+        if not present:
+            structural.append(None)
+            continue
+        result = file_tools.ExtractStructural()
+        result.set_tables(columns['structural_top'][i].T, columns['structural_bottom'][i].T)
+        for key in STRESS_KEYS:
+            setattr(result, key, columns[f'stress_{key}'][i])
+        structural.append(result)
+    return structural
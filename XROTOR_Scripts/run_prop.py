@@ -1,37 +1,35 @@
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import xrotor
 import file_tools
 
 
 # sets all the initial information needed for running XROTOR. This includes fluid properties, propeller geometry,
-# aerodynamic properties, and solver type
+# aerodynamic properties, and solver type. The setup is built as one script and sent in a single write
 def initialize_xrotor(geom, vel, rpm, solver, fluid, verbose):
-    # object for interfacing with XROTOR
-    xr = xrotor.XRotorSubprocessInterface(verbose)
-
-    # sets the fluid properties
-    xr(f"DENS {fluid['density']}")
-    xr(f"VISC {fluid['viscosity']*fluid['density']}")
-    xr(f"VSOU {fluid['speed_sound']}")
-
-    set_geom(xr, geom)          # sets the shape of the blade
-    geom.set_re_blade(vel, rpm, fluid['viscosity'])   # sets the reynolds number at each radial section
-
-    init_foils(xr, geom)
-    set_foils(xr, geom)         # sets the each foils aerodynamic coefficients
+    script = xrotor.XRotorScript()
+    # sets the fluid properties, the shape of the blade and creates its airfoil sections
+    PointCommands(fluid).setup(script, geom)
+    # airfoil performance at the reynolds number of each radial section
+    set_foils(script, geom, geom.blade_performance(vel, rpm, fluid['viscosity']))
 
     # Setting solver formulation
-    xr("OPER")  # enter operation menu
+    script("OPER")  # enter operation menu
 
-    xr("FORM")  # enter formulations menu
-    xr(solver)  # set the formulation type
-    xr('')
+    script("FORM")  # enter formulations menu
+    script(solver)  # set the formulation type
+    script('')
 
-    xr('ITER')
-    xr('60')
+    script('ITER')
+    script('60')
 
-    xr("VELO")  # set forward velocity
-    xr(vel)
+    script("VELO")  # set forward velocity
+    script(vel)
 
+    # object for interfacing with XROTOR
+    xr = xrotor.XRotorSubprocessInterface(verbose)
+    xr.send(script)
     return xr
 
 
@@ -66,77 +64,401 @@ def init_foils(xr, prop):
     xr('y')
 
 
+# performance dictionary keys in the order XROTOR's EDIT menu asks for them, with what XROTOR calls each value
+LIFT_KEYS = ['zero-lift alpha(deg)',        # zeros-lift alpha (deg)
+             'd(Cl)/d(alpha)',              # d(CL)/d(alpha) (/rad)
+             'd(Cl)/d(alpha)@Stall',        # d(CL)/d(alpha) at stall (/rad)
+             'maximum Cl',                  # maximum CL
+             'minimum Cl',                  # minimum CL
+             'Cl increment to stall',       # cl increment to stall
+             'Cm']                          # cm
+DRAG_KEYS = ['minimum Cd',                  # minimum cd
+             'Cl at minimum Cd',            # CL @ min CD
+             'd^2(Cd)/d^2(Cl)',             # d(Cd)/d(CL**2)
+             'reference Re number',         # reference Re number
+             'Re scaling exponent',         # Re scaling exponent
+             'critical mach']               # Mcrit
+
+# commands that edit one airfoil section. Field 0 is the section number, the rest are the LIFT_KEYS then DRAG_KEYS
+FOIL_TEMPLATE = ('EDIT {0}\nLIFT\n' + ''.join(f'{{{i + 1}}}\n' for i in range(len(LIFT_KEYS))) + 'DRAG\n' +
+                 ''.join(f'{{{i + 1 + len(LIFT_KEYS)}}}\n' for i in range(len(DRAG_KEYS))) + '\n')
+
+# commands that solve an operating point from the OPER menu at a fixed rpm or a fixed power
+RPM_TEMPLATE = 'VELO\n{vel}\nRPM\n{rpm}\n'
+POWER_TEMPLATE = 'VELO\n{vel}\nPOWE\n{pwr}\nP\n'
+
+
 # sets the aerodynamic properties for each airfoil section
-def set_foils(xr, geom):
+# performance: optional list of performance dictionaries, one per section. Defaults to the geometry's performance from
+#              its last set_re_blade
+# sections: optional indices of the sections to edit. Defaults to all of them
+def set_foils(xr, geom, performance=None, sections=None):
+    if performance is None:
+        performance = geom.performance
+    if sections is None:
+        sections = range(geom.num_sections)
+
     xr("AERO")                         # go to airfoil section
-    for i in range(geom.num_sections):       # Sets characteristics at each section
-        xr(f"EDIT {i + 1}")            # open edit menu for the airfoil
-
-        xr("LIFT")                     # do the lift parameters
-        xr(geom.foil_aero[i].performance['zero-lift alpha(deg)'])      # zeros-lift alpha (deg)
-        xr(geom.foil_aero[i].performance['d(Cl)/d(alpha)'])      # d(CL)/d(alpha) (/rad)
-        xr(geom.foil_aero[i].performance['d(Cl)/d(alpha)@Stall'])      # d(CL)/d(alpha) at stall (/rad)
-        xr(geom.foil_aero[i].performance['maximum Cl'])      # maximum CL
-        xr(geom.foil_aero[i].performance['minimum Cl'])      # minimum CL
-        xr(geom.foil_aero[i].performance['Cl increment to stall'])      # cl increment to stall
-        xr(geom.foil_aero[i].performance['Cm'])      # cm
-
-        xr("DRAG")                     # do drag parameters
-        xr(geom.foil_aero[i].performance['minimum Cd'])      # minimum cd
-        xr(geom.foil_aero[i].performance['Cl at minimum Cd'])      # CL @ min CD
-        xr(geom.foil_aero[i].performance['d^2(Cd)/d^2(Cl)'])     # d(Cd)/d(CL**2)
-        xr(geom.foil_aero[i].performance['reference Re number'])      # reference Re number
-        xr(geom.foil_aero[i].performance['Re scaling exponent'])     # Re scaling exponent
-        xr(geom.foil_aero[i].performance['critical mach'])                          # Mcrit
-
-        xr("")                 # exit edit to aero
+    for i in sections:                 # Sets characteristics at each section
+        values = [performance[i][key] for key in LIFT_KEYS + DRAG_KEYS]
+        xr.write(FOIL_TEMPLATE.format(i + 1, *values))
     xr("")
 
 
-# run at single velocity and either rpm or power
+# run at single velocity and either rpm or power. Returns the parsed ExtractAero of the output
 # geom: PropGeom object containing geometry and aerodynamic information
 # rpm: rpm of the propeller
 # vel: velocity of the propeller
 # solver: solver to be used. Options are 'VRTX', 'POT', 'GRAD'
-# outfile: file to write data to
+# outfile: file to write data to. With stream it is only an archive and can be None
 # liquid: liquid propeller is in
 # pwr: power to run the propeller at
 # verbose: True will cause the XROTOR inputs to be output to console
-def run(geom, vel, rpm, solver, outfile, fluid, pwr=False, verbose=False):
-    file_tools.overwrite(outfile)
-    xr = initialize_xrotor(geom, vel, rpm, solver, fluid, verbose)
+# session: optional XRotorSession. When given the point is run in the session's XROTOR process instead of a new one
+# cache: optional ResultCache. XROTOR is skipped entirely when the same inputs were run before
+# stream: True reads the solution from XROTOR's screen output instead of having XROTOR write outfile and reading it
+#         back. A session has to be created with stream as well
+def run(geom, vel, rpm, solver, outfile, fluid, pwr=False, verbose=False, session=None, cache=None, stream=False):
+    if cache is not None:
+        key = cache.aero_key(geom, vel, rpm, solver, fluid, pwr)
+        contents = cache.get(key, outfile)
+        if contents is not None:
+            return contents
 
-    if pwr is not False:
-        xr("POWE")  # set RPM
-        xr(pwr)
-        xr("P")
+    if session is not None:
+        text = session.run(geom, vel, rpm, solver, outfile, pwr, stream)
     else:
-        xr("RPM")          # set RPM
-        xr(rpm)
+        text = _run_texts(geom, [(vel, rpm, outfile)], solver, fluid, pwr, verbose, stream)[0]
+    if stream and outfile is not None:
+        with open(outfile, 'w') as file:
+            file.write(text)
+
+    contents = file_tools.ExtractAero(text=text)
+    if cache is not None:
+        cache.put(key, text, contents)
+    return contents
+
 
-    xr("WRIT")         # write to file
-    xr(outfile)
-    xr("")             # exit to main menu
+# runs several operating points of one blade in a single XROTOR process. The command stream for every point, one OPER
+# block per point, is built up front and sent in a single write. Returns a list with the parsed ExtractAero of each
+# point
+# points: list of (vel, rpm, outfile). In power mode rpm only picks the airfoil tables. With stream outfile is only an
+#         archive and can be None
+# other arguments are the same as run
+def run_points(geom, points, solver, fluid, pwr=False, verbose=False, cache=None, stream=False):
+    results = [None] * len(points)
+    keys = [None] * len(points)
+    if cache is not None:
+        for i, (vel, rpm, outfile) in enumerate(points):
+            keys[i] = cache.aero_key(geom, vel, rpm, solver, fluid, pwr)
+            results[i] = cache.get(keys[i], outfile)
+
+    missing = [i for i in range(len(points)) if results[i] is None]
+    if missing:
+        texts = _run_texts(geom, [points[i] for i in missing], solver, fluid, pwr, verbose, stream)
+        for i, text in zip(missing, texts):
+            outfile = points[i][2]
+            if stream and outfile is not None:
+                with open(outfile, 'w') as file:
+                    file.write(text)
+            results[i] = file_tools.ExtractAero(text=text)
+            if cache is not None:
+                cache.put(keys[i], text, results[i])
+    return results
+
+
+# runs points in one XROTOR process and returns the text of each solution
+def _run_texts(geom, points, solver, fluid, pwr, verbose, stream):
+    commands = PointCommands(fluid)
+    script = xrotor.XRotorScript()
+    commands.setup(script, geom)
+    prompts = []
+    for vel, rpm, outfile in points:
+        if not stream:
+            file_tools.overwrite(outfile)
+        commands.point(script, geom, vel, rpm, solver, pwr)
+        commands.output(script, outfile, stream)
+        prompts.append(commands.oper_prompts)
+
+    xr = xrotor.XRotorSubprocessInterface(verbose)
+    xr.send(script)
     xr.finalize()
 
+    if stream:
+        output = file_tools.AeroStream()
+        output.feed(xr.output)
+        if len(output.oper_solutions) < prompts[-1]:
+            raise RuntimeError('XROTOR did not print every solution')
+        return [output.oper_solutions[count - 1] for count in prompts]
+
+    texts = []
+    for _, _, outfile in points:
+        with open(outfile) as file:
+            texts.append(file.read())
+    return texts
+
+
+# runs the structural evaluation at a single velocity. Returns the parsed ExtractStructural of the output
+# struct_file: structural geometry file written by PropGeom.write_structural
+# session, cache: same as in run
+def evaluate_strength(geom, vel, rpm, solver, struct_file, outfile, liquid, verbose, pwr=None, session=None,
+                      cache=None):
+    if cache is not None:
+        key = cache.structural_key(geom, vel, rpm, solver, liquid, struct_file, pwr)
+        contents = cache.get(key, outfile)
+        if contents is not None:
+            return contents
 
-def evaluate_strength(geom, vel, rpm, solver, struct_file, outfile, liquid, verbose, pwr=None):
+    if session is not None:
+        session.evaluate_strength(geom, vel, rpm, solver, struct_file, outfile, pwr)
+    else:
+        _evaluate_strength_process(geom, vel, rpm, solver, struct_file, outfile, liquid, verbose, pwr)
+
+    contents = file_tools.ExtractStructural(outfile)
+    if cache is not None:
+        with open(outfile) as file:
+            cache.put(key, file.read(), contents)
+    return contents
+
+
+def _evaluate_strength_process(geom, vel, rpm, solver, struct_file, outfile, liquid, verbose, pwr):
     file_tools.overwrite(outfile)
-    file_tools.overwrite('temp_aero.txt')
-
-    xr = initialize_xrotor(geom, vel, rpm, solver, liquid, verbose)
-    if pwr is None:
-        xr("RPM")
-        xr(rpm)
-    if pwr is not None:
-        xr("POWE")
-        xr(pwr)
-        xr("P")
-    xr("")
 
+    commands = PointCommands(liquid)
+    script = xrotor.XRotorScript()
+    commands.setup(script, geom)
+    commands.point(script, geom, vel, rpm, solver, False if pwr is None else pwr)
+    script("")
+    bend(script, struct_file, outfile)
+
+    xr = xrotor.XRotorSubprocessInterface(verbose)
+    xr.send(script)
+    xr.finalize()
+
+
+# evaluates the blade's bending at the current solution and writes it to outfile. Returns the number of BEND menu
+# prompts XROTOR shows while working through the commands, the last of which comes once outfile is written
+# struct_file: structural geometry file to read first. None when XROTOR already has it
+def bend(xr, struct_file, outfile):
     xr("BEND")
-    xr(f"READ {struct_file}")
+    if struct_file is not None:
+        xr(f"READ {struct_file}")
     xr("EVAL")
     xr(f"WRIT {outfile}")
     xr("")
-    xr.finalize()
+    return 3 if struct_file is None else 4
+
+
+# Writes the commands for a series of operating points on one blade and remembers what XROTOR was already sent, so each
+# point only adds the airfoil sections whose reynolds number table changed, the formulation if it changed, and the
+# velocity, rpm or power. Commands go to xr, which can be an interface or an XRotorScript. Shared by single runs,
+# run_points and XRotorSession
+class PointCommands:
+    # fluid: dictionary with keys 'density', 'viscosity' and 'speed_sound'
+    def __init__(self, fluid):
+        self.fluid = fluid
+        self.geom = None
+        self.performance = None
+        self.solver = None
+        # OPER and BEND menu prompts XROTOR will have shown once it has worked through every command written so far
+        self.oper_prompts = 0
+        self.bend_prompts = 0
+
+    # sends the fluid properties, blade geometry and airfoil sections
+    def setup(self, xr, geom):
+        xr(f"DENS {self.fluid['density']}")
+        xr(f"VISC {self.fluid['viscosity']*self.fluid['density']}")
+        xr(f"VSOU {self.fluid['speed_sound']}")
+        self.load(xr, geom)
+
+    # sends a new blade geometry and creates its airfoil sections
+    def load(self, xr, geom):
+        set_geom(xr, geom)
+        init_foils(xr, geom)
+        xr('')
+        self.geom = geom
+        self.performance = None
+        self.solver = None
+
+    # leaves XROTOR in the OPER menu solved at the operating point
+    def point(self, xr, geom, vel, rpm, solver, pwr=False):
+        # only the sections whose airfoil table changed with reynolds number are resent
+        performance = geom.blade_performance(vel, rpm, self.fluid['viscosity'])
+        if self.performance is None:
+            changed = list(range(geom.num_sections))
+        else:
+            changed = [i for i in range(geom.num_sections) if performance[i] != self.performance[i]]
+        if changed:
+            set_foils(xr, geom, performance, changed)
+        self.performance = performance
+
+        xr("OPER")
+        self.oper_prompts += 1
+        if self.solver is None:
+            self.oper(xr, 'ITER', '60')
+        if solver != self.solver:
+            self.oper(xr, "FORM", solver, '')
+            self.solver = solver
+
+        if pwr is not False:
+            xr.write(POWER_TEMPLATE.format(vel=vel, pwr=pwr))
+        else:
+            xr.write(RPM_TEMPLATE.format(vel=vel, rpm=rpm))
+        self.oper_prompts += 2
+
+    # writes the solution to outfile, or prints it to the screen with stream, and goes back to the main menu
+    def output(self, xr, outfile, stream=False):
+        if stream:
+            self.oper(xr, "DISP")
+        else:
+            self.oper(xr, "WRIT", outfile)
+        xr("")
+
+    # evaluates the blade's bending at the current solution and writes it to outfile. See bend
+    def bend(self, xr, struct_file, outfile):
+        self.bend_prompts += bend(xr, struct_file, outfile)
+
+    # sends a command in the OPER menu followed by the values it asks for. XROTOR shows the OPER prompt again once the
+    # command is done, which is how a streamed solution is matched to the command that printed it
+    def oper(self, xr, command, *values):
+        xr(command)
+        for value in values:
+            xr(value)
+        self.oper_prompts += 1
+
+
+# A long lived XROTOR process for one blade. The fluid, blade geometry and airfoil sections are sent once, after which
+# each operating point only sends the airfoil sections whose reynolds number table changed, the formulation if it changed, and the
+# velocity, rpm or power. XROTOR is only started once the first point is run, so a session whose points all come from
+# a ResultCache never spawns a process. Meant to be reused for every point of a sweep:
+#
+#     with XRotorSession(geom, fluid) as session:
+#         run(geom, vel, rpm, 'VRTX', outfile, fluid, pwr, session=session)
+class XRotorSession:
+    # geom: PropGeom the session starts with. Another geometry can be passed to run, which restarts XROTOR with that blade
+    # fluid: dictionary with keys 'density', 'viscosity' and 'speed_sound'
+    # verbose: True will cause the XROTOR inputs to be output to console
+    # timeout: seconds to wait on XROTOR for each operating point
+    # stream: True reads solutions from XROTOR's screen output. Needed for run with stream
+    def __init__(self, geom, fluid, verbose=False, timeout=60, stream=False):
+        self.fluid = fluid
+        self.verbose = verbose
+        self.timeout = timeout
+        self.stream = stream
+        self.xr = None
+        self.output = None
+        self.commands = None
+        self.geom = geom
+        # (path, content hash) of the structural geometry file XROTOR last read. The hash catches write_structural
+        # rewriting the same path with a new material
+        self.structure = None
+        # (geom, vel, rpm, solver, pwr) XROTOR last solved, so structural evaluations at that point don't solve it again
+        self.solved = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    # spawns XROTOR and sends the fluid properties and the current geometry
+    def start(self):
+        self.xr = xrotor.XRotorPersistentInterface(self.verbose, timeout=self.timeout, capture=self.stream)
+        self.output = file_tools.AeroStream()
+        self.commands = PointCommands(self.fluid)
+        self.structure = None
+        self.solved = None
+        script = xrotor.XRotorScript()
+        self.commands.setup(script, self.geom)
+        self.xr.send(script)
+
+    # run at single velocity and either rpm or power. Same arguments as run. Returns the text of the solution
+    def run(self, geom, vel, rpm, solver, outfile, pwr=False, stream=False):
+        if stream and not self.stream:
+            raise ValueError('the session was not created with stream')
+        if not stream:
+            file_tools.overwrite(outfile)
+        script = self._set_point(geom, vel, rpm, solver, pwr)
+        self.commands.output(script, outfile, stream)
+        self.xr.send(script)
+
+        if stream:
+            return self._read_solution()
+        self.xr.wait_for_file(outfile, 'OPER', self.commands.oper_prompts, self.timeout)
+        with open(outfile) as file:
+            return file.read()
+
+    # runs the structural evaluation at single velocity. Same arguments as evaluate_strength. When XROTOR is still
+    # solved at the operating point, for example to evaluate another structure there, it goes straight to BEND
+    def evaluate_strength(self, geom, vel, rpm, solver, struct_file, outfile, pwr=None):
+        file_tools.overwrite(outfile)
+        pwr = False if pwr is None else pwr
+        if self.xr is not None and self.solved == (geom, vel, rpm, solver, pwr):
+            script = xrotor.XRotorScript()
+        else:
+            script = self._set_point(geom, vel, rpm, solver, pwr)
+            script("")
+        with open(struct_file, 'rb') as file:
+            structure = (struct_file, hashlib.sha256(file.read()).hexdigest())
+        self.commands.bend(script, struct_file if structure != self.structure else None, outfile)
+        self.structure = structure
+        self.xr.send(script)
+        self.xr.wait_for_file(outfile, 'BEND', self.commands.bend_prompts, self.timeout)
+
+    def close(self):
+        if self.xr is not None:
+            self.xr.finalize()
+            self.xr = None
+
+    # starts XROTOR or switches blades if needed and returns a script that leaves XROTOR in the OPER menu solved at the
+    # operating point. Another blade gets a fresh XROTOR with its sections built from scratch by init_foils, nothing
+    # shows XROTOR keeps its airfoil sections intact across a new ARBI geometry
+    def _set_point(self, geom, vel, rpm, solver, pwr):
+        if self.xr is not None and geom is not self.geom:
+            self.close()
+        if self.xr is None:
+            self.geom = geom
+            self.start()
+
+        script = xrotor.XRotorScript()
+        self.commands.point(script, geom, vel, rpm, solver, pwr)
+        self.solved = (geom, vel, rpm, solver, pwr)
+        return script
+
+    # reads XROTOR's screen output until every OPER command sent so far is done and returns the last solution printed
+    def _read_solution(self):
+        self.xr.flush()
+        while self.output.prompts < self.commands.oper_prompts:
+            self.output.feed(self.xr.read_output(self.timeout))
+        return self.output.text
+
+
+# calls func(item, session) for every item, spread across a pool of workers. Each worker drives its own XROTOR process,
+# so threads are enough to keep every core busy. When persistent, each worker keeps one XRotorSession for all of the
+# items it handles, otherwise session is None and every run spawns its own XROTOR.
+# workers: number of XROTOR processes to run at once
+# stream: sessions are created with stream. See XRotorSession
+def map_points(func, items, geom, fluid, verbose=False, persistent=False, workers=1, stream=False):
+    sessions = []
+    lock = threading.Lock()
+    local = threading.local()
+
+    def call(item):
+        session = None
+        if persistent:
+            session = getattr(local, 'session', None)
+            if session is None:
+                session = XRotorSession(geom, fluid, verbose, stream=stream)
+                local.session = session
+                with lock:
+                    sessions.append(session)
+        return func(item, session)
+
+    try:
+        if workers <= 1:
+            return [call(item) for item in items]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(call, items))
+    finally:
+        for session in sessions:
+            session.close()
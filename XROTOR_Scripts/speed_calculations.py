@@ -1,52 +1,133 @@
 import os
-import scipy.integrate
 import numpy as np
 import matplotlib.pyplot as plt
 
 
+# Finds how fast a sub accelerates along the race track with a design's thrust. Time on the track doesn't matter, so the
+# displacement is integrated straight from the velocity:
+#     x(v) = integral of m v / (T(v) - D(v)) dv,    D = rho A Cd v^2
+# Velocities the thrust can't reach past the drag are NaN.
+#
+# drag_coef, frontal_area and sub_mass can be floats or arrays. Arrays are broadcast against each other, so a whole grid
+# of configurations is found in one call, for example
+#     race = RaceSpeed(design, drag_coef[:, None], frontal_area, sub_mass[None, :])
+#     race.find_recorded_speed(42, 50)    # race.max_speed is a (drag, mass) array
+# Only the drag changes where the thrust runs out, and the mass only scales the displacement, so the integral is done
+# once for each drag and the mass is applied when the gates are looked up.
 class RaceSpeed:
     def __init__(self, design, drag_coef, frontal_area, sub_mass):
         self.num_refined = 500
         self.write_file = design.folder.speed_file
         self.plot_file = os.path.join(design.folder.aero_plots, 'displacement.png')
         self.vel_list = design.vel_list
-        self.vel_refined = np.zeros(self.num_refined)
-        self.max_speed = np.NaN
+        self.sub_mass = np.asarray(sub_mass, dtype=float)
+        self.max_speed = np.nan
         self.initial_gate = 0
         self.final_gate = 0
 
-        self.displacement, self.ideal_displacement = self.calc_speed(design, drag_coef, frontal_area, sub_mass)
+        self.thrust_list = design.thrust_list
+        self.density = design.fluid['density']
 
+        self.vel_refined = np.linspace(min(design.vel_list), max(design.vel_list), self.num_refined)
+        drag = self.density * np.asarray(frontal_area, dtype=float) * np.asarray(drag_coef, dtype=float)
+        # displacement of a unit mass for each drag, (drag shape) + (num_refined,)
+        self.unit_displacement = unit_displacement(self.vel_list, design.thrust_list, drag, self.vel_refined)
+        # the 100% efficient displacement is only needed for plotting, so it is found the first time it is used
+        self.power = design.power
+        self.drag = drag
+        self._unit_ideal_displacement = None
+
+    # displacement at each refined velocity, with the configurations' shape in front
+    @property
+    def displacement(self):
+        return self.sub_mass[..., None] * self.unit_displacement
+
+    # displacement with a 100% efficient propeller. NaN for designs without a power
+    @property
+    def ideal_displacement(self):
+        if self._unit_ideal_displacement is None:
+            if self.power is None:
+                self._unit_ideal_displacement = np.full(self.unit_displacement.shape, np.nan)
+            else:
+                ideal_thrust = self.power / np.asarray(self.vel_list, dtype=float)
+                self._unit_ideal_displacement = unit_displacement(self.vel_list, ideal_thrust, self.drag,
+                                                                  self.vel_refined)
+        return self.sub_mass[..., None] * self._unit_ideal_displacement
+
+    # the average speed in knots between the two gates, one per configuration. Gates can be arrays as well
     def find_recorded_speed(self, initial_gate, final_gate, write=False):
         self.initial_gate = initial_gate
         self.final_gate = final_gate
-        initial_vel = linearly_interp(self.displacement, mps_to_knot(self.vel_refined), initial_gate)
-        final_vel = linearly_interp(self.displacement, mps_to_knot(self.vel_refined), final_gate)
-        self.max_speed = (initial_vel + final_vel) / 2
+        initial_vel = speed_at(self.unit_displacement, self.vel_refined, np.asarray(initial_gate) / self.sub_mass)
+        final_vel = speed_at(self.unit_displacement, self.vel_refined, np.asarray(final_gate) / self.sub_mass)
+        self.max_speed = mps_to_knot((initial_vel + final_vel) / 2)
         if write:
             self._write_max_speed()
+        return self.max_speed
+
+    # Monte Carlo distribution of the recorded speed in knots between the gates when the drag coefficient, frontal area,
+    # sub mass and thrust are uncertain. Samples are drawn and evaluated chunk at a time, so memory stays bounded by
+    # chunk whatever the number of samples. Returns a dictionary of
+    #   percentiles: {percentile: speed}, over the samples that reach both gates
+    #   mean, std: of the samples that reach both gates
+    #   reached: fraction of the samples that reach both gates
+    #   speeds: the recorded speed of every sample, NaN where a gate isn't reached
+    # drag_coef, frontal_area, sub_mass: a float for a known value, or (mean, standard deviation) to sample from a normal
+    #                                    distribution. Samples are kept positive
+    # thrust_error: relative standard deviation of the thrust. Each sample scales the whole of thrust_list by one normal
+    #               factor, a band around the design's thrust. Scaling the thrust by s is the same as dividing the drag
+    #               and the mass by s, so it costs nothing extra
+    # seed: seed of the random generator. The same seed and chunk give the same samples
+    def monte_carlo(self, initial_gate, final_gate, drag_coef, frontal_area, sub_mass, thrust_error=0.0,
+                    samples=100000, percentiles=(5, 25, 50, 75, 95), chunk=10000, seed=None):
+        rng = np.random.default_rng(seed)
+        speeds = np.empty(samples)
+        for start in range(0, samples, chunk):
+            count = min(chunk, samples - start)
+            scale = positive(rng.normal(1, thrust_error, count)) if thrust_error else np.ones(count)
+            drag = (self.density * sample(rng, frontal_area, count) * sample(rng, drag_coef, count)) / scale
+            mass = sample(rng, sub_mass, count) / scale
+
+            displacement = unit_displacement(self.vel_list, self.thrust_list, drag, self.vel_refined)
+            initial_vel = speed_at(displacement, self.vel_refined, initial_gate / mass)
+            final_vel = speed_at(displacement, self.vel_refined, final_gate / mass)
+            speeds[start:start + count] = mps_to_knot((initial_vel + final_vel) / 2)
+
+        reached = speeds[~np.isnan(speeds)]
+        if len(reached) == 0:
+            return {'percentiles': {p: np.nan for p in percentiles}, 'mean': np.nan, 'std': np.nan, 'reached': 0.0,
+                    'speeds': speeds}
+        return {'percentiles': dict(zip(percentiles, np.percentile(reached, percentiles))),
+                'mean': np.mean(reached),
+                'std': np.std(reached),
+                'reached': len(reached) / samples,
+                'speeds': speeds}
 
     def _write_max_speed(self):
         with open(self.write_file, 'w') as f:
-            speed = mps_to_knot(self.max_speed)
-            f.write(f'The Recorded Speed is: {speed}')
+            f.write(f'The Recorded Speed is: {self.max_speed}')
+
+    # plots the speed along the track of one configuration
+    # configuration: index into the configurations' shape, needed when drag_coef, frontal_area, sub_mass or the gates
+    #                are arrays
+    def plot(self, save=False, disp=False, configuration=None):
+        displacement, ideal_displacement, max_speed, initial_gate, final_gate = self._configuration(configuration)
 
-    def plot(self, save=False, disp=False):
         plt.figure()
         plt.title('Speed Along Racetrack')
         plt.xlabel('Displacement [m]')
         plt.ylabel('Speed [knots]')
-        plt.xlim([0, 1.1*self.final_gate])
+        plt.xlim([0, 1.1*final_gate])
         plt.grid()
 
-        plt.plot(self.displacement, mps_to_knot(self.vel_refined), label='actual')
-        plt.plot(self.ideal_displacement, mps_to_knot(self.vel_refined), label='100% efficiency')
+        plt.plot(displacement, mps_to_knot(self.vel_refined), label='actual')
+        plt.plot(ideal_displacement, mps_to_knot(self.vel_refined), label='100% efficiency')
 
-        if not np.isnan(self.max_speed):
+        if not np.isnan(max_speed):
             top = max(mps_to_knot(self.vel_refined))
             bottom = min(mps_to_knot(self.vel_refined))
-            plt.plot([self.initial_gate, self.initial_gate], [top, bottom], '--', label='first gate')
-            plt.plot([self.final_gate, self.final_gate], [top, bottom], '--', label='second gate')
+            plt.plot([initial_gate, initial_gate], [top, bottom], '--', label='first gate')
+            plt.plot([final_gate, final_gate], [top, bottom], '--', label='second gate')
 
         plt.legend()
         if save:
@@ -56,42 +137,93 @@ class RaceSpeed:
         else:
             plt.close()
 
-    def calc_speed(self, design, drag_coef, frontal_area, sub_mass):
-        numerator = (sub_mass * design.vel_list)
-        drag = design.fluid['density'] * frontal_area * design.vel_list**2 * drag_coef
-        denominator = design.thrust_list - drag
-        integrand = numerator / denominator
-        negative_indices = integrand < 0
-        # integrand[negative_indices] = np.nan
-        integrand[negative_indices] = np.NaN
+    # the displacement, ideal displacement, recorded speed and gates of one configuration
+    def _configuration(self, configuration):
+        curves = [self.displacement, self.ideal_displacement]
+        values = [np.asarray(self.max_speed), np.asarray(self.initial_gate), np.asarray(self.final_gate)]
+        shape = np.broadcast_shapes(curves[0].shape[:-1], *(value.shape for value in values))
+        if shape != ():
+            if configuration is None:
+                raise ValueError(f'the configurations have shape {shape}, pass configuration to pick the one to plot')
+            curves = [np.broadcast_to(curve, shape + curve.shape[-1:])[configuration] for curve in curves]
+            values = [np.broadcast_to(value, shape)[configuration] for value in values]
+            if np.ndim(values[0]) != 0:
+                raise ValueError(f'configuration {configuration} picks more than one configuration of shape {shape}')
+        return curves[0], curves[1], float(values[0]), float(values[1]), float(values[2])
 
-        self.vel_refined = np.linspace(min(design.vel_list), max(design.vel_list), self.num_refined)
-        yy = np.interp(self.vel_refined, design.vel_list, integrand)
 
-        x = np.zeros(self.num_refined)
-        x[0] = 0
-        x[1:] = scipy.integrate.cumtrapz(yy, self.vel_refined)
+# displacement of a unit mass at each of vel_refined, for every drag, with shape drag.shape + vel_refined.shape
+# vel, thrust: the design's velocities and thrust
+# drag: rho * frontal_area * drag_coef, float or array
+def unit_displacement(vel, thrust, drag, vel_refined):
+    vel = np.asarray(vel, dtype=float)
+    integrand = vel / (np.asarray(thrust, dtype=float) - drag[..., None] * vel**2)
+    integrand[integrand < 0] = np.nan
 
-        x_ideal = self._calc_ideal_speed(design, drag_coef, frontal_area, sub_mass)
+    # linear interpolation onto the refined velocities like np.interp, followed by the cumulative trapezoid rule, is
+    # linear in the integrand, so both are folded into one (velocities, refined velocities) matrix and every row is
+    # found with a single matrix product
+    upper = np.clip(np.searchsorted(vel, vel_refined, side='right'), 1, len(vel) - 1)
+    fraction = (vel_refined - vel[upper - 1]) / (vel[upper] - vel[upper - 1])
+    weights = np.zeros((len(vel), len(vel_refined)))
+    columns = np.arange(len(vel_refined))
+    weights[upper - 1, columns] = 1 - fraction
+    weights[upper, columns] += fraction
+    trapezoid = np.zeros(weights.shape)
+    trapezoid[:, 1:] = np.cumsum(0.5 * (weights[:, 1:] + weights[:, :-1]) * np.diff(vel_refined), axis=1)
 
-        return x, x_ideal
+    missing = np.isnan(integrand)
+    x = np.where(missing, 0, integrand) @ trapezoid
+
+    # NaN would spread to every refined velocity through the product, so it is put back afterwards. A NaN velocity
+    # makes the displacement NaN from the first refined velocity it is interpolated into. Like np.interp, a refined
+    # velocity on a data point only uses that point
+    first = np.argmax(weights != 0, axis=1)
+    first_missing = np.min(np.where(missing, first, len(vel_refined)), axis=-1)
+    x[columns >= np.maximum(first_missing, 1)[..., None]] = np.nan
+    return x
+
+
+# velocity at a displacement along each row. Rows increase until they turn NaN, so each one is searched with a
+# vectorized binary search. NaN where the displacement is never reached
+# displacement: (rows shape) + (n,) array
+# vel: (n,) velocities of the displacements
+# position: displacements to find, broadcast against the rows shape
+def speed_at(displacement, vel, position):
+    shape = np.broadcast_shapes(displacement.shape[:-1], np.shape(position))
+    rows = np.broadcast_to(np.where(np.isnan(displacement), np.inf, displacement), shape + displacement.shape[-1:])
+    position = np.broadcast_to(position, shape)[..., None]
+
+    # first index with a displacement above position
+    low = np.zeros(shape + (1,), dtype=int)
+    high = np.full(shape + (1,), displacement.shape[-1])
+    while np.any(low < high):
+        middle = (low + high) // 2
+        above = np.take_along_axis(rows, np.minimum(middle, displacement.shape[-1] - 1), -1) > position
+        searching = low < high
+        high = np.where(searching & above, middle, high)
+        low = np.where(searching & ~above, middle + 1, low)
+
+    front = np.clip(low, 1, displacement.shape[-1] - 1)
+    x_2 = np.take_along_axis(rows, front, -1)
+    x_1 = np.take_along_axis(rows, front - 1, -1)
+    slope = (vel[front] - vel[front - 1]) / (x_2 - x_1)
+    speed = vel[front - 1] + slope * (position - x_1)
+    found = (low >= 1) & (low < displacement.shape[-1]) & np.isfinite(x_2)
+    return np.where(found, speed, np.nan)[..., 0]
+
+
+# count samples of a Monte Carlo input. A float is a known value, (mean, standard deviation) is normally distributed
+def sample(rng, value, count):
+    if np.ndim(value) == 0:
+        return np.full(count, float(value))
+    mean, std = value
+    return positive(rng.normal(mean, std, count))
 
-    def _calc_ideal_speed(self, design, drag_coef, frontal_area, sub_mass):
-        pwr = design.power
-        thrust = pwr / self.vel_list
-        drag = design.fluid['density'] * frontal_area * design.vel_list ** 2 * drag_coef
-        numerator = (sub_mass * design.vel_list)
-        denominator = thrust - drag
-        integrand = numerator / denominator
-        negative_indices = integrand < 0
-        integrand[negative_indices] = np.NaN
-        self.vel_refined = np.linspace(min(design.vel_list), max(design.vel_list), self.num_refined)
-        yy = np.interp(self.vel_refined, design.vel_list, integrand)
 
-        x = np.zeros(self.num_refined)
-        x[0] = 0
-        x[1:] = scipy.integrate.cumtrapz(yy, self.vel_refined)
-        return x
+# keeps samples of quantities that can't be negative above zero
+def positive(values):
+    return np.maximum(values, 1e-9)
 
 
 def linearly_interp(x_list, y_list, x_value):
@@ -101,7 +233,7 @@ def linearly_interp(x_list, y_list, x_value):
             front_ind = i
             break
     if not front_ind:
-        return np.NaN
+        return np.nan
 
     back_ind = front_ind-1
     x_2 = x_list[front_ind]
@@ -0,0 +1,96 @@
+import numpy as np
+
+# Stresses of many structural evaluations at once. The strains of every operating point are stacked into one array, as
+# result_store.structural_columns and the design's result_columns already do, and the stresses, von Mises stress,
+# safety factor and peak of every operating point are found in one broadcast pass over it.
+#
+# example:
+#     field = design.stress_field(yield_strength=40e6)
+#     field.summary()       # worst station and operating point of the whole sweep
+#     field.peak            # highest von Mises stress of each operating point
+
+# strain columns of ExtractStructural.bottom and result_store's structural_bottom, in order
+STRAIN_KEYS = ('forward_strain', 'tangent_strain', 'spanwise_strain', 'max_strain', 'shear')
+
+
+# Hooke's law stresses from the strains of ExtractStructural. The strains can be arrays of any matching shape
+# Returns sxx, syy, szz, sxy
+def hooke_stresses(forward_strain, tangent_strain, spanwise_strain, shear, elastic_modulus, poissons_ratio):
+    scale = elastic_modulus / ((1 + poissons_ratio) * (1 - 2 * poissons_ratio))
+    sxx = scale * ((1 - poissons_ratio) * (forward_strain + poissons_ratio * (tangent_strain + spanwise_strain)))
+    syy = scale * ((1 - poissons_ratio) * (spanwise_strain + poissons_ratio * (forward_strain + tangent_strain)))
+    szz = scale * ((1 - poissons_ratio) * (tangent_strain + poissons_ratio * (forward_strain + spanwise_strain)))
+    sxy = scale * ((1 - 2 * poissons_ratio) * shear)
+    return sxx, syy, szz, sxy
+
+
+def von_misses(sxx, syy, szz, sxy):
+    term1 = (sxx-syy)**2 + (syy-szz)**2 + (szz-sxx)**2
+    term2 = sxy**2
+    return np.sqrt(0.5*term1) + np.sqrt(3*term2)
+
+
+# The stresses of a stack of structural evaluations
+# strain: (..., STRAIN_KEYS, stations) array, for example result_columns()['structural_bottom']. NaN where an operating
+#         point has no structural evaluation
+# r_over_r: (..., stations) radial location of each station
+# elastic_modulus, poissons_ratio: material of the blade
+# yield_strength: stress the blade yields at, Pa. None leaves the safety factors NaN
+# elastic_modulus, poissons_ratio and yield_strength can also be arrays that broadcast against the leading axes with
+# one station axis, for example one per material with shape (materials, 1, 1)
+# axes: optional dictionary of the values along each leading axis of strain, in order, for example
+#       {'offset': offset_list, 'vel': vel_list}. summary reports the worst point with these
+class StressField:
+    def __init__(self, strain, r_over_r, elastic_modulus, poissons_ratio, yield_strength=None, axes=None):
+        strain = np.asarray(strain, dtype=float)
+        self.r_over_r = np.asarray(r_over_r, dtype=float)
+        self.yield_strength = yield_strength
+        self.axes = {} if axes is None else axes
+        columns = [strain[..., STRAIN_KEYS.index(key), :]
+                   for key in ('forward_strain', 'tangent_strain', 'spanwise_strain', 'shear')]
+
+        # (..., stations) arrays
+        self.sxx, self.syy, self.szz, self.sxy = hooke_stresses(*columns, elastic_modulus, poissons_ratio)
+        self.von_misses = von_misses(self.sxx, self.syy, self.szz, self.sxy)
+        self.safety_factor = (yield_strength / self.von_misses if yield_strength is not None
+                              else np.full(self.von_misses.shape, np.nan))
+
+        # highest von Mises stress of each operating point, its station and the lowest safety factor. NaN and -1 where
+        # an operating point has no structural evaluation
+        evaluated = ~np.all(np.isnan(self.von_misses), axis=-1)
+        self.peak_station = np.full(evaluated.shape, -1)
+        self.peak = np.full(evaluated.shape, np.nan)
+        # a yield strength per material can give the safety factors more leading axes than the stresses
+        factor_shape = self.safety_factor.shape[:-1]
+        self.min_safety_factor = np.full(factor_shape, np.nan)
+        if self.von_misses.shape[-1] > 0:
+            station = np.argmax(np.nan_to_num(self.von_misses, nan=-np.inf), axis=-1)[..., None]
+            self.peak_station = np.where(evaluated, station[..., 0], -1)
+            self.peak = np.where(evaluated, np.take_along_axis(self.von_misses, station, -1)[..., 0], np.nan)
+            factor = np.take_along_axis(self.safety_factor, np.broadcast_to(station, factor_shape + (1,)), -1)[..., 0]
+            self.min_safety_factor = np.where(np.broadcast_to(evaluated, factor_shape), factor, np.nan)
+
+    # the worst station of the worst operating point, as a dictionary of
+    #   von_misses, safety_factor: its stress and safety factor
+    #   index: its index into the (..., stations) arrays
+    #   r_over_r: radial location of the station
+    #   one entry per axes name with the operating point's value
+    # None when there are no structural evaluations
+    def summary(self):
+        if self.peak.size == 0 or np.all(np.isnan(self.peak)):
+            return None
+        point = np.unravel_index(np.argmax(np.nan_to_num(self.peak, nan=-np.inf)), self.peak.shape)
+        index = point + (int(self.peak_station[point]),)
+        summary = {
+            'von_misses': self.von_misses[index],
+            'safety_factor': self.safety_factor[index],
+            'index': tuple(int(i) for i in index),
+            'r_over_r': self.r_over_r[index]
+        }
+        for axis, (name, values) in enumerate(self.axes.items()):
+            summary[name] = values[point[axis]]
+        return summary
+
+    # boolean array of the operating points whose lowest safety factor is below required
+    def below(self, required):
+        return self.min_safety_factor < required
@@ -0,0 +1,29 @@
+import os
+import sys
+import pytest
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRIPTS)
+
+import xrotor
+import fake_xrotor
+import make_prop
+
+
+# the scripts open airfoils/, propellers/ and structural/ relative to XROTOR_Scripts and XROTOR is the fake_xrotor
+# stand-in, so the tests run without the windows executable
+@pytest.fixture(autouse=True)
+def scripts_folder(monkeypatch):
+    monkeypatch.chdir(SCRIPTS)
+    monkeypatch.setattr(xrotor, 'XROTOR_PATH', fake_xrotor.command())
+
+
+ALUMINUM = {'density': 2710, 'elastic_modulus': 69e9, 'poissons': 0.3}
+
+
+@pytest.fixture
+def geom():
+    geom = make_prop.PropGeom('prop_1')
+    geom.init_aero()
+    geom.init_structural(ALUMINUM)
+    return geom
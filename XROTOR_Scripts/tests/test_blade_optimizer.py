@@ -0,0 +1,26 @@
+import numpy as np
+import designs
+import blade_optimizer
+
+RACE = (0.04, 0.2636, 400.2, 10, 20)
+
+
+# a blade XROTOR fails on is penalized and skipped instead of ending the optimization
+def test_failed_designs_are_penalized(geom, tmp_path, monkeypatch):
+    evaluate_aero = designs.ConstantPower.evaluate_aero
+
+    def failing(design, *args, **kwargs):
+        if design.geom.beta[-1] > geom.beta[-1]:
+            raise RuntimeError('XROTOR did not converge')
+        return evaluate_aero(design, *args, **kwargs)
+    monkeypatch.setattr(designs.ConstantPower, 'evaluate_aero', failing)
+
+    optimizer = blade_optimizer.BladeOptimizer(geom, 300, np.linspace(1, 4, 6), RACE, str(tmp_path), controls=2,
+                                               eval_structural=np.array([True] + [False] * 5), stress_limit=400e6,
+                                               evaluate_options={'sweep': True})
+    optimizer.optimize(max_iterations=1)
+
+    assert optimizer.failures
+    assert all(optimizer.evaluations[key] == optimizer._penalty() for key in optimizer.failures)
+    assert optimizer.best_geometry.geometry_key() not in optimizer.failures
+    assert np.isfinite(optimizer.speed) and optimizer.speed > 0
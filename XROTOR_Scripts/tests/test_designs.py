@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+import designs
+
+# the slowest velocity is heavily loaded enough that fake_xrotor's VRTX and POT don't converge there
+VELOCITIES = np.linspace(0.2, 3.5, 8)
+
+
+# continuation only seeds the rpm, so every velocity converges on the same formulation as a cold start. The retries
+# avoided are counted without a cold evaluation to compare with
+def test_continuation_keeps_formulations(geom, tmp_path):
+    design = designs.ConstantPower(geom, 300, VELOCITIES, str(tmp_path / 'design'), rpm0=300)
+    design.evaluate_aero(persistent=True)
+    design.compile_data()
+    cold_solvers = list(design.solver_list)
+    cold_thrust = design.thrust_list.copy()
+    cold_stats = design.convergence_stats
+
+    design.evaluate_aero(persistent=True, continuation=True)
+    design.compile_data()
+    assert cold_solvers[0] == 'GRAD'
+    assert list(design.solver_list) == cold_solvers
+    np.testing.assert_allclose(design.thrust_list, cold_thrust, rtol=0.01)
+    stats = design.convergence_stats
+    assert stats['runs'] < cold_stats['runs']
+    assert cold_stats['retries_avoided'] is None
+    assert 0 < stats['retries_avoided'] <= cold_stats['runs'] - stats['runs']
+    assert stats['formulations_skipped'] == 0
+
+
+# seed_solver tries the previous velocity's formulation first, which skips the formulations ahead of it without
+# counting them as retries avoided
+def test_continuation_seeds_solver(geom, tmp_path):
+    design = designs.ConstantPower(geom, 300, VELOCITIES, str(tmp_path / 'design'), rpm0=300)
+    design.evaluate_aero(persistent=True, continuation=True)
+    rpm_only = design.convergence_stats
+    design.evaluate_aero(persistent=True, continuation=True, seed_solver=True)
+    stats = design.convergence_stats
+    # GRAD, the only formulation that converges at the slowest velocity, is tried first from then on
+    assert set(design.solver_list) == {'GRAD'}
+    assert stats['formulations_skipped'] == 2 * (len(VELOCITIES) - 1)
+    assert stats['retries_avoided'] == rpm_only['retries_avoided']
+
+
+# the sweep only runs the velocities it can't solve on their own, trying the formulation the sweep used last
+def test_sweep_falls_back_to_isolated_runs(geom, tmp_path):
+    design = designs.ConstantRPM(geom, 400, VELOCITIES, str(tmp_path / 'sweep'))
+    design.evaluate_aero(sweep=True)
+    design.compile_data()
+    per_point = designs.ConstantRPM(geom, 400, VELOCITIES, str(tmp_path / 'per_point'))
+    per_point.evaluate_aero()
+    per_point.compile_data()
+
+    assert list(design.solver_list) == list(per_point.solver_list)
+    np.testing.assert_allclose(design.thrust_list, per_point.thrust_list, equal_nan=True)
+    # the failed velocity took the sweep, then POT and GRAD
+    assert design.convergence_stats['runs'] == len(VELOCITIES) + 2
+
+
+# compiling again replaces the structural results instead of adding to them
+def test_compile_data_twice(geom, tmp_path):
+    eval_structural = np.zeros(len(VELOCITIES), dtype=bool)
+    eval_structural[[2, 5]] = True
+    design = designs.ConstantPower(geom, 300, VELOCITIES, str(tmp_path / 'design'), eval_structural)
+    design.evaluate_aero()
+    design.compile_data()
+    design.compile_data()
+    assert len(design.structural) == len(VELOCITIES)
+    assert [result is not None for result in design.structural] == list(eval_structural)
+
+
+# only the best offset of each velocity is evaluated again, and the other offsets' old results are dropped
+def test_variable_pitch_structural_on_best_offsets(geom, tmp_path, monkeypatch):
+    eval_structural = np.zeros(len(VELOCITIES), dtype=bool)
+    eval_structural[[2, 5, 7]] = True
+    design = designs.VariablePitch(geom, 300, VELOCITIES, [-2, 0, 2], str(tmp_path / 'vpp'), eval_structural)
+    design.evaluate_aero()
+    design.compile_data()
+    before = [result.von_misses.copy() for result in design.structural if result is not None]
+
+    runs = []
+    evaluate_strength = designs.run_prop.evaluate_strength
+
+    def counted(geom, *args, **kwargs):
+        runs.append(geom)
+        return evaluate_strength(geom, *args, **kwargs)
+    monkeypatch.setattr(designs.run_prop, 'evaluate_strength', counted)
+    design.evaluate_structural()
+
+    best = [design.vpp_offset[i] for i in np.flatnonzero(eval_structural)]
+    assert [geom.beta[0] - design.geom.beta[0] for geom in runs] == pytest.approx(best)
+    after = [result.von_misses for result in design.structural if result is not None]
+    assert len(after) == len(before)
+    # solved again at the rpm the output file rounds, so a little off the first evaluation
+    for a, b in zip(after, before):
+        np.testing.assert_allclose(a, b, rtol=1e-3)
+    for k, constant_prop in enumerate(design.constant_propellers):
+        for i, result in enumerate(constant_prop.structural):
+            assert (result is not None) == (eval_structural[i] and design.vpp_offset[i] == design.offset_list[k])
+
+
+# the bem engine replaces the formulations and counts of an earlier XROTOR evaluation instead of leaving them behind
+def test_bem_records_convergence(geom, tmp_path):
+    design = designs.ConstantPower(geom, 300, VELOCITIES, str(tmp_path / 'design'), rpm0=300)
+    design.evaluate_aero()
+    design.evaluate_aero(engine='bem')
+    design.compile_data()
+    assert list(design.solver_list) == [designs.BEM_SOLVER if converged else '' for converged in design.converged_list]
+    assert design.convergence_stats['runs'] == len(VELOCITIES)
+    assert design.convergence_stats['retries'] == 0
+    assert design.result_columns()['solver'][0] == designs.BEM_SOLVER
+
+
+# a straight line needs no refinement, a kink is split on both sides, and a convergence flip is always split
+def test_refine_velocities():
+    vel = np.linspace(0, 4, 9)
+    converged = np.ones(len(vel), dtype=bool)
+    line = 2 * vel + 1
+    assert len(designs.refine_velocities(vel, converged, [line], 0.02, 10)) == 0
+
+    kink = np.minimum(vel, 2.0)
+    np.testing.assert_allclose(designs.refine_velocities(vel, converged, [line, kink], 0.02, 10), [1.75, 2.25])
+
+    flipped = converged.copy()
+    flipped[:2] = False
+    np.testing.assert_allclose(designs.refine_velocities(vel, flipped, [line], 0.02, 10), [0.75])
+    # the worst intervals come first when the count runs out, and intervals narrower than min_step are left alone
+    np.testing.assert_allclose(designs.refine_velocities(vel, flipped, [line, kink], 0.02, 1), [0.75])
+    assert len(designs.refine_velocities(vel, flipped, [line], 0.02, 10, min_step=0.5)) == 0
@@ -0,0 +1,44 @@
+import types
+import numpy as np
+import doe
+
+
+# diameters that change the hub's share of the radius run through XROTOR end to end
+def test_diameter_sweep(geom, tmp_path):
+    plan = doe.full_factorial({'diam': [0.5, 0.6, 0.7], 'hub_diam': [0.08, 0.12]})
+    vel = np.linspace(1, 3, 3)
+    eval_structural = np.array([False, True, False])
+    study = doe.Study(geom, plan, vel, str(tmp_path / 'doe'), rpm=400, eval_structural=eval_structural)
+    rows = study.run(workers=2)
+
+    assert [row['status'] for row in rows] == ['ok'] * len(plan)
+    assert all(np.isfinite(row['peak_thrust']) and np.isfinite(row['max_von_misses']) for row in rows)
+    # a bigger propeller at the same rpm makes more thrust
+    thrust = {(row['diam'], row['hub_diam']): row['peak_thrust'] for row in rows}
+    assert thrust[(0.5, 0.08)] < thrust[(0.6, 0.08)] < thrust[(0.7, 0.08)]
+
+
+def test_design_geometry_moves_sections_to_the_hub(geom):
+    variant = doe.design_geometry(geom, {'diam': 0.5, 'hub_diam': 0.12})
+    assert np.isclose(variant.r_over_r[0], 0.12 / 0.5, atol=0.01)
+    assert variant.r_over_r[-1] == geom.r_over_r[-1]
+    assert np.all(np.diff(variant.r_over_r) > 0)
+    # the hub's share is unchanged, so the sections are too
+    assert doe.design_geometry(geom, {'diam': geom.diam * 2, 'hub_diam': geom.hub_diam * 2}).r_over_r is geom.r_over_r
+
+
+# a ConstantRPM design, one without a power, still gets a race speed, and a velocity that didn't converge can't set the
+# peak efficiency any more than the peak thrust
+def test_metrics_of_constant_rpm(geom, tmp_path):
+    vel = np.linspace(0.5, 4.0, 8)
+    design = types.SimpleNamespace(
+        vel_list=vel, power=None, fluid={'density': 1000}, structural=[],
+        folder=types.SimpleNamespace(speed_file=str(tmp_path / 'speed.txt'), aero_plots=str(tmp_path)),
+        converged_list=np.array([1, 1, 1, 1, 1, 1, 1, 0]),
+        thrust_list=300 / vel - 4 * vel,
+        efficiency_list=np.array([0.3, 0.4, 0.5, 0.6, 0.65, 0.7, 0.72, 0.95]))
+    study = doe.Study(geom, [{}], vel, str(tmp_path / 'doe'), rpm=400, race=(0.02, 0.05, 200, 5, 10))
+    metrics = study._metrics(design)
+    assert np.isfinite(metrics['race_speed'])
+    assert metrics['peak_efficiency'] == 0.72
+    assert metrics['converged_fraction'] == 7 / 8
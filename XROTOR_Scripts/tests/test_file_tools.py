@@ -0,0 +1,67 @@
+import os
+import numpy as np
+import file_tools
+
+TOP_HEADER = ('   i    r/R      u/R       w/R      t(deg)    Mz(N-m)    Mx(N-m)    T(N-m)     P(N)'
+              '       Sy(N)      Sx(N)')
+BOTTOM_HEADER = '   i    r/R    Ex*1000    Ey*1000    Ez*1000  Emax*1000     g*1000'
+
+
+# the text of a BEND WRIT file with the tables top, (stations, 9), and bottom, (stations, 5), at the stations xi
+def structural_text(xi, top, bottom):
+    lines = ['', ' Blade structural solution', TOP_HEADER]
+    lines += [f'{i + 1:4d} {xi[i]:7.4f} ' + ' '.join(f'{value:10.3E}' for value in top[i]) for i in range(len(xi))]
+    lines += ['', BOTTOM_HEADER]
+    lines += [f'{i + 1:4d} {xi[i]:7.4f} ' + ' '.join(f'{value:10.3E}' for value in bottom[i]) for i in range(len(xi))]
+    return '\n'.join(lines) + '\n'
+
+
+# the station count comes from the file rather than XROTOR's default 30
+def test_structural_any_station_count():
+    rng = np.random.default_rng(0)
+    xi = np.linspace(0.15, 0.98, 12)
+    top = rng.normal(size=(12, 9))
+    bottom = rng.normal(size=(12, 5))
+    result = file_tools.ExtractStructural(text=structural_text(xi, top, bottom))
+
+    assert result.top.shape == (12, len(file_tools.STRUCTURAL_TOP_KEYS))
+    assert result.bottom.shape == (12, len(file_tools.STRUCTURAL_BOTTOM_KEYS))
+    np.testing.assert_allclose(result.data_top['r_over_r'], xi, atol=5e-5)
+    np.testing.assert_allclose(result.data_top['torsion'], top[:, 5], rtol=1e-3)
+    # strains are written *1000
+    np.testing.assert_allclose(result.data_bottom['shear'], bottom[:, 4] / 1000, rtol=1e-3)
+
+
+# a field XROTOR overflowed into asterisks reads as NaN without losing the rest of the table
+def test_structural_overflow():
+    xi = np.linspace(0.2, 0.9, 5)
+    text = structural_text(xi, np.ones((5, 9)), np.ones((5, 5)))
+    lines = text.split('\n')
+    lines[4] = lines[4][:13] + ' *********' + lines[4][23:]
+    result = file_tools.ExtractStructural(text='\n'.join(lines))
+    assert np.isnan(result.top[1, 1])
+    assert np.count_nonzero(np.isnan(result.top)) == 1
+    assert result.bottom.shape == (5, 5)
+
+
+# the radial table of a solution recorded from the real XROTOR is read whole, one column per RADIAL_KEYS entry
+def test_aero_radial_table():
+    result = file_tools.ExtractAero(os.path.join('bin', 'out.dat'))
+    assert result.table.shape == (30, len(file_tools.RADIAL_KEYS))
+    np.testing.assert_allclose(result.table[0], [0.106, 0.15, 82.60, 0.378, 0.0146, 94880, 0.004, 1.376, 0.721, 0.046])
+    np.testing.assert_allclose(result.table[-1], [0.999, 0.0374, 38.43, 0.378, 0.028, 39850, 0.007, 0.876, 0.86, 0.001])
+    assert np.shares_memory(result.radial['beta'], result.table)
+    assert np.all(np.diff(result.radial['r_over_r']) > 0)
+
+
+# a field XROTOR overflowed with * is NaN and the fields on either side of it still read
+def test_aero_radial_overflow():
+    with open(os.path.join('bin', 'out.dat')) as file:
+        lines = file.read().split('\n')
+    row = next(i for i, line in enumerate(lines) if line.startswith('  5 '))
+    start, end = file_tools.RADIAL_COLUMNS[file_tools.RADIAL_KEYS.index('re')]
+    lines[row] = lines[row][:start] + '*' * (end - start) + lines[row][end:]
+    result = file_tools.ExtractAero(text='\n'.join(lines))
+    assert np.isnan(result.radial['re'][4])
+    assert np.count_nonzero(np.isnan(result.table)) == 1
+    assert result.radial['cd'][4] == 0.0127 and result.radial['mach'][4] == 0.005
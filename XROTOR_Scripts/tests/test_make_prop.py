@@ -0,0 +1,122 @@
+import copy
+import numpy as np
+import pytest
+import make_prop
+from conftest import ALUMINUM
+
+STEEL = {'density': 7850, 'elastic_modulus': 200e9, 'poissons': 0.3}
+
+
+# set_re on a variant's airfoil, or on one section, changes nothing else
+def test_set_re_is_copy_on_write(geom):
+    variant = geom.create_offset(2.0)
+    base_performance = geom.foil_aero[5].performance
+    variant.foil_aero[5].set_re(1e4)
+    geom.foil_aero[6].set_re(1e6)
+
+    assert geom.foil_aero[5].performance == base_performance
+    assert variant.foil_aero[5].performance['reference Re number'] != geom.foil_aero[6].performance[
+        'reference Re number']
+    assert variant.foil_aero[6].performance == {}
+    # the tables are still shared with the registry
+    assert variant.foil_aero[5].table is make_prop.registry.aero(geom.foil_names[5]).table
+
+
+# a variant with its own chords rebuilds its structural sections after the base's init_structural
+def test_variant_follows_base_material(geom):
+    variant = geom.variant(c_over_r=geom.c_over_r * 1.5)
+    offset = geom.create_offset(1.0)
+    assert variant.foil_bend[3].main_dict['EA'] > geom.foil_bend[3].main_dict['EA']
+
+    geom.init_structural(STEEL)
+    expected = geom.variant(c_over_r=geom.c_over_r * 1.5)
+    assert variant.material is STEEL
+    assert variant.foil_bend[3].main_dict == expected.foil_bend[3].main_dict
+    assert offset.foil_bend is geom.foil_bend
+
+    # a variant's own material stops it following the base
+    variant.init_structural(ALUMINUM)
+    geom.init_structural(STEEL)
+    assert variant.material is ALUMINUM
+    assert variant.foil_bend[3].main_dict['M'] < expected.foil_bend[3].main_dict['M']
+    assert np.isclose(variant.foil_bend[3].main_dict['R'], expected.foil_bend[3].main_dict['R'])
+
+
+# the mass of each material's blades is the mass per length integrated along the blade, and scales with density
+def test_blade_mass(geom):
+    light = {'density': 1000, 'elastic_modulus': 69e9, 'poissons': 0.3}
+    heavy = {'density': 3000, 'elastic_modulus': 69e9, 'poissons': 0.3}
+    properties = make_prop.section_properties(geom, [light, heavy])
+    mass = make_prop.blade_mass(geom, properties)
+    radius = properties['R'][0]
+    expected = geom.blades * np.sum(0.5 * (properties['M'][0, 1:] + properties['M'][0, :-1]) * np.diff(radius))
+    assert mass.shape == (2,)
+    np.testing.assert_allclose(mass, [expected, 3 * expected])
+
+
+# every blade reads the same parsed airfoil files, which can't be changed in place, and a section's set_re only changes
+# that section's copy
+def test_registry_shares_read_only_data(geom):
+    other = make_prop.PropGeom('prop_1')
+    other.init_aero()
+    name = geom.foil_names[0]
+    shared = make_prop.registry.aero(name)
+    assert make_prop.registry.aero(name.upper()) is shared
+    assert geom.foil_aero[0].table is other.foil_aero[0].table is shared.table
+    with pytest.raises(ValueError):
+        shared.table[0] = 0
+
+    geom.foil_aero[0].set_re(2e5)
+    assert shared.performance != geom.foil_aero[0].performance
+    assert other.foil_aero[0].performance == shared.performance
+
+    structural = make_prop.registry.structural(name)
+    assert make_prop.registry.structural(name) is structural
+    assert copy.deepcopy(structural) is structural
+    with pytest.raises(TypeError):
+        structural['extra'] = 1
+
+
+# the first row of the airfoil file with a reference Re above re, or the last row, as FoilAero.set_re used to search
+def first_row_above(foil_file, re):
+    with open(foil_file) as file:
+        file.readline()
+        rows = [[float(value) for value in line.split()] for line in file if line.strip()]
+    for row in rows:
+        if row[0] > re:
+            return row
+    return rows[-1]
+
+
+# the batched lookup picks the same rows as the old row by row search for every reynolds number, including ones on a
+# table entry and past either end
+def test_lookup_table_matches_row_search(geom):
+    name = geom.foil_names[0]
+    foil = make_prop.registry.aero(name)
+    re = np.stack([foil.re_index, foil.re_index * 1.01, np.linspace(1.0, foil.re_index[-1] * 10, len(foil.re_index))])
+    table = foil.lookup_table(re)
+    assert table.shape == re.shape + (len(make_prop.FOIL_KEYS),)
+    for index in np.ndindex(re.shape):
+        assert table[index].tolist() == first_row_above(make_prop.aero_path(name), re[index])
+
+
+# interpolation in log(Re) gives each table row back on its own reynolds number, lies between the rows either side, and
+# holds the end rows outside the table
+def test_lookup_table_interpolates(geom):
+    foil = make_prop.registry.aero(geom.foil_names[0])
+    np.testing.assert_allclose(foil.lookup_table(foil.re_index, interpolate=True), foil.table)
+    middle = np.sqrt(foil.re_index[0] * foil.re_index[1])
+    row = foil.lookup_table(middle, interpolate=True)
+    np.testing.assert_allclose(row[1:], (foil.table[0, 1:] + foil.table[1, 1:]) / 2)
+    assert row[0] == pytest.approx(middle)
+    np.testing.assert_allclose(foil.lookup_table(foil.re_index[-1] * 10, interpolate=True)[1:], foil.table[-1, 1:])
+
+
+# a grid of operating points is looked up in one call and matches looking each one up on its own
+def test_blade_table_batches_operating_points(geom):
+    vel = np.array([0.5, 2.0, 4.0])[:, None]
+    rpm = np.array([150, 300, 600])[None, :]
+    table = geom.blade_table(vel, rpm, 1e-6)
+    assert table.shape == (3, 3, geom.num_sections, len(make_prop.FOIL_KEYS))
+    for i, j in np.ndindex(3, 3):
+        np.testing.assert_array_equal(table[i, j], geom.blade_table(vel[i, 0], rpm[0, j], 1e-6))
@@ -0,0 +1,55 @@
+import os
+import run_prop
+import xrotor
+import result_cache
+
+FLUID = {'density': 1000, 'viscosity': 1e-6, 'speed_sound': 1500}
+
+
+# a second run of the same inputs is served from the cache without starting XROTOR and restores the output file, and
+# changing any input misses
+def test_hit_and_miss(geom, tmp_path, monkeypatch):
+    cache = result_cache.ResultCache(str(tmp_path / 'cache'))
+    first = run_prop.run(geom, 1.0, 300, 'VRTX', str(tmp_path / 'first.txt'), FLUID, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    def no_xrotor(self):
+        raise AssertionError('XROTOR was started on a cache hit')
+    monkeypatch.setattr(xrotor.XRotorSubprocessInterface, '_create_process', no_xrotor)
+    second = run_prop.run(geom, 1.0, 300, 'VRTX', str(tmp_path / 'second.txt'), FLUID, cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert (second.T, second.pwr, second.rpm) == (first.T, first.pwr, first.rpm)
+    with open(tmp_path / 'first.txt') as a, open(tmp_path / 'second.txt') as b:
+        assert a.read() == b.read()
+
+    assert cache.aero_key(geom, 1.0, 310, 'VRTX', FLUID) != cache.aero_key(geom, 1.0, 300, 'VRTX', FLUID)
+    assert cache.aero_key(geom, 1.0, 300, 'POT', FLUID) != cache.aero_key(geom, 1.0, 300, 'VRTX', FLUID)
+    assert cache.get(cache.aero_key(geom, 1.0, 300, 'POT', FLUID)) is None
+    assert cache.misses == 2
+
+
+# past max_bytes the least recently used entries go first, and a hit counts as a use
+def test_evicts_least_recently_used(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / 'cache'))
+    for i, key in enumerate(['aa1', 'bb2', 'cc3']):
+        cache.put(key, 'x' * 1000, i)
+        os.utime(cache._path(key), (1000 + i, 1000 + i))
+    assert cache.get('aa1') == 0
+    entry_size = os.path.getsize(cache._path('aa1'))
+
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert cache.get('bb2') is None
+    assert cache.get('aa1') == 0 and cache.get('cc3') == 2
+    assert cache.size == 2 * entry_size
+
+
+# entries not used within max_age are dropped when the cache is opened again
+def test_evicts_expired(tmp_path):
+    cache = result_cache.ResultCache(str(tmp_path / 'cache'))
+    cache.put('aa1', 'old', 0)
+    cache.put('bb2', 'new', 1)
+    os.utime(cache._path('aa1'), (0, 0))
+    reopened = result_cache.ResultCache(str(tmp_path / 'cache'), max_age=3600)
+    assert reopened.get('aa1') is None
+    assert reopened.get('bb2') == 1
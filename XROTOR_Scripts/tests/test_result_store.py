@@ -0,0 +1,53 @@
+import numpy as np
+import designs
+import result_store
+
+VELOCITIES = np.linspace(0.5, 3.5, 4)
+
+
+def assert_same_structural(loaded, design):
+    assert [result is None for result in loaded.structural] == [result is None for result in design.structural]
+    for a, b in zip(loaded.structural, design.structural):
+        if b is not None:
+            assert a.data_top.keys() == b.data_top.keys()
+            np.testing.assert_array_equal(a.von_misses, b.von_misses)
+
+
+# a design saved and loaded into another design with the same velocities gives back every result, structural ones too
+def test_constant_power_round_trip(geom, tmp_path):
+    eval_structural = np.array([False, True, False, True])
+    design = designs.ConstantPower(geom, 300, VELOCITIES, str(tmp_path / 'design'), eval_structural)
+    design.evaluate_aero()
+    design.compile_data()
+    file_name = str(tmp_path / 'results.npz')
+    design.save_results(file_name)
+
+    loaded = designs.ConstantPower(geom, 300, VELOCITIES, str(tmp_path / 'loaded'))
+    loaded.load_results(file_name)
+    saved = design.result_columns()
+    for name, values in loaded.result_columns().items():
+        np.testing.assert_array_equal(values, saved[name])
+    assert_same_structural(loaded, design)
+
+
+# the velocities and offsets come from the file, so a variable pitch design made with others is resized to the file's
+def test_variable_pitch_round_trip(geom, tmp_path):
+    eval_structural = np.array([False, False, True, False])
+    design = designs.VariablePitch(geom, 300, VELOCITIES, [-2, 0, 2], str(tmp_path / 'design'), eval_structural)
+    design.evaluate_aero()
+    design.compile_data()
+    file_name = str(tmp_path / 'results.npz')
+    design.save_results(file_name)
+
+    loaded = designs.VariablePitch(geom, 300, VELOCITIES[:2], [0], str(tmp_path / 'loaded'))
+    loaded.load_results(file_name)
+    assert loaded.offset_list == [-2.0, 0.0, 2.0]
+    assert len(loaded.constant_propellers) == 3
+    np.testing.assert_array_equal(loaded.vel_list, VELOCITIES)
+    np.testing.assert_array_equal(loaded.vpp_offset, design.vpp_offset)
+    np.testing.assert_array_equal(loaded.thrust_list, design.thrust_list)
+    np.testing.assert_array_equal(loaded.rpm_list, design.rpm_list)
+    assert list(loaded.solver_list) == list(design.solver_list)
+    assert_same_structural(loaded, design)
+    columns = result_store.load(file_name)
+    assert columns['thrust'].shape == (3, len(VELOCITIES))
@@ -0,0 +1,159 @@
+import os
+import sys
+import numpy as np
+import designs
+import run_prop
+import xrotor
+
+FLUID = {'density': 1000, 'viscosity': 1e-6, 'speed_sound': 1500}
+
+
+# a persistent session sends each point on top of the previous one, so it has to give the same solution as a fresh
+# XROTOR per point
+def test_persistent_matches_per_point(geom, tmp_path):
+    vel = np.linspace(0.5, 3.5, 5)
+    eval_structural = np.zeros(len(vel), dtype=bool)
+    eval_structural[[0, 3]] = True
+    per_point = designs.ConstantPower(geom, 300, vel, str(tmp_path / 'per_point'), eval_structural)
+    per_point.evaluate_aero(persistent=False)
+    per_point.compile_data()
+    persistent = designs.ConstantPower(geom, 300, vel, str(tmp_path / 'persistent'), eval_structural)
+    persistent.evaluate_aero(persistent=True)
+    persistent.compile_data()
+
+    assert list(persistent.converged_list) == list(per_point.converged_list)
+    assert list(persistent.solver_list) == list(per_point.solver_list)
+    np.testing.assert_allclose(persistent.thrust_list, per_point.thrust_list, rtol=1e-6, equal_nan=True)
+    np.testing.assert_allclose(persistent.rpm_list, per_point.rpm_list, rtol=1e-6, equal_nan=True)
+    for i in np.flatnonzero(eval_structural):
+        np.testing.assert_allclose(persistent.structural[i].von_misses, per_point.structural[i].von_misses,
+                                   rtol=1e-6)
+
+
+# points run one after another in one session, at fixed rpm and in both directions, match single runs
+def test_session_reuse_matches_single_runs(geom, tmp_path):
+    points = [(1.0, 300), (2.5, 450), (1.0, 300), (0.5, 200)]
+    with run_prop.XRotorSession(geom, FLUID) as session:
+        persistent = [run_prop.run(geom, vel, rpm, 'VRTX', str(tmp_path / f's{i}.txt'), FLUID, session=session)
+                      for i, (vel, rpm) in enumerate(points)]
+    single = [run_prop.run(geom, vel, rpm, 'VRTX', str(tmp_path / f'p{i}.txt'), FLUID)
+              for i, (vel, rpm) in enumerate(points)]
+    for a, b in zip(persistent, single):
+        assert (a.T, a.pwr, a.Q) == (b.T, b.pwr, b.Q)
+        assert a.converged == b.converged
+
+
+
+# switching blades in a session starts from fresh airfoil sections, so alternating blades match single runs
+def test_session_switching_blades_matches_single_runs(geom, tmp_path):
+    other = geom.variant(c_over_r=geom.c_over_r*1.2, beta=geom.beta + 2)
+    blades = [geom, other, geom]
+    with run_prop.XRotorSession(geom, FLUID) as session:
+        persistent = [run_prop.run(blade, 1.0, 300, 'VRTX', str(tmp_path / f's{i}.txt'), FLUID, session=session)
+                      for i, blade in enumerate(blades)]
+    single = [run_prop.run(blade, 1.0, 300, 'VRTX', str(tmp_path / f'p{i}.txt'), FLUID)
+              for i, blade in enumerate(blades)]
+    for a, b in zip(persistent, single):
+        assert (a.T, a.pwr, a.Q) == (b.T, b.pwr, b.Q)
+    assert persistent[0].T != persistent[1].T
+
+# write_structural can rewrite the file a session already read with a new material, which the session has to read again
+def test_session_rereads_rewritten_structure(geom, tmp_path):
+    struct_file = str(tmp_path / 'structural_geom.txt')
+    geom.write_structural(struct_file)
+    with run_prop.XRotorSession(geom, FLUID) as session:
+        first = run_prop.evaluate_strength(geom, 1.0, 300, 'VRTX', struct_file, str(tmp_path / 'first.txt'), FLUID,
+                                           False, session=session)
+        geom.init_structural({'density': 1600, 'elastic_modulus': 20e9, 'poissons': 0.3})
+        geom.write_structural(struct_file)
+        rewritten = run_prop.evaluate_strength(geom, 1.0, 300, 'VRTX', struct_file, str(tmp_path / 'second.txt'),
+                                               FLUID, False, session=session)
+    single = run_prop.evaluate_strength(geom, 1.0, 300, 'VRTX', struct_file, str(tmp_path / 'single.txt'), FLUID,
+                                        False)
+    np.testing.assert_allclose(rewritten.bottom, single.bottom)
+    assert not np.allclose(first.bottom, rewritten.bottom)
+
+
+# XROTOR stands in for a slow disk: it writes half the file, stalls well past any polling interval and only then
+# finishes and shows the prompt. The file is read only once the prompt is back
+SLOW_WRITER = '''
+import sys, time
+print(' .OPERv^c>', flush=True)
+name = sys.stdin.readline().split()[1]
+with open(name, 'w') as file:
+    file.write('first half\\n')
+    file.flush()
+    time.sleep(0.3)
+    file.write('second half\\n')
+print(' .OPERv^c>', flush=True)
+sys.stdin.readline()
+'''
+
+
+def test_wait_for_file_waits_for_prompt(tmp_path):
+    outfile = str(tmp_path / 'out.txt')
+    xr = xrotor.XRotorPersistentInterface(xrotor_path=[sys.executable, '-c', SLOW_WRITER])
+    try:
+        xr(f'WRIT {outfile}')
+        xr.wait_for_file(outfile, 'OPER', 2, timeout=10)
+        with open(outfile) as file:
+            assert file.read() == 'first half\nsecond half\n'
+    finally:
+        xr.finalize()
+
+
+# spreading the velocities over workers, with or without persistent sessions, gives the serial results in order
+def test_workers_match_serial(geom, tmp_path):
+    vel = np.linspace(0.5, 3.5, 5)
+    serial = designs.ConstantRPM(geom, 400, vel, str(tmp_path / 'serial'))
+    serial.evaluate_aero()
+    serial.compile_data()
+    for persistent in (False, True):
+        parallel = designs.ConstantRPM(geom, 400, vel, str(tmp_path / f'parallel_{persistent}'))
+        parallel.evaluate_aero(workers=3, persistent=persistent)
+        parallel.compile_data()
+        np.testing.assert_array_equal(parallel.thrust_list, serial.thrust_list)
+        assert list(parallel.solver_list) == list(serial.solver_list)
+
+
+# solutions read from XROTOR's screen give the same results as the files it writes, and without archive no velocity
+# file is written
+def test_stream_matches_files(geom, tmp_path):
+    vel = np.linspace(0.5, 3.5, 4)
+    files = designs.ConstantPower(geom, 300, vel, str(tmp_path / 'files'))
+    files.evaluate_aero(persistent=True)
+    files.compile_data()
+    streamed = designs.ConstantPower(geom, 300, vel, str(tmp_path / 'streamed'))
+    streamed.evaluate_aero(persistent=True, stream=True)
+    streamed.compile_data()
+
+    np.testing.assert_array_equal(streamed.thrust_list, files.thrust_list)
+    np.testing.assert_array_equal(streamed.rpm_list, files.rpm_list)
+    for key in ('cl', 're'):
+        np.testing.assert_array_equal(streamed.radial[key], files.radial[key])
+    assert not any(os.path.exists(streamed.folder.vel_file(v)) for v in vel)
+
+
+# a run builds its whole command stream first and hands it to XROTOR in one write, for a single point and for a batch
+def test_run_sends_one_write(geom, tmp_path, monkeypatch):
+    writes = []
+    send_text = xrotor.XRotorSubprocessInterface._send_text
+    send_command = xrotor.XRotorSubprocessInterface._send_command
+
+    def counted_text(self, text):
+        writes.append(text)
+        return send_text(self, text)
+
+    def counted_command(self, command):
+        writes.append(command)
+        return send_command(self, command)
+    monkeypatch.setattr(xrotor.XRotorSubprocessInterface, '_send_text', counted_text)
+    monkeypatch.setattr(xrotor.XRotorSubprocessInterface, '_send_command', counted_command)
+
+    single = run_prop.run(geom, 1.0, 300, 'VRTX', str(tmp_path / 'single.txt'), FLUID)
+    assert len(writes) == 1 and 'ARBI' in writes[0] and 'WRIT' in writes[0]
+    writes.clear()
+    points = [(1.0, 300, str(tmp_path / 'a.txt')), (2.0, 300, str(tmp_path / 'b.txt'))]
+    batch = run_prop.run_points(geom, points, 'VRTX', FLUID)
+    assert len(writes) == 1 and writes[0].count('WRIT') == 2
+    assert batch[0].T == single.T
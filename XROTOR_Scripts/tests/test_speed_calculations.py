@@ -0,0 +1,95 @@
+import types
+import numpy as np
+import pytest
+import matplotlib
+import speed_calculations
+
+matplotlib.use('Agg')
+
+VELOCITIES = np.linspace(0.5, 4.0, 15)
+POWER = 400.0
+
+
+# the parts of a design RaceSpeed reads, with a thrust curve that falls off like a real propeller's
+def design(tmp_path):
+    folder = types.SimpleNamespace(speed_file=str(tmp_path / 'speed.txt'), aero_plots=str(tmp_path))
+    thrust = 0.75 * POWER / VELOCITIES - 4 * VELOCITIES
+    return types.SimpleNamespace(folder=folder, vel_list=VELOCITIES, thrust_list=thrust, power=POWER,
+                                 fluid={'density': 1000})
+
+
+# the scalar calculation RaceSpeed started from: np.interp of the integrand, a cumulative trapezoid, and a linear
+# search for each gate
+def baseline_speed(vel, thrust, density, drag_coef, frontal_area, sub_mass, initial_gate, final_gate):
+    integrand = sub_mass * vel / (thrust - density * frontal_area * vel**2 * drag_coef)
+    integrand[integrand < 0] = np.nan
+    vel_refined = np.linspace(min(vel), max(vel), 500)
+    y = np.interp(vel_refined, vel, integrand)
+    x = np.zeros(len(vel_refined))
+    x[1:] = np.cumsum(0.5 * (y[1:] + y[:-1]) * np.diff(vel_refined))
+    initial_vel = speed_calculations.linearly_interp(x, vel_refined, initial_gate)
+    final_vel = speed_calculations.linearly_interp(x, vel_refined, final_gate)
+    return speed_calculations.mps_to_knot((initial_vel + final_vel) / 2)
+
+
+# every configuration of a grid gives the scalar calculation's speed, NaN included where the drag stops the sub short
+def test_race_speed_matches_scalar_baseline(tmp_path):
+    drag_coef = np.array([0.01, 0.03, 0.6])
+    sub_mass = np.array([150.0, 300.0])
+    race = speed_calculations.RaceSpeed(design(tmp_path), drag_coef[:, None], 0.05, sub_mass[None, :])
+    speeds = race.find_recorded_speed(5, 10)
+    assert speeds.shape == (3, 2)
+    assert np.isnan(speeds).any() and not np.isnan(speeds).all()
+    for i, cd in enumerate(drag_coef):
+        for j, mass in enumerate(sub_mass):
+            expected = baseline_speed(VELOCITIES, design(tmp_path).thrust_list, 1000, cd, 0.05, mass, 5, 10)
+            np.testing.assert_allclose(speeds[i, j], expected, rtol=1e-9, equal_nan=True)
+
+
+# a grid of configurations needs an index to plot, a single configuration doesn't
+def test_plot_configuration(tmp_path):
+    single = speed_calculations.RaceSpeed(design(tmp_path), 0.2, 0.4, 200)
+    single.find_recorded_speed(5, 10)
+    single.plot()
+
+    grid = speed_calculations.RaceSpeed(design(tmp_path), np.array([0.1, 0.2]), 0.4, 200)
+    grid.find_recorded_speed(20, np.array([30, 40, 50])[:, None])
+    with pytest.raises(ValueError):
+        grid.plot()
+    with pytest.raises(ValueError):
+        grid.plot(configuration=1)
+    grid.plot(save=True, configuration=(2, 1))
+    assert (tmp_path / 'displacement.png').exists()
+
+
+# each chunk of samples is integrated on its own, so no more than chunk configurations are ever held at once, and the
+# percentiles come out ordered and within the sampled speeds
+def test_monte_carlo_bounded_per_chunk(tmp_path, monkeypatch):
+    race = speed_calculations.RaceSpeed(design(tmp_path), 0.02, 0.05, 200)
+    rows = []
+    unit_displacement = speed_calculations.unit_displacement
+
+    def counted(vel, thrust, drag, vel_refined):
+        rows.append(np.size(drag))
+        return unit_displacement(vel, thrust, drag, vel_refined)
+    monkeypatch.setattr(speed_calculations, 'unit_displacement', counted)
+
+    result = race.monte_carlo(5, 10, (0.02, 0.004), 0.05, (200, 20), thrust_error=0.05, samples=2500, chunk=1000,
+                              seed=1)
+    assert rows == [1000, 1000, 500]
+    speeds = result['speeds'][~np.isnan(result['speeds'])]
+    assert len(result['speeds']) == 2500
+    assert result['reached'] == len(speeds) / 2500
+    percentiles = [result['percentiles'][p] for p in (5, 25, 50, 75, 95)]
+    assert np.all(np.diff(percentiles) >= 0)
+    assert speeds.min() <= percentiles[0] and percentiles[-1] <= speeds.max()
+
+
+# without any uncertainty every sample is the design's own recorded speed
+def test_monte_carlo_without_uncertainty(tmp_path):
+    race = speed_calculations.RaceSpeed(design(tmp_path), 0.02, 0.05, 200)
+    expected = race.find_recorded_speed(5, 10)
+    result = race.monte_carlo(5, 10, 0.02, 0.05, 200, samples=50, chunk=20, seed=0)
+    np.testing.assert_allclose(result['speeds'], expected)
+    assert result['reached'] == 1.0
+    assert result['std'] == pytest.approx(0, abs=1e-9)
@@ -0,0 +1,43 @@
+import numpy as np
+import stress
+
+
+# strains of 3 operating points with 6 stations each, the middle one without a structural evaluation
+def strain_stack():
+    rng = np.random.default_rng(2)
+    strain = rng.normal(scale=1e-4, size=(3, len(stress.STRAIN_KEYS), 6))
+    strain[1] = np.nan
+    return strain
+
+
+# the lowest safety factor of each operating point is the yield strength over its highest von Mises stress, found station
+# by station, and NaN where nothing was evaluated
+def test_min_safety_factor():
+    strain = strain_stack()
+    r_over_r = np.broadcast_to(np.linspace(0.2, 1.0, 6), (3, 6))
+    field = stress.StressField(strain, r_over_r, 69e9, 0.3, yield_strength=40e6, axes={'vel': np.array([1., 2., 3.])})
+
+    for point in (0, 2):
+        columns = [strain[point, stress.STRAIN_KEYS.index(key)]
+                   for key in ('forward_strain', 'tangent_strain', 'spanwise_strain', 'shear')]
+        von_misses = stress.von_misses(*stress.hooke_stresses(*columns, 69e9, 0.3))
+        assert field.min_safety_factor[point] == np.min(40e6 / von_misses)
+        assert field.peak[point] == np.max(von_misses)
+    assert np.isnan(field.min_safety_factor[1]) and field.peak_station[1] == -1
+    np.testing.assert_array_equal(field.below(np.nanmax(field.min_safety_factor)),
+                                  field.min_safety_factor < np.nanmax(field.min_safety_factor))
+
+    worst = int(np.nanargmax(field.peak))
+    summary = field.summary()
+    assert summary['vel'] == [1., 2., 3.][worst]
+    assert summary['safety_factor'] == field.min_safety_factor[worst]
+
+
+# one yield strength per material broadcasts against the operating points
+def test_min_safety_factor_per_material():
+    strain = strain_stack()
+    field = stress.StressField(strain, np.linspace(0.2, 1.0, 6), 69e9, 0.3,
+                               yield_strength=np.array([40e6, 80e6])[:, None, None])
+    assert field.min_safety_factor.shape == (2, 3)
+    np.testing.assert_allclose(field.min_safety_factor[1], 2 * field.min_safety_factor[0])
+    assert np.isnan(field.min_safety_factor[:, 1]).all()
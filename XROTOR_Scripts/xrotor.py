@@ -1,17 +1,71 @@
-def run_animation():
-    from time import sleep
-    for i in range(10):
-        print('.', end='')
-        sleep(0.25)
-    print('.', end='\r')
+import os
+import re
+import time
+
+# command used to spawn XROTOR. Can be a path or a list of arguments. Point it at fake_xrotor.command() to run without
+# the windows executable
+XROTOR_PATH = os.path.join('bin', 'xrotor.exe')
+
+# a menu prompt such as .OPERv   c> or ..EDIT^c>. The group is the menu's name
+PROMPT = re.compile(r'\.+([A-Z]+)[a-z]*\W*c>')
+
+
+# prints a dot every interval seconds on a background thread while XROTOR is running. Purely cosmetic, the caller
+# never waits on it
+class ProgressReporter:
+    def __init__(self, interval=0.25):
+        from threading import Event
+        self.interval = interval
+        self.done = Event()
+        self.thread = None
+
+    def start(self):
+        from threading import Thread
+        self.done.clear()
+        self.thread = Thread(target=self._animate, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.done.set()
+        if self.thread is not None:
+            self.thread.join()
+            print('', end='\r')
+
+    def _animate(self):
+        while not self.done.wait(self.interval):
+            print('.', end='', flush=True)
+
+
+# builds a stream of XROTOR commands in memory. A script can be passed anywhere an interface is, so run_prop's set_geom,
+# set_foils and the rest build scripts just as well as they drive XROTOR, and the whole script is sent to XROTOR in a
+# single write by XRotorInterface.send
+class XRotorScript:
+    def __init__(self):
+        self.lines = []
+
+    def __call__(self, command):
+        self.lines.append(f'{command}\n')
+
+    # adds text that is already laid out one command per line, such as a filled in template
+    def write(self, text):
+        self.lines.append(text)
+
+    def text(self):
+        return ''.join(self.lines)
 
 
 class XRotorInterface:
 
-    def __init__(self, verbose=False):
-        self.xrotor_path = 'bin\\xrotor.exe'
+    # verbose: True will cause the XROTOR inputs to be output to console
+    # xrotor_path: command used to spawn XROTOR. Defaults to XROTOR_PATH
+    # timeout: seconds XROTOR is given to finish once finalize is called
+    # reporter: optional ProgressReporter shown while waiting on XROTOR
+    def __init__(self, verbose=False, xrotor_path=None, timeout=60, reporter=None):
+        self.xrotor_path = XROTOR_PATH if xrotor_path is None else xrotor_path
         self.verbose = verbose
-        print('attempting to spawn XROTOR instance from ' + self.xrotor_path)
+        self.timeout = timeout
+        self.reporter = reporter
+        print('attempting to spawn XROTOR instance from ' + str(self.xrotor_path))
         self._create_process()
 
     def __call__(self, command):
@@ -19,9 +73,26 @@ class XRotorInterface:
             print('sending command: ' + str(command))
         self._send_command(command)
 
+    # sends text that is already laid out one command per line in a single write
+    def write(self, text):
+        if self.verbose:
+            for command in text.splitlines():
+                print('sending command: ' + command)
+        self._send_text(text)
+
+    # sends a whole XRotorScript in a single write
+    def send(self, script):
+        self.write(script.text())
+
     def finalize(self):
         print('finalizing xrotor interface')
-        self._kill_process()
+        if self.reporter is not None:
+            self.reporter.start()
+        try:
+            self._kill_process()
+        finally:
+            if self.reporter is not None:
+                self.reporter.stop()
 
     def _create_process(self):
         raise NotImplementedError
@@ -29,6 +100,9 @@ class XRotorInterface:
     def _send_command(self, command):
         raise NotImplementedError
 
+    def _send_text(self, text):
+        raise NotImplementedError
+
     def _kill_process(self):
         raise NotImplementedError
 
@@ -39,16 +113,131 @@ class XRotorSubprocessInterface(XRotorInterface):
         self.process = Popen(self.xrotor_path, stdin=PIPE, stdout=PIPE, stderr=PIPE, encoding='utf-8')
 
     def _send_command(self, command):
-        self.process.stdin.write(f'{command}\n')
+        self._send_text(f'{command}\n')
 
+    def _send_text(self, text):
+        self.process.stdin.write(text)
+
+    # closes stdin and returns as soon as XROTOR exits. Everything XROTOR printed is kept in self.output. XROTOR is
+    # killed if it is still running after the timeout
     def _kill_process(self):
-        # the use of threading is because subprocess executes within
-        # communicate. it does not spawn multiple threads, simply uses thread
-        # functions to determine the execution status of communicate.
+        from subprocess import TimeoutExpired
+        try:
+            self.output, _ = self.process.communicate(timeout=self.timeout)
+        except TimeoutExpired:
+            self.process.kill()
+            self.process.communicate()
+            raise TimeoutError(f'XROTOR did not finish within {self.timeout} s')
+
+
+# keeps a single XROTOR process alive across many operating points. stdout and stderr are drained on background
+# threads so XROTOR never blocks on a full pipe, and commands are flushed to XROTOR whenever the caller waits on it.
+# The menu prompts XROTOR prints are counted as they come in. XROTOR only shows a menu's prompt again once the command
+# before it is done, so a file written by WRIT is complete once the prompt after it has been printed
+class XRotorPersistentInterface(XRotorSubprocessInterface):
+    # capture: True keeps XROTOR's screen output so it can be read with read_output instead of being thrown away
+    # other arguments are the same as XRotorInterface
+    def __init__(self, verbose=False, xrotor_path=None, timeout=60, reporter=None, capture=False):
+        from collections import Counter
+        from queue import Queue
+        from threading import Condition
+        self.capture = capture
+        self.screen = Queue()
+        # prompts printed so far by menu name, for example {'OPER': 12, 'BEND': 4}, and whether stdout has closed
+        self.prompts = Counter()
+        self.printed = Condition()
+        self.exited = False
+        super().__init__(verbose, xrotor_path, timeout, reporter)
+
+    def _create_process(self):
         from threading import Thread
-        thread = Thread(target=self.process.communicate)
-        thread.start()
-        while thread.is_alive():
-            run_animation()
-        print('\n')
+        super()._create_process()
+        self.readers = [Thread(target=self._read, args=(self.process.stdout,), daemon=True),
+                        Thread(target=self._drain, args=(self.process.stderr,), daemon=True)]
+        for reader in self.readers:
+            reader.start()
+
+    def _drain(self, stream):
+        for _ in stream:
+            pass
+
+    # reads whatever XROTOR has printed as soon as it is printed and counts its prompts. Prompts don't end in a newline,
+    # so reading by line would leave the last prompt behind until the next command. With capture the output is also
+    # kept for read_output, where None marks the end of it
+    def _read(self, stream):
+        # output after the last prompt, which can hold the start of a prompt split across reads
+        tail = ''
+        while True:
+            chunk = os.read(stream.fileno(), 65536)
+            if not chunk:
+                break
+            text = chunk.decode('utf-8', 'replace')
+            if self.capture:
+                self.screen.put(text)
+            tail += text
+            end = 0
+            with self.printed:
+                for match in PROMPT.finditer(tail):
+                    self.prompts[match.group(1)] += 1
+                    end = match.end()
+                if end:
+                    self.printed.notify_all()
+            tail = tail[end:][-64:]
+        with self.printed:
+            self.exited = True
+            self.printed.notify_all()
+        if self.capture:
+            self.screen.put(None)
+
+    def flush(self):
+        self.process.stdin.flush()
 
+    # returns the next piece of XROTOR's screen output. Only available with capture
+    # timeout: seconds to wait for XROTOR to print something
+    def read_output(self, timeout=60):
+        from queue import Empty
+        try:
+            chunk = self.screen.get(timeout=timeout)
+        except Empty:
+            raise TimeoutError(f'XROTOR printed nothing within {timeout} s')
+        if chunk is None:
+            self.screen.put(None)
+            raise RuntimeError('XROTOR exited before printing its solution')
+        return chunk
+
+    # waits until XROTOR has finished writing file_name, which is once it has shown the prompt of the menu the WRIT was
+    # sent in after it
+    # menu: name of the menu WRIT was sent in, such as 'OPER' or 'BEND'
+    # prompts: number of that menu's prompts XROTOR will have printed once it is done with the WRIT, counted from the
+    #          start of the process
+    # timeout: seconds to wait before giving up
+    def wait_for_file(self, file_name, menu, prompts, timeout=60):
+        self.flush()
+        deadline = time.perf_counter() + timeout
+        with self.printed:
+            while self.prompts[menu] < prompts:
+                if self.exited:
+                    raise RuntimeError(f'XROTOR exited before writing {file_name}')
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(f'XROTOR did not write {file_name} within {timeout} s')
+                self.printed.wait(remaining)
+        if not os.path.isfile(file_name):
+            raise RuntimeError(f'XROTOR did not write {file_name}')
+
+    def _kill_process(self):
+        from subprocess import TimeoutExpired
+        # XROTOR may already be gone if a point failed, in which case there is nobody left to quit
+        try:
+            self._send_command('QUIT')
+            self.process.stdin.close()
+        except (BrokenPipeError, OSError):
+            pass
+        try:
+            self.process.wait(timeout=self.timeout)
+        except TimeoutExpired:
+            self.process.kill()
+            raise TimeoutError(f'XROTOR did not finish within {self.timeout} s')
+        finally:
+            for reader in self.readers:
+                reader.join()